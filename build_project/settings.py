@@ -7,6 +7,7 @@ with AI tools, media management, and subscription-based access.
 
 import os
 from pathlib import Path
+from celery.schedules import crontab
 from decouple import config
 import dj_database_url
 
@@ -66,8 +67,8 @@ TENANT_APPS = [
 INSTALLED_APPS = list(SHARED_APPS) + [app for app in TENANT_APPS if app not in SHARED_APPS]
 
 MIDDLEWARE = [
-    # Django Tenants middleware MUST be first
-    'django_tenants.middleware.main.TenantMainMiddleware',
+    # Django Tenants middleware MUST be first (cached TenantMainMiddleware subclass)
+    'tenants.middleware.CachedTenantMiddleware',
     
     # Security and CORS
     'corsheaders.middleware.CorsMiddleware',
@@ -91,6 +92,13 @@ PUBLIC_SCHEMA_URLCONF = 'build_project.public_urls'
 TENANT_MODEL = 'tenants.Client'
 TENANT_DOMAIN_MODEL = 'tenants.Domain'
 
+# Hostname -> tenant resolution cache (see tenants.middleware)
+TENANT_CACHE_LOCAL_SIZE = config('TENANT_CACHE_LOCAL_SIZE', default=10000, cast=int)
+TENANT_CACHE_LOCAL_TTL = config('TENANT_CACHE_LOCAL_TTL', default=30, cast=int)  # seconds
+TENANT_CACHE_TIMEOUT = config('TENANT_CACHE_TIMEOUT', default=3600, cast=int)  # seconds
+TENANT_CACHE_MISS_TIMEOUT = config('TENANT_CACHE_MISS_TIMEOUT', default=60, cast=int)  # seconds an unknown hostname stays cached
+TENANT_CACHE_STATS_FLUSH = 100  # lookups (or seconds) between flushes of a worker's cache counters
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -140,6 +148,41 @@ CACHES = {
     }
 }
 
+# Full-page cache for public tenant pages (see websites.caching)
+PAGE_CACHE_ENABLED = config('PAGE_CACHE_ENABLED', default=True, cast=bool)
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=86400, cast=int)  # seconds
+PAGE_CACHE_STALE_GRACE = config('PAGE_CACHE_STALE_GRACE', default=300, cast=int)  # seconds
+PAGE_CACHE_LOCK_TIMEOUT = 30  # seconds a render lock is held at most
+PAGE_CACHE_LOCK_WAIT = 0.2  # seconds a request waits for another worker's render before rendering uncached
+COMPRESS_MIN_LENGTH = 1024  # bytes; smaller pages/bundles get no gzip/brotli variants
+COMPRESS_BROTLI_QUALITY = 5  # brotli quality of variants compressed while a request waits
+COMPRESS_BROTLI_QUALITY_STATIC = 11  # brotli quality of published pages and bundles
+FRAGMENT_STATS_SAMPLE = 100  # one in N fragment cache hits is counted (with weight N)
+STREAMING_PAGE_THRESHOLD = config('STREAMING_PAGE_THRESHOLD', default=65536, cast=int)  # content bytes; larger pages are streamed
+STREAMING_CHUNK_SIZE = 16384  # bytes of page content per streamed chunk
+
+# Host -> website -> page routing index (see websites.routing)
+ROUTING_INDEX_LOCAL_TTL = 5  # seconds a worker trusts its in-memory copy
+
+# Full-text page search (see websites.search)
+SEARCH_CANDIDATE_LIMIT = 1000  # matching pages ranked per query
+
+# Bulk page/component writes (see websites.bulk)
+BULK_MAX_ITEMS = 5000  # items accepted per bulk request
+BULK_WRITE_BATCH_SIZE = 500  # rows per INSERT/UPDATE statement
+
+# Streaming CSV/NDJSON exports (see websites.exports)
+EXPORT_CURSOR_CHUNK_SIZE = 2000  # rows fetched per server-side cursor round trip
+EXPORT_CHUNK_BYTES = 65536  # bytes of encoded rows per streamed chunk
+
+# Page content revisions (see websites.revisions)
+PAGE_REVISION_SNAPSHOT_EVERY = 20  # a full snapshot every N revisions, diffs in between
+PAGE_REVISION_RETENTION_DAYS = config('PAGE_REVISION_RETENTION_DAYS', default=30, cast=int)
+PAGE_REVISION_KEEP_LATEST = 10  # revisions per page kept regardless of age
+
+# Stored tenant sitemaps (see websites.sitemaps)
+SITEMAP_SHARD_SIZE = 50000  # URLs per sitemap file, the protocol maximum
+
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -176,6 +219,12 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Statically published tenant sites (see websites.publishing), served by nginx
+PUBLISHED_SITES_ROOT = config('PUBLISHED_SITES_ROOT', default=str(BASE_DIR / 'published'))
+PUBLISHED_RELEASES_KEPT = 3
+BUNDLE_PRUNE_GRACE = 60 * 60 * 24 * 14  # seconds an unreferenced CSS/JS bundle is kept (see websites.bundler)
+REPUBLISH_DEBOUNCE_SECONDS = 5  # coalesce bursts of edits into one incremental publish
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -223,6 +272,58 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'flush-contact-submissions': {
+        'task': 'websites.tasks.flush_contact_submissions',
+        'schedule': 10.0,  # seconds
+    },
+    'fold-analytics-counters': {
+        'task': 'websites.tasks.fold_analytics_counters',
+        'schedule': 60.0,  # seconds
+    },
+    'rollup-analytics': {
+        'task': 'websites.tasks.rollup_analytics',
+        'schedule': 15 * 60.0,  # seconds
+    },
+    'load-analytics-events': {
+        'task': 'websites.tasks.load_analytics_events',
+        'schedule': 10.0,  # seconds
+    },
+    'maintain-event-partitions': {
+        'task': 'websites.tasks.maintain_event_partitions',
+        'schedule': 60 * 60.0,  # seconds
+    },
+    'aggregate-sessions': {
+        'task': 'websites.tasks.aggregate_sessions',
+        'schedule': 60 * 60.0,  # seconds
+    },
+    'aggregate-sessions-yesterday': {
+        'task': 'websites.tasks.aggregate_sessions',
+        'schedule': crontab(hour=0, minute=45),  # after the last sessions of the day have ended
+        'args': (1,),
+    },
+}
+
+# Write-behind contact form buffer (see websites.contact)
+CONTACT_FLUSH_BATCH_SIZE = 500  # submissions per INSERT; a full batch triggers a flush
+CONTACT_FLUSH_MAX_BATCHES = 20  # batches per flush task run
+CONTACT_FLUSH_MAX_ATTEMPTS = 5  # failed flushes before a submission moves to the dead-letter list
+BUFFER_PROCESSING_LEASE = 60 * 10  # seconds before a dead worker's claimed batch is put back (see websites.buffers)
+
+# Beacon analytics counters (see websites.analytics)
+ANALYTICS_FOLD_BATCH_SIZE = 1000  # website/day buckets per upsert
+ANALYTICS_FOLD_MAX_BATCHES = 20  # batches per fold task run
+ANALYTICS_ROLLUP_LOOKBACK_HOURS = 48  # rollup buckets recomputed per run cover this much history
+
+# Raw page view events, partitioned by day (see websites.events)
+ANALYTICS_EVENT_BATCH_SIZE = 10000  # events per COPY
+ANALYTICS_EVENT_MAX_BATCHES = 20  # batches per load task run
+ANALYTICS_EVENT_MAX_ATTEMPTS = 5  # failed loads before an event moves to the dead-letter list
+ANALYTICS_EVENT_PARTITIONS_AHEAD = 7  # days of partitions created in advance
+ANALYTICS_EVENT_RETENTION_DAYS = config('ANALYTICS_EVENT_RETENTION_DAYS', default=35, cast=int)
+ANALYTICS_EVENT_RETENTION_DAYS_ADVANCED = config('ANALYTICS_EVENT_RETENTION_DAYS_ADVANCED', default=395, cast=int)  # advanced_analytics_enabled tenants
+ANALYTICS_SESSION_GAP = 30 * 60  # seconds of inactivity that end a session (see websites.sessions)
+SPAM_MODEL_THRESHOLD = 0.9  # spam probability at which a trained model flags a submission
 
 # OpenAI configuration
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
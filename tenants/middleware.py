@@ -0,0 +1,202 @@
+"""
+Tenant-resolving middleware with a two-tier hostname cache.
+
+django-tenants' TenantMainMiddleware looks up ``Domain`` joined to ``Client``
+on every request. With thousands of tenant hosts that lookup is the first
+database round trip of every request, so we put two cache tiers in front of it:
+
+1. A bounded in-process LRU (per gunicorn worker), with a short TTL so that
+   invalidations made by other processes are picked up quickly.
+2. The shared Redis cache (``CACHES['default']``), invalidated directly by
+   the ``Domain``/``Client`` signal handlers in ``tenants.signals``.
+
+Only when both tiers miss do we fall back to the database. Hostnames that
+match no tenant are cached too, for ``TENANT_CACHE_MISS_TIMEOUT`` seconds,
+so stray Host headers do not reach Postgres on every request.
+
+Hit/miss counters are kept in the shared cache so that they cover every
+worker. Each process adds its counts up locally and flushes them every
+``TENANT_CACHE_STATS_FLUSH`` lookups or seconds, so counting costs no
+round trip per request.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django_tenants.middleware.main import TenantMainMiddleware
+
+
+TENANT_CACHE_PREFIX = 'tenants:host:'
+TENANT_CACHE_STATS_KEY = 'tenants:cache-stats:{field}'
+# Cached in place of a tenant for hostnames that match none
+UNKNOWN_HOST = 'unknown-host'
+
+
+def tenant_cache_key(hostname):
+    """Return the shared cache key for a hostname."""
+    return f"{TENANT_CACHE_PREFIX}{hostname.lower()}"
+
+
+class TenantLRUCache:
+    """
+    Small thread-safe LRU mapping hostnames to tenant instances.
+    Each entry expires after ``ttl`` seconds.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, hostname):
+        with self._lock:
+            entry = self._data.get(hostname)
+            if entry is None:
+                return None
+            expires_at, tenant = entry
+            if expires_at < time.monotonic():
+                del self._data[hostname]
+                return None
+            self._data.move_to_end(hostname)
+            return tenant
+
+    def set(self, hostname, tenant, ttl=None):
+        with self._lock:
+            self._data[hostname] = (time.monotonic() + min(ttl or self.ttl, self.ttl), tenant)
+            self._data.move_to_end(hostname)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, hostname):
+        with self._lock:
+            self._data.pop(hostname, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _incr(key, amount):
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        if not cache.add(key, amount, None):
+            cache.incr(key, amount)
+
+
+class TenantCacheStats:
+    """
+    Hit/miss counters for the tenant cache, shared by all processes.
+    Counts are buffered per process and flushed to the shared cache.
+    """
+
+    FIELDS = ('local_hits', 'shared_hits', 'misses', 'unknown_hosts', 'invalidations')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = dict.fromkeys(self.FIELDS, 0)
+        self._flushed_at = time.monotonic()
+
+    def incr(self, field):
+        flush_every = getattr(settings, 'TENANT_CACHE_STATS_FLUSH', 100)
+        with self._lock:
+            self._pending[field] += 1
+            due = (
+                sum(self._pending.values()) >= flush_every
+                or time.monotonic() - self._flushed_at >= flush_every
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Add this process's buffered counts to the shared counters."""
+        with self._lock:
+            pending, self._pending = self._pending, dict.fromkeys(self.FIELDS, 0)
+            self._flushed_at = time.monotonic()
+        for field, amount in pending.items():
+            if amount:
+                _incr(TENANT_CACHE_STATS_KEY.format(field=field), amount)
+
+    def reset(self):
+        with self._lock:
+            self._pending = dict.fromkeys(self.FIELDS, 0)
+        cache.delete_many([TENANT_CACHE_STATS_KEY.format(field=field) for field in self.FIELDS])
+
+    def as_dict(self):
+        self.flush()
+        stored = cache.get_many([TENANT_CACHE_STATS_KEY.format(field=field) for field in self.FIELDS])
+        counts = {field: stored.get(TENANT_CACHE_STATS_KEY.format(field=field), 0) for field in self.FIELDS}
+        lookups = counts['local_hits'] + counts['shared_hits'] + counts['misses']
+        counts['lookups'] = lookups
+        counts['hit_rate'] = (
+            (counts['local_hits'] + counts['shared_hits']) / lookups if lookups else 0.0
+        )
+        # Entries in this process's LRU only
+        counts['local_size'] = len(local_tenant_cache)
+        return counts
+
+
+local_tenant_cache = TenantLRUCache(
+    max_size=getattr(settings, 'TENANT_CACHE_LOCAL_SIZE', 10000),
+    ttl=getattr(settings, 'TENANT_CACHE_LOCAL_TTL', 30),
+)
+tenant_cache_stats = TenantCacheStats()
+
+
+def invalidate_hostnames(hostnames):
+    """Drop the given hostnames from both cache tiers."""
+    hostnames = [hostname.lower() for hostname in hostnames if hostname]
+    if not hostnames:
+        return
+    for hostname in hostnames:
+        local_tenant_cache.delete(hostname)
+    cache.delete_many([tenant_cache_key(hostname) for hostname in hostnames])
+    tenant_cache_stats.incr('invalidations')
+
+
+class CachedTenantMiddleware(TenantMainMiddleware):
+    """
+    Drop-in replacement for TenantMainMiddleware that resolves the tenant
+    from the LRU or Redis before querying ``Domain``.
+    """
+
+    def get_tenant(self, domain_model, hostname):
+        hostname = hostname.lower()
+
+        tenant = local_tenant_cache.get(hostname)
+        if tenant is not None:
+            tenant_cache_stats.incr('local_hits')
+        else:
+            tenant = cache.get(tenant_cache_key(hostname))
+            if tenant is not None:
+                tenant_cache_stats.incr('shared_hits')
+                local_tenant_cache.set(hostname, tenant, self.get_timeout(tenant))
+        if tenant == UNKNOWN_HOST:
+            # Handled by the parent class like a database miss
+            raise domain_model.DoesNotExist
+        if tenant is not None:
+            return tenant
+
+        tenant_cache_stats.incr('misses')
+        try:
+            tenant = super().get_tenant(domain_model, hostname)
+        except domain_model.DoesNotExist:
+            tenant_cache_stats.incr('unknown_hosts')
+            cache.set(tenant_cache_key(hostname), UNKNOWN_HOST, self.get_timeout(UNKNOWN_HOST))
+            local_tenant_cache.set(hostname, UNKNOWN_HOST, self.get_timeout(UNKNOWN_HOST))
+            raise
+        cache.set(tenant_cache_key(hostname), tenant, self.get_timeout(tenant))
+        local_tenant_cache.set(hostname, tenant)
+        return tenant
+
+    @staticmethod
+    def get_timeout(tenant):
+        if tenant == UNKNOWN_HOST:
+            return getattr(settings, 'TENANT_CACHE_MISS_TIMEOUT', 60)
+        return getattr(settings, 'TENANT_CACHE_TIMEOUT', 60 * 60)
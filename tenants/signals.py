@@ -0,0 +1,37 @@
+"""
+Signal handlers keeping the hostname -> tenant cache consistent.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from websites.routing import bump_routing_version
+
+from .middleware import invalidate_hostnames
+from .models import Client, Domain
+
+
+@receiver(pre_save, sender=Domain)
+def remember_previous_domain(sender, instance, **kwargs):
+    """Keep the old hostname around so a renamed domain is evicted too."""
+    instance._previous_domain = None
+    if instance.pk:
+        instance._previous_domain = (
+            Domain.objects.filter(pk=instance.pk).values_list('domain', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Domain)
+@receiver(post_delete, sender=Domain)
+def invalidate_domain(sender, instance, **kwargs):
+    invalidate_hostnames([instance.domain, getattr(instance, '_previous_domain', None)])
+    # Tenant domains also decide which of the tenant's websites a host serves
+    bump_routing_version(instance.tenant.schema_name)
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def invalidate_client_domains(sender, instance, **kwargs):
+    # Cached entries hold the tenant instance itself, so every host that
+    # resolves to this client has to be refreshed.
+    hostnames = list(Domain.objects.filter(tenant_id=instance.pk).values_list('domain', flat=True))
+    invalidate_hostnames(hostnames)
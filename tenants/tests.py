@@ -1,3 +1,53 @@
-from django.test import TestCase
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+from django_tenants.middleware.main import TenantMainMiddleware
+
+from .middleware import CachedTenantMiddleware, TenantCacheStats, local_tenant_cache, tenant_cache_stats
+
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class DomainModel:
+    class DoesNotExist(Exception):
+        pass
+
+
+@override_settings(CACHES=LOCMEM_CACHE, TENANT_CACHE_STATS_FLUSH=1)
+class CachedTenantMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        local_tenant_cache.clear()
+        tenant_cache_stats.reset()
+        self.middleware = CachedTenantMiddleware(lambda request: None)
+
+    def test_known_host_is_looked_up_once(self):
+        tenant = SimpleNamespace(schema_name='acme')
+        with mock.patch.object(TenantMainMiddleware, 'get_tenant', return_value=tenant) as lookup:
+            self.assertIs(self.middleware.get_tenant(DomainModel, 'Shop.Example.com'), tenant)
+            self.assertIs(self.middleware.get_tenant(DomainModel, 'shop.example.com'), tenant)
+            local_tenant_cache.clear()
+            self.assertEqual(self.middleware.get_tenant(DomainModel, 'shop.example.com'), tenant)
+        self.assertEqual(lookup.call_count, 1)
+        stats = tenant_cache_stats.as_dict()
+        self.assertEqual((stats['misses'], stats['local_hits'], stats['shared_hits']), (1, 1, 1))
+
+    def test_unknown_host_is_cached(self):
+        with mock.patch.object(TenantMainMiddleware, 'get_tenant', side_effect=DomainModel.DoesNotExist) as lookup:
+            for _ in range(3):
+                with self.assertRaises(DomainModel.DoesNotExist):
+                    self.middleware.get_tenant(DomainModel, 'stray.example.net')
+        self.assertEqual(lookup.call_count, 1)
+        self.assertEqual(tenant_cache_stats.as_dict()['unknown_hosts'], 1)
+
+    def test_counters_are_shared_between_processes(self):
+        other_worker = TenantCacheStats()
+        tenant_cache_stats.incr('local_hits')
+        other_worker.incr('local_hits')
+        other_worker.incr('misses')
+        stats = tenant_cache_stats.as_dict()
+        self.assertEqual((stats['local_hits'], stats['misses'], stats['lookups']), (2, 1, 3))
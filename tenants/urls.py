@@ -12,4 +12,5 @@ urlpatterns = [
     path('', include(router.urls)),
     path('create/', views.CreateTenantView.as_view(), name='create_tenant'),
     path('switch/<str:tenant_id>/', views.SwitchTenantView.as_view(), name='switch_tenant'),
+    path('cache-stats/', views.TenantCacheStatsView.as_view(), name='tenant_cache_stats'),
 ]
\ No newline at end of file
@@ -3,7 +3,9 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.permissions import IsAdminUser
 from django.http import JsonResponse
+from .middleware import tenant_cache_stats
 from .models import Client, Domain
 from .serializers import ClientSerializer, DomainSerializer
 
@@ -34,3 +36,14 @@ class SwitchTenantView(APIView):
     def post(self, request, tenant_id):
         # Handle tenant switching logic here
         return Response({'status': f'switched to tenant {tenant_id}'}, status=status.HTTP_200_OK)
+
+class TenantCacheStatsView(APIView):
+    """View exposing the hostname -> tenant cache counters of all workers"""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        return Response(tenant_cache_stats.as_dict(), status=status.HTTP_200_OK)
+    
+    def delete(self, request):
+        tenant_cache_stats.reset()
+        return Response({'status': 'counters reset'}, status=status.HTTP_200_OK)
@@ -0,0 +1,186 @@
+"""
+Beacon-based analytics ingestion.
+
+Tenant pages report each view to the beacon endpoint, which counts it in
+Redis in a single pipelined round trip: a per website per day hash of
+counters with a daily and an hourly field per counter (``HINCRBY``),
+HyperLogLogs of visitor hashes for the day's and the hour's unique visitors
+(``PFADD``), and a set of the dirty ``schema:website:date`` buckets. The
+raw event is appended to a list that ``websites.events`` loads into the
+partitioned event table. Postgres is never touched on the hit path.
+
+The ``fold_analytics_counters`` task (on a beat schedule) takes the dirty
+buckets, reads their counters and HyperLogLog counts, and writes them to
+``WebsiteAnalytics`` and to the hourly ``AnalyticsRollup`` rows with one
+upsert each per tenant. Redis holds the running totals of the day, so
+folding writes absolute values and can be repeated safely; buckets expire
+from Redis a few days after their date.
+"""
+import hashlib
+import json
+import logging
+from datetime import date, datetime, time, timezone as dt_timezone
+from itertools import groupby
+
+from django.conf import settings
+from django.utils import timezone
+from django_redis import get_redis_connection
+from django_tenants.utils import schema_context
+
+from .models import AnalyticsRollup, Website, WebsiteAnalytics
+from .referrers import TRAFFIC_SOURCES
+
+
+ANALYTICS_DIRTY_KEY = 'websites:analytics:dirty'
+ANALYTICS_EVENTS_KEY = 'websites:analytics:events'
+ANALYTICS_COUNTERS_KEY = 'websites:analytics:counts:{bucket}'
+ANALYTICS_VISITORS_KEY = 'websites:analytics:visitors:{bucket}'
+ANALYTICS_HOUR_VISITORS_KEY = 'websites:analytics:visitors:{bucket}@{hour:02d}'
+BUCKET_TTL = 3 * 24 * 60 * 60  # seconds; buckets outlive their day long enough to be folded
+
+# Redis hash field -> WebsiteAnalytics field
+COUNTER_FIELDS = {
+    'views': 'page_views',
+    **{source: f'{source}_traffic' for source in TRAFFIC_SOURCES},
+}
+
+logger = logging.getLogger(__name__)
+
+
+def get_fold_batch_size():
+    return getattr(settings, 'ANALYTICS_FOLD_BATCH_SIZE', 1000)
+
+
+def visitor_hash(request, day):
+    """
+    Identify a visitor by address and user agent, salted with the day so the
+    hash cannot be followed across days.
+    """
+    ip = request.META.get('HTTP_X_REAL_IP') or request.META.get('REMOTE_ADDR', '')
+    agent = request.META.get('HTTP_USER_AGENT', '')
+    return hashlib.blake2b(f'{day}|{ip}|{agent}'.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def visitor_id(visitor):
+    """Return a visitor hash as a signed 64-bit integer, as stored with events."""
+    return int(visitor, 16) - (1 << 63)
+
+
+def record_hit(request, website_id, path='', referrer='', counters=('views',)):
+    """Count one page view of a website in Redis and buffer its raw event."""
+    now = timezone.now()
+    day = now.date().isoformat()
+    bucket = f'{request.tenant.schema_name}:{website_id}:{day}'
+    counters_key = ANALYTICS_COUNTERS_KEY.format(bucket=bucket)
+    visitors_key = ANALYTICS_VISITORS_KEY.format(bucket=bucket)
+    hour_visitors_key = ANALYTICS_HOUR_VISITORS_KEY.format(bucket=bucket, hour=now.hour)
+    visitor = visitor_hash(request, day)
+    with get_redis_connection('default').pipeline(transaction=False) as pipe:
+        for counter in counters:
+            pipe.hincrby(counters_key, counter, 1)
+            pipe.hincrby(counters_key, f'{counter}@{now.hour:02d}', 1)
+        pipe.pfadd(visitors_key, visitor)
+        pipe.pfadd(hour_visitors_key, visitor)
+        for key in (counters_key, visitors_key, hour_visitors_key):
+            pipe.expire(key, BUCKET_TTL)
+        pipe.sadd(ANALYTICS_DIRTY_KEY, bucket)
+        pipe.rpush(ANALYTICS_EVENTS_KEY, json.dumps([
+            request.tenant.schema_name, str(website_id), now.isoformat(), visitor_id(visitor), path, referrer,
+        ]))
+        pipe.execute()
+
+
+def _fields(counts, suffix=''):
+    return {field: int(counts.get(f'{counter}{suffix}'.encode(), 0)) for counter, field in COUNTER_FIELDS.items()}
+
+
+def read_buckets(buckets):
+    """
+    Return ``{bucket: (day, hours)}`` for the buckets still in Redis: the
+    day's ``WebsiteAnalytics`` values and ``{hour: values}`` for the hours
+    that had hits.
+    """
+    with get_redis_connection('default').pipeline(transaction=False) as pipe:
+        for bucket in buckets:
+            pipe.hgetall(ANALYTICS_COUNTERS_KEY.format(bucket=bucket))
+            pipe.pfcount(ANALYTICS_VISITORS_KEY.format(bucket=bucket))
+        replies = pipe.execute()
+
+    counts = {}
+    for index, bucket in enumerate(buckets):
+        if replies[2 * index]:
+            counts[bucket] = (replies[2 * index], replies[2 * index + 1])
+    active_hours = {
+        bucket: sorted({int(key.decode().partition('@')[2]) for key in bucket_counts if b'@' in key})
+        for bucket, (bucket_counts, _) in counts.items()
+    }
+    with get_redis_connection('default').pipeline(transaction=False) as pipe:
+        for bucket, hours in active_hours.items():
+            for hour in hours:
+                pipe.pfcount(ANALYTICS_HOUR_VISITORS_KEY.format(bucket=bucket, hour=hour))
+        hour_visitors = iter(pipe.execute())
+
+    values = {}
+    for bucket, (bucket_counts, visitors) in counts.items():
+        hours = {}
+        for hour in active_hours[bucket]:
+            hours[hour] = _fields(bucket_counts, f'@{hour:02d}')
+            hours[hour]['unique_visitors'] = next(hour_visitors)
+        values[bucket] = ({**_fields(bucket_counts), 'unique_visitors': visitors}, hours)
+    return values
+
+
+def save_buckets(schema_name, values):
+    """Upsert one tenant's folded buckets into ``WebsiteAnalytics`` and hourly rollups."""
+    update_fields = [*COUNTER_FIELDS.values(), 'unique_visitors']
+    with schema_context(schema_name):
+        website_ids = {bucket.split(':')[1] for bucket in values}
+        existing = {str(pk) for pk in Website.objects.filter(pk__in=website_ids).values_list('pk', flat=True)}
+        days, hours = [], []
+        for bucket, (day_values, hour_values) in values.items():
+            _, website_id, day = bucket.split(':')
+            if website_id not in existing:
+                continue
+            day = date.fromisoformat(day)
+            days.append(WebsiteAnalytics(website_id=website_id, date=day, **day_values))
+            for hour, row in hour_values.items():
+                start = datetime.combine(day, time(hour), tzinfo=dt_timezone.utc)
+                hours.append(AnalyticsRollup(website_id=website_id, resolution='hour', start=start, **row))
+        WebsiteAnalytics.objects.bulk_create(
+            days,
+            update_conflicts=True,
+            unique_fields=['website', 'date'],
+            update_fields=update_fields,
+            batch_size=get_fold_batch_size(),
+        )
+        AnalyticsRollup.objects.bulk_create(
+            hours,
+            update_conflicts=True,
+            unique_fields=['website', 'resolution', 'start'],
+            update_fields=[*update_fields, 'updated_at'],
+            batch_size=get_fold_batch_size(),
+        )
+    return len(days)
+
+
+def fold_buckets(size):
+    """
+    Fold up to ``size`` dirty buckets into the database. Returns
+    ``(taken, saved)``; buckets of tenants whose save failed are marked
+    dirty again.
+    """
+    redis = get_redis_connection('default')
+    buckets = sorted(bucket.decode() for bucket in redis.spop(ANALYTICS_DIRTY_KEY, size) or [])
+    if not buckets:
+        return 0, 0
+
+    values = read_buckets(buckets)
+    saved = 0
+    for schema_name, group in groupby(values.items(), key=lambda item: item[0].split(':')[0]):
+        group = dict(group)
+        try:
+            saved += save_buckets(schema_name, group)
+        except Exception:
+            logger.exception('Folding %d analytics buckets for %s failed', len(group), schema_name)
+            redis.sadd(ANALYTICS_DIRTY_KEY, *group)
+    return len(buckets), saved
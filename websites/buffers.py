@@ -0,0 +1,84 @@
+"""
+At-least-once consumption of the Redis lists that buffer writes.
+
+A consumer ``claim``s a batch by moving its items with ``LMOVE`` from the
+buffer into a processing list of its own, and ``acknowledge``s it once the
+items are stored, deleting the processing list (and putting items to retry
+back on the buffer) in one transaction. Items are therefore never only in
+the worker's memory: if the worker dies in between, the processing list
+outlives it.
+
+Every processing list has a lease key that expires after
+``BUFFER_PROCESSING_LEASE`` seconds. ``recover`` moves the items of
+processing lists whose lease has expired back to the front of their buffer,
+so they are consumed again (and may be stored twice if the worker died
+after storing them but before acknowledging).
+"""
+import uuid
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+
+def get_lease():
+    return getattr(settings, 'BUFFER_PROCESSING_LEASE', 60 * 10)
+
+
+def _registry_key(buffer_key):
+    return f'{buffer_key}:processing'
+
+
+def _lease_key(processing_key):
+    return f'{processing_key}:lease'
+
+
+def claim(buffer_key, size):
+    """
+    Move up to ``size`` items from the front of a buffer to a new processing
+    list. Returns ``(processing_key, items)``.
+    """
+    processing_key = f'{_registry_key(buffer_key)}:{uuid.uuid4().hex}'
+    with get_redis_connection('default').pipeline() as pipe:
+        pipe.set(_lease_key(processing_key), 1, ex=get_lease())
+        pipe.sadd(_registry_key(buffer_key), processing_key)
+        for _ in range(size):
+            pipe.lmove(buffer_key, processing_key, 'LEFT', 'RIGHT')
+        items = [item for item in pipe.execute()[2:] if item is not None]
+    if not items:
+        acknowledge(buffer_key, processing_key)
+    return processing_key, items
+
+
+def acknowledge(buffer_key, processing_key, retry=(), dead_letter_key=None, dead=()):
+    """
+    Drop a claimed batch once it has been stored. ``retry`` items go back to
+    the front of the buffer, in order, and ``dead`` items to the end of
+    ``dead_letter_key``.
+    """
+    with get_redis_connection('default').pipeline() as pipe:
+        if retry:
+            pipe.lpush(buffer_key, *reversed(retry))
+        if dead:
+            pipe.rpush(dead_letter_key, *dead)
+        pipe.delete(processing_key, _lease_key(processing_key))
+        pipe.srem(_registry_key(buffer_key), processing_key)
+        pipe.execute()
+
+
+def recover(buffer_key):
+    """
+    Put the items of processing lists whose consumer died back at the front
+    of the buffer. Returns the number of items recovered.
+    """
+    redis = get_redis_connection('default')
+    registry_key = _registry_key(buffer_key)
+    recovered = 0
+    for processing_key in redis.smembers(registry_key):
+        processing_key = processing_key.decode()
+        if redis.exists(_lease_key(processing_key)):
+            continue
+        # Taken from the end, so the items keep their order at the front
+        while redis.lmove(processing_key, buffer_key, 'RIGHT', 'LEFT') is not None:
+            recovered += 1
+        redis.srem(registry_key, processing_key)
+    return recovered
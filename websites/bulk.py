@@ -0,0 +1,223 @@
+"""
+Bulk create/update for pages and components.
+
+A bulk request is a JSON array (or NDJSON, one object per line) of items.
+Items with an ``id`` update that row, the others are created. Every item is
+validated on its own without touching the database; the websites and rows
+referenced by the whole batch are then loaded with one query each, page
+slugs are slugified and de-duplicated in memory against the existing
+``(website, slug)`` pairs, and all valid items are written with
+``bulk_create``/``bulk_update`` in chunks inside one transaction. Invalid
+items are reported and skipped.
+
+Bulk writes do not send model signals, so the caches and derived data the
+signal handlers in ``websites.signals`` would have updated are invalidated
+here once for the whole batch.
+"""
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+
+from .caching import bump_content_version, bump_website_version
+from .fragments import bump_components_version
+from .models import Page, Website
+from .navigation import invalidate_navigation_tree
+from .parsers import NDJSONParser
+from .revisions import schedule_revisions
+from .routing import bump_routing_version
+from .signals import schedule_republish
+from .sitemaps import rebuild_sitemap
+
+
+SLUG_MAX_LENGTH = 200
+
+
+def get_batch_size():
+    return getattr(settings, 'BULK_WRITE_BATCH_SIZE', 500)
+
+
+def get_max_items():
+    return getattr(settings, 'BULK_MAX_ITEMS', 5000)
+
+
+class SlugAllocator:
+    """
+    Hand out unique page slugs per website, checked against the slugs
+    already in the database and the ones given out in the same batch.
+    """
+
+    def __init__(self, website_ids):
+        self.taken = {website_id: {} for website_id in website_ids}
+        pages = Page.objects.filter(website_id__in=website_ids).values_list('website_id', 'slug', 'id')
+        for website_id, slug, page_id in pages.iterator(chunk_size=5000):
+            self.taken[website_id][slug] = page_id
+
+    def allocate(self, website_id, wanted, page_id):
+        taken = self.taken[website_id]
+        base = slugify(wanted)[:SLUG_MAX_LENGTH] or 'page'
+        slug, counter = base, 1
+        while taken.get(slug, page_id) != page_id:
+            counter += 1
+            suffix = f'-{counter}'
+            slug = base[:SLUG_MAX_LENGTH - len(suffix)] + suffix
+        taken[slug] = page_id
+        return slug
+
+
+def _result(index, result_status, instance=None, errors=None):
+    result = {'index': index, 'status': result_status}
+    if instance is not None:
+        result['id'] = str(instance.pk)
+        if isinstance(instance, Page):
+            result['slug'] = instance.slug
+    if errors:
+        result['errors'] = errors
+    return result
+
+
+def bulk_save(model, serializer_class, items):
+    """
+    Create or update ``model`` rows from a list of items and return one
+    result per item, in order.
+    """
+    results = [None] * len(items)
+    creates, updates = [], []
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = _result(index, 'error', errors={'non_field_errors': ['Expected an object.']})
+            continue
+        pk = item.get('id')
+        if pk is not None:
+            try:
+                pk = uuid.UUID(str(pk))
+            except ValueError:
+                results[index] = _result(index, 'error', errors={'id': ['Must be a valid UUID.']})
+                continue
+        serializer = serializer_class(data=item, partial=pk is not None)
+        if not serializer.is_valid():
+            results[index] = _result(index, 'error', errors=serializer.errors)
+            continue
+        if pk is None:
+            creates.append((index, serializer.validated_data))
+        else:
+            updates.append((index, pk, serializer.validated_data))
+
+    instances = model.objects.in_bulk([pk for _, pk, _ in updates])
+    website_ids = {data['website'] for _, data in creates}
+    website_ids |= {instance.website_id for instance in instances.values()}
+    existing_websites = set(Website.objects.filter(pk__in=website_ids).values_list('pk', flat=True))
+    slugs = SlugAllocator(existing_websites) if model is Page else None
+
+    new_objects = []
+    for index, data in creates:
+        if data['website'] not in existing_websites:
+            results[index] = _result(index, 'error', errors={'website': ['Website not found.']})
+            continue
+        data = dict(data)
+        instance = model(website_id=data.pop('website'), **data)
+        if slugs is not None:
+            instance.slug = slugs.allocate(instance.website_id, data.get('slug') or instance.title, instance.pk)
+        new_objects.append(instance)
+        results[index] = _result(index, 'created', instance)
+
+    now = timezone.now()
+    changed_objects, changed_fields, content_changed = [], set(), set()
+    for index, pk, data in updates:
+        instance = instances.get(pk)
+        if instance is None:
+            results[index] = _result(index, 'error', errors={'id': ['Not found.']})
+            continue
+        if 'website' in data and data.pop('website') != instance.website_id:
+            results[index] = _result(index, 'error', errors={'website': ['Cannot be changed.']})
+            continue
+        for field, value in data.items():
+            setattr(instance, field, value)
+        if slugs is not None and 'slug' in data:
+            instance.slug = slugs.allocate(instance.website_id, data['slug'] or instance.title, instance.pk)
+        # bulk_update() does not apply auto_now
+        instance.updated_at = now
+        changed_fields.update(data)
+        changed_objects.append(instance)
+        if 'content' in data:
+            content_changed.add(instance.pk)
+        results[index] = _result(index, 'updated', instance)
+
+    with transaction.atomic():
+        if new_objects:
+            model.objects.bulk_create(new_objects, batch_size=get_batch_size())
+        if changed_objects:
+            model.objects.bulk_update(changed_objects, sorted(changed_fields | {'updated_at'}), batch_size=get_batch_size())
+
+    written = {instance.website_id for instance in new_objects + changed_objects}
+    if written:
+        invalidate_after_bulk_write(model, written)
+    if model is Page:
+        schedule_revisions(
+            connection.schema_name,
+            [obj.pk for obj in new_objects] + [obj.pk for obj in changed_objects if obj.pk in content_changed],
+        )
+    return results
+
+
+def invalidate_after_bulk_write(model, website_ids):
+    """Do once what the model signal handlers would have done per row."""
+    schema_name = connection.schema_name
+    bump_content_version(schema_name)
+    for website_id in website_ids:
+        bump_website_version(schema_name, website_id)
+    websites = Website.objects.filter(pk__in=website_ids)
+    if model is Page:
+        bump_routing_version(schema_name)
+        for website in websites:
+            invalidate_navigation_tree(website.pk)
+            rebuild_sitemap(website)
+    else:
+        for website_id in website_ids:
+            bump_components_version(website_id)
+    for website_id in websites.filter(is_published=True).values_list('pk', flat=True):
+        schedule_republish(schema_name, website_id)
+
+
+class BulkSaveViewSetMixin:
+    """
+    Adds a ``bulk`` action (``POST <prefix>/bulk/``) accepting a JSON array,
+    ``{"items": [...]}`` or NDJSON. Responds 200 when every item was
+    written and 207 when some items were rejected.
+    """
+    bulk_serializer_class = None
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get('items')
+        if not isinstance(items, list):
+            return Response({'error': 'Expected a list of items'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > get_max_items():
+            return Response(
+                {'error': f'At most {get_max_items()} items can be written at once'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        model = self.bulk_serializer_class.Meta.model
+        results = bulk_save(model, self.bulk_serializer_class, items)
+        counts = {'created': 0, 'updated': 0, 'error': 0}
+        for result in results:
+            counts[result['status']] += 1
+        return Response(
+            {
+                'created': counts['created'],
+                'updated': counts['updated'],
+                'errors': counts['error'],
+                'results': results,
+            },
+            status=status.HTTP_207_MULTI_STATUS if counts['error'] else status.HTTP_200_OK,
+        )
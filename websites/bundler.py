@@ -0,0 +1,181 @@
+"""
+Content-hashed CSS/JS bundles for tenant pages.
+
+The CSS and JavaScript of a page and the components it uses are
+concatenated, de-duplicated and minified into one bundle per kind. Bundles
+are written once, with gzip/brotli variants next to them, to
+``<PUBLISHED_SITES_ROOT>/bundles/<hash>.<kind>`` and
+never change afterwards, so they are served with ``Cache-Control:
+immutable`` just like the hashed files of CompressedManifestStaticFilesStorage.
+
+The mapping from a page's sources to its bundle names is cached under a key
+built from the ids and ``updated_at`` of the page and components, so a
+bundle is only rebuilt when one of its source fields changes.
+
+Bundles no kept release references are removed by ``prune_bundles`` (run
+by the publisher when it prunes releases) once they are older than
+``BUNDLE_PRUNE_GRACE``. The bundle root is shared by every site and also
+serves dynamically rendered pages, which have no manifest, so
+``write_bundle`` refreshes the modification time of a bundle it finds
+already written: a bundle still in use is never older than the grace
+period.
+"""
+import hashlib
+import os
+import re
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .compression import ENCODING_SUFFIXES, write_variants
+
+
+BUNDLE_URL = '/_assets/'
+BUNDLE_NAME_RE = re.compile(r'^[0-9a-f]{16}\.(css|js)$')
+BUNDLE_CACHE_KEY = 'websites:bundle:{digest}'
+BUNDLE_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+BUNDLE_PRUNE_KEY = 'websites:bundle-prune'
+BUNDLE_PRUNE_INTERVAL = 60 * 60
+
+CSS_STRING_RE = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+CSS_SPACE_RE = re.compile(r'\s+')
+CSS_PUNCTUATION_RE = re.compile(r'\s*([{};,>])\s*')
+# Only the space after a colon is safe to drop ("a :hover" != "a:hover")
+CSS_COLON_RE = re.compile(r':\s+')
+
+
+def get_bundle_root():
+    return Path(settings.PUBLISHED_SITES_ROOT) / 'bundles'
+
+
+def get_prune_grace():
+    # Must outlast the cached bundle names plus the page cache
+    return getattr(settings, 'BUNDLE_PRUNE_GRACE', 60 * 60 * 24 * 14)
+
+
+def minify_css(css):
+    """Strip comments and redundant whitespace, leaving strings untouched."""
+    parts = CSS_STRING_RE.split(css)
+    for i in range(0, len(parts), 2):
+        part = CSS_COMMENT_RE.sub('', parts[i])
+        part = CSS_SPACE_RE.sub(' ', part)
+        part = CSS_PUNCTUATION_RE.sub(r'\1', part)
+        parts[i] = CSS_COLON_RE.sub(':', part).replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def minify_js(js):
+    """
+    Conservatively shrink JavaScript by dropping trailing whitespace and
+    blank lines. Anything more aggressive needs a real parser (regex
+    literals, template strings, ASI) and is not worth the risk here.
+    """
+    lines = (line.rstrip() for line in js.strip().splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+MINIFIERS = {'css': minify_css, 'js': minify_js}
+SEPARATORS = {'css': '\n', 'js': ';\n'}
+
+
+def build_bundle(kind, chunks):
+    """Concatenate, de-duplicate and minify source chunks of one kind."""
+    seen = set()
+    minified = []
+    for chunk in chunks:
+        if not chunk or not chunk.strip():
+            continue
+        chunk = MINIFIERS[kind](chunk)
+        digest = hashlib.sha1(chunk.encode('utf-8')).digest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        minified.append(chunk)
+    return SEPARATORS[kind].join(minified)
+
+
+def write_bundle(kind, content, brotli_quality=None):
+    """Write a bundle under its content hash and return the file name."""
+    data = content.encode('utf-8')
+    name = f"{hashlib.sha256(data).hexdigest()[:16]}.{kind}"
+    path = get_bundle_root() / name
+    if not path.exists():
+        # Variants first, so the bundle never exists without them
+        write_variants(path, data, _write_file, brotli_quality)
+        _write_file(path, data)
+    else:
+        # Still in use, keep it from being pruned
+        os.utime(path)
+    return name
+
+
+def _write_file(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _sources_digest(page, components):
+    parts = [f"{c.pk}:{c.updated_at.isoformat()}" for c in components]
+    parts.append(f"{page.pk}:{page.updated_at.isoformat()}")
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def get_page_bundles(page, components, brotli_quality=None):
+    """
+    Return ``{'css': name, 'js': name}`` for a page and the components it
+    renders (empty kinds are left out), building the bundles if needed.
+    ``brotli_quality`` is passed on to ``compress_variants``.
+    """
+    key = BUNDLE_CACHE_KEY.format(digest=_sources_digest(page, components))
+    names = cache.get(key)
+    if names is not None and all((get_bundle_root() / name).exists() for name in names.values()):
+        return names
+
+    sources = {
+        'css': [c.css_styles for c in components] + [page.css_styles],
+        'js': [c.javascript_code for c in components] + [page.javascript_code],
+    }
+    names = {}
+    for kind, chunks in sources.items():
+        content = build_bundle(kind, chunks)
+        if content:
+            names[kind] = write_bundle(kind, content, brotli_quality)
+    cache.set(key, names, BUNDLE_CACHE_TIMEOUT)
+    return names
+
+
+def prune_bundles(referenced):
+    """
+    Delete the bundles (and their variants) whose names are not in
+    ``referenced`` and that are older than ``BUNDLE_PRUNE_GRACE``. Returns
+    the names deleted.
+    """
+    root = get_bundle_root()
+    if not root.exists():
+        return []
+    cutoff = time.time() - get_prune_grace()
+    pruned = []
+    for path in root.iterdir():
+        if not BUNDLE_NAME_RE.match(path.name) or path.name in referenced:
+            continue
+        try:
+            if path.stat().st_mtime >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        # Variants first, as write_bundle only looks for the bundle itself
+        for suffix in ENCODING_SUFFIXES.values():
+            path.with_name(path.name + suffix).unlink(missing_ok=True)
+        path.unlink(missing_ok=True)
+        pruned.append(path.name)
+    return pruned
+
+
+def bundle_urls(names):
+    return {kind: BUNDLE_URL + name for kind, name in names.items()}
@@ -0,0 +1,259 @@
+"""
+Full-page render cache for public tenant pages.
+
+Rendered pages are stored in the shared cache under a key built from the
+tenant schema, the request host, the page slug, the routed website and page
+and the content versions of both. The signal handlers in
+``websites.signals`` bump the website version when something every page of
+the website renders changes (the website itself, its components and
+navigation, or a page that appears in the navigation) and only the page
+version when a page changes on its own, which makes the affected cached
+pages unreachable without having to know their keys. Other websites of the
+tenant keep their cached pages.
+
+The tenant-wide content version is still bumped on every change; it only
+feeds the API validators (see ``websites.conditional``) and the search cache.
+
+Each entry also holds gzip/brotli variants of the page, compressed once at
+render time and picked per request from ``Accept-Encoding``.
+
+Streamed responses (see ``websites.rendering.stream_page``) are passed
+through to the client as they are produced and stored once the last chunk
+has been sent.
+
+Entries carry a soft expiry. Once it passes, a single process (the one that
+wins the render lock) re-renders the page while concurrent requests keep
+serving the stale copy, so an expiring hot page does not turn into N
+simultaneous renders across gunicorn workers. Without a stale copy, other
+requests wait briefly (``PAGE_CACHE_LOCK_WAIT``) for the render and then
+render the page themselves without storing it rather than hold a worker.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import parse_http_date_safe
+
+from .compression import choose_encoding, compress_variants, variant_etag
+from .routing import is_protected_route, route_request
+
+
+CONTENT_VERSION_KEY = 'websites:version:{schema}'
+WEBSITE_VERSION_KEY = 'websites:version:{schema}:website:{website_id}'
+PAGE_VERSION_KEY = 'websites:version:{schema}:page:{page_id}'
+PAGE_CACHE_KEY = 'websites:page:{schema}:{website_id}.{website_version}:{page_id}.{page_version}:{digest}'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _get_versions(keys):
+    """Return the versions stored under ``keys``, in one round trip unless some are missing."""
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, 1, None)
+            versions[key] = cache.get(key, 1)
+    return [versions[key] for key in keys]
+
+
+def _bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Key missing (evicted or never set); restart above any old value
+        version = int(time.time())
+        cache.set(key, version, None)
+        return version
+
+
+def get_content_version(schema_name):
+    """Return the current content version of a tenant schema."""
+    return _get_versions([CONTENT_VERSION_KEY.format(schema=schema_name)])[0]
+
+
+def bump_content_version(schema_name):
+    """Mark the content of a tenant schema as changed (API validators only)."""
+    return _bump_version(CONTENT_VERSION_KEY.format(schema=schema_name))
+
+
+def get_page_versions(schema_name, website_id, page_id=None):
+    """Return the ``(website version, page version)`` pair a rendered page depends on."""
+    return tuple(_get_versions([
+        WEBSITE_VERSION_KEY.format(schema=schema_name, website_id=website_id),
+        PAGE_VERSION_KEY.format(schema=schema_name, page_id=page_id),
+    ]))
+
+
+def bump_website_version(schema_name, website_id):
+    """Invalidate every cached page of a website."""
+    return _bump_version(WEBSITE_VERSION_KEY.format(schema=schema_name, website_id=website_id))
+
+
+def bump_page_version(schema_name, page_id):
+    """Invalidate the cached copies of one page."""
+    return _bump_version(PAGE_VERSION_KEY.format(schema=schema_name, page_id=page_id))
+
+
+def page_cache_key(request, page_slug=''):
+    """Build the cache key for a public page request."""
+    schema_name = request.tenant.schema_name
+    host = request.get_host().lower()
+    digest = hashlib.md5(f"{host}|{page_slug}".encode()).hexdigest()
+    # Routing needs no database access (see websites.routing)
+    website_id, page_id = route_request(request, page_slug)
+    website_version, page_version = get_page_versions(schema_name, website_id, page_id)
+    return PAGE_CACHE_KEY.format(
+        schema=schema_name,
+        website_id=website_id,
+        website_version=website_version,
+        page_id=page_id,
+        page_version=page_version,
+        digest=digest,
+    )
+
+
+def is_cacheable_request(request, page_slug=''):
+    """
+    Only anonymous GET/HEAD requests for pages anyone may see are served
+    from the page cache.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if not _setting('PAGE_CACHE_ENABLED', True):
+        return False
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return False
+    return not is_protected_route(request, page_slug)
+
+
+def _response_from_entry(request, entry, cache_status):
+    variants = entry.get('variants', {})
+    encoding = choose_encoding(request, variants)
+    response = HttpResponse(
+        variants[encoding] if encoding else entry['content'],
+        content_type=entry['content_type'],
+    )
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if variants:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    etag = variant_etag(entry.get('ETag'), encoding)
+    if etag:
+        response['ETag'] = etag
+    if entry.get('Last-Modified'):
+        response['Last-Modified'] = entry['Last-Modified']
+    response['X-Page-Cache'] = cache_status
+    # Revalidation against the stored validators needs no database access
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=parse_http_date_safe(entry.get('Last-Modified') or ''),
+        response=response,
+    )
+
+
+def _store_response(key, response, content=None):
+    """Store a rendered response with its compressed variants and return the entry."""
+    if content is None:
+        if response.status_code != 200 or response.streaming:
+            return None
+        content = response.content
+    timeout = _setting('PAGE_CACHE_TIMEOUT', 60 * 60 * 24)
+    entry = {
+        'content': content,
+        'variants': compress_variants(content),
+        'content_type': response['Content-Type'],
+        'ETag': response.get('ETag'),
+        'Last-Modified': response.get('Last-Modified'),
+        'fresh_until': time.time() + timeout,
+    }
+    cache.set(key, entry, timeout + _setting('PAGE_CACHE_STALE_GRACE', 60 * 5))
+    return entry
+
+
+def _stream_and_store(key, lock_key, response, streaming_content):
+    """
+    Pass a streaming response's chunks through and store the joined page
+    once the stream is complete. The render lock is held until then so that
+    concurrent requests wait for (or serve the stale copy of) this render.
+    """
+    chunks = []
+    try:
+        for chunk in streaming_content:
+            chunks.append(chunk)
+            yield chunk
+        _store_response(key, response, b''.join(chunks))
+    finally:
+        cache.delete(lock_key)
+
+
+def cached_page_response(request, key, render):
+    """
+    Return the cached response for ``key``, calling ``render()`` to produce
+    (and store) it when needed. ``render`` must return a rendered response.
+    """
+    entry = cache.get(key)
+    if entry is not None and entry['fresh_until'] > time.time():
+        return _response_from_entry(request, entry, 'HIT')
+
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, 1, _setting('PAGE_CACHE_LOCK_TIMEOUT', 30)):
+        streaming = False
+        try:
+            response = render()
+            if response.streaming and response.status_code == 200:
+                streaming = True
+                response.streaming_content = _stream_and_store(
+                    key, lock_key, response, response.streaming_content
+                )
+                response['X-Page-Cache'] = 'MISS'
+                return response
+            entry = _store_response(key, response)
+            if entry is None:
+                return response
+            return _response_from_entry(request, entry, 'MISS')
+        finally:
+            if not streaming:
+                cache.delete(lock_key)
+
+    # Another worker is rendering this page
+    if entry is not None:
+        return _response_from_entry(request, entry, 'STALE')
+
+    deadline = time.time() + _setting('PAGE_CACHE_LOCK_WAIT', 0.2)
+    while time.time() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return _response_from_entry(request, entry, 'HIT')
+
+    # The lock holder has not finished yet; render without storing
+    response = render()
+    response['X-Page-Cache'] = 'BYPASS'
+    return response
+
+
+class CachedPageMixin:
+    """
+    Serve a TemplateView through the page cache.
+    Views using it must be keyed by ``page_slug`` (empty for the home page).
+    """
+
+    def get(self, request, *args, **kwargs):
+        if not is_cacheable_request(request, kwargs.get('page_slug', '')):
+            return super().get(request, *args, **kwargs)
+
+        def render():
+            response = super(CachedPageMixin, self).get(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+
+        key = page_cache_key(request, kwargs.get('page_slug', ''))
+        return cached_page_response(request, key, render)
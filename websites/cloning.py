@@ -0,0 +1,152 @@
+"""
+Set-based website cloning.
+
+A website is copied with its pages, components and navigation tree using
+one ``INSERT ... SELECT`` per table instead of saving objects one by one.
+New primary keys are assigned up front in temporary mapping tables (old id
+-> new id) that the copies join against, which is also how page links and
+``Navigation.parent`` are re-pointed inside the copied tree. Component
+markers in page content are rewritten to the new component ids with a
+single ``UPDATE ... FROM`` against the component mapping table.
+
+Source and target tables are schema-qualified, so a website can be cloned
+into another tenant's schema in the same database.
+"""
+import uuid
+
+from django.db import connection, transaction
+from django_tenants.utils import get_tenant_model, schema_context
+
+from .caching import bump_content_version
+from .models import Component, Navigation, Page, Website
+from .rendering import COMPONENT_REF_RE
+from .routing import bump_routing_version
+from .sitemaps import rebuild_sitemap
+
+
+class CloneError(Exception):
+    pass
+
+
+def _table(schema_name, model):
+    quote = connection.ops.quote_name
+    return f'{quote(schema_name)}.{quote(model._meta.db_table)}'
+
+
+def _columns(model, overrides):
+    """
+    Return the column list of ``model`` and the matching SELECT expressions:
+    ``overrides`` by column name, otherwise the source column ``src.<column>``.
+    """
+    quote = connection.ops.quote_name
+    columns = [field.column for field in model._meta.concrete_fields]
+    expressions = [overrides.get(column, f'src.{quote(column)}') for column in columns]
+    return ', '.join(quote(column) for column in columns), ', '.join(expressions)
+
+
+def _copy(cursor, model, source_schema, target_schema, overrides, joins, where, params):
+    columns, expressions = _columns(model, overrides)
+    cursor.execute(
+        f'INSERT INTO {_table(target_schema, model)} ({columns}) '
+        f'SELECT {expressions} FROM {_table(source_schema, model)} src {joins} WHERE {where}',
+        params,
+    )
+    return cursor.rowcount
+
+
+def clone_website(website_id, name, subdomain, source_schema=None, target_schema=None):
+    """
+    Clone a website with its pages, components and navigation and return
+    ``(new_website_id, counts)``. Schemas default to the current one. The
+    clone starts unpublished and without a custom domain.
+    """
+    source_schema = source_schema or connection.schema_name
+    target_schema = target_schema or connection.schema_name
+    new_id = uuid.uuid4()
+    suffix = new_id.hex[:12]
+    page_map, component_map, navigation_map = (f'clone_{kind}_map_{suffix}' for kind in ('page', 'component', 'navigation'))
+    counts = {}
+
+    tenants = get_tenant_model().objects.filter(schema_name__in=[source_schema, target_schema])
+    if tenants.count() != len({source_schema, target_schema}):
+        raise CloneError('Tenant schema not found')
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'SELECT 1 FROM {_table(target_schema, Website)} WHERE subdomain = %s', [subdomain])
+        if cursor.fetchone():
+            raise CloneError(f'Subdomain "{subdomain}" is already in use')
+
+        # Placeholders are filled in column order: id, name, subdomain
+        counts['websites'] = _copy(
+            cursor, Website, source_schema, target_schema,
+            {
+                'id': '%s', 'name': '%s', 'subdomain': '%s', 'custom_domain': "''",
+                'is_published': 'false', 'created_at': 'now()', 'updated_at': 'now()',
+            },
+            '', 'src.id = %s', [new_id, name, subdomain, website_id],
+        )
+        if not counts['websites']:
+            raise CloneError('Website not found')
+
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {page_map} ON COMMIT DROP AS '
+            f'SELECT id AS old_id, gen_random_uuid() AS new_id FROM {_table(source_schema, Page)} WHERE website_id = %s',
+            [website_id],
+        )
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {component_map} ON COMMIT DROP AS '
+            f'SELECT id AS old_id, gen_random_uuid() AS new_id FROM {_table(source_schema, Component)} WHERE website_id = %s',
+            [website_id],
+        )
+        navigation_table = _table(target_schema, Navigation)
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {navigation_map} ON COMMIT DROP AS '
+            f"SELECT id AS old_id, nextval(pg_get_serial_sequence(%s, 'id')) AS new_id "
+            f'FROM {_table(source_schema, Navigation)} WHERE website_id = %s',
+            [navigation_table, website_id],
+        )
+
+        counts['pages'] = _copy(
+            cursor, Page, source_schema, target_schema,
+            {'id': 'm.new_id', 'website_id': '%s', 'created_at': 'now()', 'updated_at': 'now()'},
+            f'JOIN {page_map} m ON m.old_id = src.id', 'src.website_id = %s', [new_id, website_id],
+        )
+        counts['components'] = _copy(
+            cursor, Component, source_schema, target_schema,
+            {'id': 'm.new_id', 'website_id': '%s', 'created_at': 'now()', 'updated_at': 'now()'},
+            f'JOIN {component_map} m ON m.old_id = src.id', 'src.website_id = %s', [new_id, website_id],
+        )
+        counts['navigation'] = _copy(
+            cursor, Navigation, source_schema, target_schema,
+            {'id': 'm.new_id', 'website_id': '%s', 'page_id': 'pm.new_id', 'parent_id': 'parent.new_id'},
+            f'JOIN {navigation_map} m ON m.old_id = src.id '
+            f'LEFT JOIN {page_map} pm ON pm.old_id = src.page_id '
+            f'LEFT JOIN {navigation_map} parent ON parent.old_id = src.parent_id',
+            'src.website_id = %s', [new_id, website_id],
+        )
+
+        # Point [[component:<uuid>]] markers at the copied components in one
+        # statement: split the content at the markers, map each marker's id
+        # through the component map and join the pieces back together
+        pages_table = _table(target_schema, Page)
+        cursor.execute(
+            f'UPDATE {pages_table} p SET content = rewritten.content FROM ('
+            f"SELECT src.id, string_agg(part.chunk || coalesce('[[component:' || "
+            f"coalesce(m.new_id::text, ref.id) || ']]', ''), '' ORDER BY part.n) AS content "
+            f'FROM {pages_table} src '
+            f'CROSS JOIN LATERAL regexp_split_to_table(src.content, %s) WITH ORDINALITY AS part(chunk, n) '
+            f'LEFT JOIN LATERAL ('
+            f"SELECT found[1] AS id, n FROM regexp_matches(src.content, %s, 'g') WITH ORDINALITY AS refs(found, n)"
+            f') ref ON ref.n = part.n '
+            f'LEFT JOIN {component_map} m ON m.old_id::text = lower(ref.id) '
+            f'WHERE src.website_id = %s AND src.content ~ %s '
+            f'GROUP BY src.id'
+            f') rewritten WHERE p.id = rewritten.id',
+            [COMPONENT_REF_RE.pattern, COMPONENT_REF_RE.pattern, new_id, COMPONENT_REF_RE.pattern],
+        )
+
+    with schema_context(target_schema):
+        rebuild_sitemap(Website.objects.get(pk=new_id))
+        bump_content_version(target_schema)
+        bump_routing_version(target_schema)
+    return new_id, counts
@@ -0,0 +1,95 @@
+"""
+Precompressed gzip/brotli variants of rendered pages and bundles.
+
+Variants are produced once, when a page is rendered into the page cache or
+published, instead of on every response. Brotli is optional: without the
+``brotli`` package only gzip variants are produced.
+
+Brotli at quality 11 compresses best but costs far more CPU than the
+bandwidth it saves over quality 4-5, so variants produced while a request
+waits use ``COMPRESS_BROTLI_QUALITY`` and only the publisher, which runs in
+a worker, uses ``COMPRESS_BROTLI_QUALITY_STATIC``.
+"""
+import gzip
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+
+# File suffix of each variant, in order of preference
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def available_encodings():
+    return [encoding for encoding in ENCODING_SUFFIXES if encoding != 'br' or brotli is not None]
+
+
+def get_brotli_quality(static=False):
+    """Return the brotli quality for request-time (or, with ``static``, published) variants."""
+    if static:
+        return getattr(settings, 'COMPRESS_BROTLI_QUALITY_STATIC', 11)
+    return getattr(settings, 'COMPRESS_BROTLI_QUALITY', 5)
+
+
+def compress_variants(data, brotli_quality=None):
+    """
+    Return ``{encoding: compressed bytes}`` for ``data``. Data below
+    ``COMPRESS_MIN_LENGTH`` or variants that do not shrink it are skipped.
+    ``brotli_quality`` defaults to the request-time quality.
+    """
+    if len(data) < getattr(settings, 'COMPRESS_MIN_LENGTH', 1024):
+        return {}
+    if brotli_quality is None:
+        brotli_quality = get_brotli_quality()
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=brotli_quality)
+    return {encoding: variant for encoding, variant in variants.items() if len(variant) < len(data)}
+
+
+def parse_accept_encoding(header):
+    """Return the ``{coding: q}`` preferences of an Accept-Encoding header."""
+    preferences = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        preferences[coding] = q
+    return preferences
+
+
+def choose_encoding(request, available):
+    """
+    Pick the preferred encoding of ``available`` accepted by the client,
+    or None to send the identity representation.
+    """
+    preferences = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    for encoding in ENCODING_SUFFIXES:
+        if encoding in available and preferences.get(encoding, preferences.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def variant_etag(etag, encoding):
+    """Give each encoding its own strong ETag, as RFC 9110 requires."""
+    if not etag or not encoding:
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def write_variants(path, data, write, brotli_quality=None):
+    """Write the compressed variants of ``data`` next to ``path`` with ``write(path, bytes)``."""
+    for encoding, variant in compress_variants(data, brotli_quality).items():
+        write(path.with_name(path.name + ENCODING_SUFFIXES[encoding]), variant)
@@ -0,0 +1,130 @@
+"""
+Conditional GET support (ETag / Last-Modified / 304) for tenant pages and
+the website read APIs.
+
+Validators are computed before anything is rendered or serialized, so a
+client revalidating an unchanged resource gets a 304 without the template
+or serializer running. ETags include the content versions (see
+``websites.caching``) so that changes without a timestamp of their own,
+such as navigation edits, still produce a new ETag: page ETags the website
+and page versions, API ETags the tenant version.
+"""
+import hashlib
+
+from django.db import connection
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .caching import get_content_version, get_page_versions
+from .models import Component
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest())
+
+
+def to_timestamp(value):
+    return int(value.timestamp()) if value else None
+
+
+def set_validators(response, etag, last_modified):
+    """Add ETag/Last-Modified headers unless the response already has them."""
+    if etag:
+        response.headers.setdefault('ETag', etag)
+    if last_modified and not response.has_header('Last-Modified'):
+        response.headers['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def page_validators(website, page):
+    """
+    Return ``(etag, last_modified)`` for a tenant page from the page, the
+    website and the latest change to the website's components.
+    """
+    components_updated = Component.objects.filter(website_id=website.pk).aggregate(
+        last_modified=Max('updated_at')
+    )['last_modified']
+    timestamps = [t for t in (website.updated_at, page and page.updated_at, components_updated) if t]
+    etag = make_etag(
+        website.pk,
+        page.pk if page else '',
+        *[t.isoformat() for t in timestamps],
+        *get_page_versions(connection.schema_name, website.pk, page.pk if page else None),
+    )
+    return etag, to_timestamp(max(timestamps))
+
+
+class ConditionalPageMixin:
+    """
+    Answer conditional requests for tenant site pages before rendering.
+    Views provide ``get_site_objects()`` returning ``(website, page)``.
+    """
+
+    def get_site_objects(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        website, page = self.get_site_objects()
+        if website is None:
+            return super().get(request, *args, **kwargs)
+
+        etag, last_modified = page_validators(website, page)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+
+class ConditionalViewSetMixin:
+    """
+    Conditional list/retrieve for DRF viewsets.
+
+    The list validator is computed with a single aggregate query (row count
+    and latest ``last_modified_field``) over the filtered queryset. Models
+    without a modification timestamp set ``last_modified_field = None`` and
+    rely on the tenant content version alone.
+    """
+    last_modified_field = 'updated_at'
+
+    def _conditional(self, request, etag, last_modified, respond):
+        response = get_conditional_response(request, etag=etag, last_modified=to_timestamp(last_modified))
+        if response is None:
+            response = respond()
+        return set_validators(response, etag, to_timestamp(last_modified))
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        aggregates = {'count': Count('pk')}
+        if self.last_modified_field:
+            aggregates['last_modified'] = Max(self.last_modified_field)
+        summary = queryset.aggregate(**aggregates)
+        last_modified = summary.get('last_modified')
+
+        etag = make_etag(
+            request.get_full_path(),
+            request.user.pk,
+            summary['count'],
+            last_modified.isoformat() if last_modified else '',
+            get_content_version(connection.schema_name),
+        )
+        return self._conditional(
+            request, etag, last_modified,
+            lambda: super(ConditionalViewSetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        last_modified = getattr(instance, self.last_modified_field) if self.last_modified_field else None
+
+        etag = make_etag(
+            instance.pk,
+            request.user.pk,
+            last_modified.isoformat() if last_modified else '',
+            get_content_version(connection.schema_name),
+        )
+        return self._conditional(
+            request, etag, last_modified,
+            lambda: Response(self.get_serializer(instance).data),
+        )
@@ -0,0 +1,158 @@
+"""
+Write-behind buffer for contact form submissions.
+
+The tenant contact view validates a submission, appends it to a Redis list
+and answers right away. The ``flush_contact_submissions`` task (on the
+``website_operations`` queue) pops submissions in batches, scores them for
+spam and bulk-inserts them into each tenant's ``ContactForm`` table. The
+task runs on a beat schedule and is also queued as soon as a full batch is
+waiting, so a burst is written in a few large INSERTs instead of one per
+request.
+
+Batches are claimed into a processing list and only dropped from Redis
+once their INSERTs have committed (see ``websites.buffers``), so a worker
+dying mid-flush loses nothing. A tenant group that fails to save is pushed
+back to the front of the list to be retried. Submissions that have failed
+``CONTACT_FLUSH_MAX_ATTEMPTS`` times are moved to a dead-letter list
+instead, so one broken tenant cannot block the buffer forever.
+
+Submissions keep the time they were made: ``created_at`` is set from the
+buffered ``submitted_at``.
+
+The traffic source of a submission is classified from the referrer the
+visitor first arrived with, which the site pages keep in the
+``landing_referrer`` cookie; the Referer of the POST itself is the site's
+own contact page.
+"""
+import json
+import logging
+from datetime import datetime
+from itertools import groupby
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+from django_tenants.utils import schema_context
+
+from .buffers import acknowledge, claim
+from .models import ContactForm, Website
+from .referrers import classify_referrer
+from .spam import score_batch
+
+
+CONTACT_BUFFER_KEY = 'websites:contact-buffer'
+CONTACT_FLUSH_PENDING_KEY = 'websites:contact-flush-pending'
+CONTACT_DEAD_LETTER_KEY = 'websites:contact-dead-letter'
+SUBMISSION_FIELDS = ('name', 'email', 'phone', 'company', 'subject', 'message')
+# Set by the site pages (websites/page_tail.html)
+LANDING_REFERRER_COOKIE = 'landing_referrer'
+
+logger = logging.getLogger(__name__)
+
+
+def get_batch_size():
+    return getattr(settings, 'CONTACT_FLUSH_BATCH_SIZE', 500)
+
+
+def get_max_attempts():
+    return getattr(settings, 'CONTACT_FLUSH_MAX_ATTEMPTS', 5)
+
+
+def client_ip(request):
+    # nginx sets X-Real-IP to the client address
+    return request.META.get('HTTP_X_REAL_IP') or request.META.get('REMOTE_ADDR')
+
+
+def buffer_submission(request, website, cleaned_data, honeypot=False):
+    """Append a validated submission to the buffer."""
+    from .tasks import flush_contact_submissions
+
+    payload = {field: cleaned_data.get(field, '') for field in SUBMISSION_FIELDS}
+    payload.update(
+        schema_name=request.tenant.schema_name,
+        website_id=str(website.pk),
+        ip_address=client_ip(request),
+        user_agent=request.META.get('HTTP_USER_AGENT', ''),
+        referrer=request.META.get('HTTP_REFERER', '')[:200],
+        landing_referrer=unquote(request.COOKIES.get(LANDING_REFERRER_COOKIE, ''))[:2000],
+        host=request.get_host().split(':', 1)[0],
+        honeypot=honeypot,
+        submitted_at=timezone.now().isoformat(),
+    )
+    length = get_redis_connection('default').rpush(CONTACT_BUFFER_KEY, json.dumps(payload))
+    if length >= get_batch_size() and cache.add(CONTACT_FLUSH_PENDING_KEY, 1, 10):
+        flush_contact_submissions.delay()
+
+
+def pop_batch(size):
+    """
+    Claim up to ``size`` submissions off the buffer. Returns
+    ``(processing_key, submissions)``; the batch stays in Redis until
+    ``finish_batch`` is called.
+    """
+    processing_key, items = claim(CONTACT_BUFFER_KEY, size)
+    return processing_key, [json.loads(item) for item in items]
+
+
+def finish_batch(processing_key, failed=()):
+    """
+    Drop a claimed batch whose submissions are saved. The ``failed`` ones go
+    back to the front of the buffer, in order, or to the dead-letter list
+    once out of attempts. Returns the number dead-lettered.
+    """
+    retry, dead = [], []
+    for submission in failed:
+        submission['attempts'] = submission.get('attempts', 0) + 1
+        (dead if submission['attempts'] >= get_max_attempts() else retry).append(json.dumps(submission))
+    acknowledge(CONTACT_BUFFER_KEY, processing_key, retry, CONTACT_DEAD_LETTER_KEY, dead)
+    if dead:
+        logger.error('Moved %d contact submissions to %s', len(dead), CONTACT_DEAD_LETTER_KEY)
+    return len(dead)
+
+
+def save_submissions(schema_name, submissions):
+    """Score and bulk-insert one tenant's submissions; returns the number saved."""
+    with schema_context(schema_name):
+        website_ids = {s['website_id'] for s in submissions}
+        existing = {str(pk) for pk in Website.objects.filter(pk__in=website_ids).values_list('pk', flat=True)}
+        submissions = [s for s in submissions if s['website_id'] in existing]
+        flags = score_batch(submissions, schema_name)
+        with transaction.atomic():
+            ContactForm.objects.bulk_create(
+                [
+                    ContactForm(
+                        website_id=s['website_id'],
+                        ip_address=s['ip_address'],
+                        user_agent=s['user_agent'],
+                        referrer=s['referrer'],
+                        traffic_source=classify_referrer(s.get('landing_referrer', ''), s.get('host')),
+                        is_spam=is_spam,
+                        created_at=datetime.fromisoformat(s['submitted_at']),
+                        **{field: s[field] for field in SUBMISSION_FIELDS},
+                    )
+                    for s, is_spam in zip(submissions, flags)
+                ],
+                batch_size=get_batch_size(),
+            )
+    return len(submissions)
+
+
+def flush_batch(submissions):
+    """
+    Save a batch of submissions grouped by tenant. Returns
+    ``(saved, failed)``, where ``failed`` lists the submissions of the
+    tenants whose save raised.
+    """
+    saved, failed = 0, []
+    submissions = sorted(submissions, key=lambda s: s['schema_name'])
+    for schema_name, group in groupby(submissions, key=lambda s: s['schema_name']):
+        group = list(group)
+        try:
+            saved += save_submissions(schema_name, group)
+        except Exception:
+            logger.exception('Saving %d contact submissions for %s failed', len(group), schema_name)
+            failed.extend(group)
+    return saved, failed
@@ -0,0 +1,208 @@
+"""
+Raw page view events.
+
+Each beacon hit is also appended to a Redis list (see
+``websites.analytics.record_hit``). The ``load_analytics_events`` task pops
+batches off it and loads each tenant's events into its
+``websites_pageviewevent`` table with a single ``COPY``.
+
+The table is range-partitioned by day (``websites_pageviewevent_pYYYYMMDD``).
+``maintain_partitions`` creates the partitions of the next few days and
+drops whole partitions older than the tenant's retention, which is longer
+for tenants with advanced analytics; dropping a partition is instant and
+leaves no dead rows behind, unlike a ``DELETE``. The loader also creates
+missing partitions for the days of the events it loads and skips events
+older than the retention.
+
+Batches are claimed into a processing list and only dropped from Redis
+once their COPYs have completed (see ``websites.buffers``), so a loader
+dying mid-COPY loses nothing. Events of a tenant whose load fails go back
+to the front of the list with an attempt count appended; after
+``ANALYTICS_EVENT_MAX_ATTEMPTS`` failed loads they are moved to a
+dead-letter list instead.
+"""
+import csv
+import io
+import json
+import logging
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import groupby
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django_tenants.utils import schema_context
+
+from .analytics import ANALYTICS_EVENTS_KEY
+from .buffers import acknowledge, claim
+from .models import PageViewEvent, Website
+
+
+ANALYTICS_EVENTS_DEAD_LETTER_KEY = 'websites:analytics:events-dead-letter'
+EVENT_COLUMNS = ('website_id', 'occurred_at', 'visitor', 'path', 'referrer')
+EVENT_FIELDS = 6  # buffered event fields before the attempt count
+PARTITION_NAME_RE = re.compile(r'_p(\d{8})$')
+
+logger = logging.getLogger(__name__)
+
+
+def get_load_batch_size():
+    return getattr(settings, 'ANALYTICS_EVENT_BATCH_SIZE', 10000)
+
+
+def get_max_attempts():
+    return getattr(settings, 'ANALYTICS_EVENT_MAX_ATTEMPTS', 5)
+
+
+def get_retention_days(tenant):
+    if tenant.advanced_analytics_enabled:
+        return getattr(settings, 'ANALYTICS_EVENT_RETENTION_DAYS_ADVANCED', 395)
+    return getattr(settings, 'ANALYTICS_EVENT_RETENTION_DAYS', 35)
+
+
+def partition_name(day):
+    return f'{PageViewEvent._meta.db_table}_p{day:%Y%m%d}'
+
+
+def existing_partitions():
+    """Return ``{day: partition name}`` of the event table in the current schema."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'JOIN pg_namespace ns ON ns.oid = parent.relnamespace '
+            'WHERE parent.relname = %s AND ns.nspname = current_schema()',
+            [PageViewEvent._meta.db_table],
+        )
+        names = [name for name, in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME_RE.search(name)
+        if match:
+            partitions[datetime.strptime(match.group(1), '%Y%m%d').date()] = name
+    return partitions
+
+
+def create_partitions(days):
+    """Create the daily partitions of ``days`` that do not exist yet."""
+    missing = sorted(set(days) - set(existing_partitions()))
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for day in missing:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {quote(partition_name(day))} '
+                f'PARTITION OF {quote(PageViewEvent._meta.db_table)} '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [
+                    datetime.combine(day, datetime.min.time(), tzinfo=dt_timezone.utc),
+                    datetime.combine(day + timedelta(days=1), datetime.min.time(), tzinfo=dt_timezone.utc),
+                ],
+            )
+    return missing
+
+
+def drop_partitions(before):
+    """Drop the daily partitions of days before ``before``."""
+    quote = connection.ops.quote_name
+    dropped = []
+    with connection.cursor() as cursor:
+        for day, name in sorted(existing_partitions().items()):
+            if day < before:
+                cursor.execute(f'DROP TABLE IF EXISTS {quote(name)}')
+                dropped.append(day)
+    return dropped
+
+
+def maintain_partitions(tenant, days_ahead=None):
+    """
+    Create the current tenant's partitions for today and the next
+    ``days_ahead`` days and drop the expired ones. Returns
+    ``(created, dropped)`` lists of days.
+    """
+    if days_ahead is None:
+        days_ahead = getattr(settings, 'ANALYTICS_EVENT_PARTITIONS_AHEAD', 7)
+    today = timezone.now().date()
+    created = create_partitions(today + timedelta(days=offset) for offset in range(days_ahead + 1))
+    dropped = drop_partitions(today - timedelta(days=get_retention_days(tenant)))
+    return created, dropped
+
+
+def pop_events(size):
+    """
+    Claim up to ``size`` buffered events off the list. Returns
+    ``(processing_key, events)``; the batch stays in Redis until
+    ``finish_events`` is called.
+    """
+    processing_key, items = claim(ANALYTICS_EVENTS_KEY, size)
+    return processing_key, [json.loads(item) for item in items]
+
+
+def finish_events(processing_key, failed=()):
+    """
+    Drop a claimed batch whose events are loaded. The ``failed`` ones go back
+    to the front of the list, in order, or to the dead-letter list once out
+    of attempts. Returns the number dead-lettered.
+    """
+    retry, dead = [], []
+    for event in failed:
+        attempts = event[EVENT_FIELDS] + 1 if len(event) > EVENT_FIELDS else 1
+        event = json.dumps([*event[:EVENT_FIELDS], attempts])
+        (dead if attempts >= get_max_attempts() else retry).append(event)
+    acknowledge(ANALYTICS_EVENTS_KEY, processing_key, retry, ANALYTICS_EVENTS_DEAD_LETTER_KEY, dead)
+    if dead:
+        logger.error('Moved %d analytics events to %s', len(dead), ANALYTICS_EVENTS_DEAD_LETTER_KEY)
+    return len(dead)
+
+
+def copy_events(tenant, events):
+    """
+    Load one tenant's buffered events (``[schema, website_id, occurred_at,
+    visitor, path, referrer]`` lists) with ``COPY``. Returns the number loaded.
+    """
+    with schema_context(tenant.schema_name):
+        cutoff = timezone.now().date() - timedelta(days=get_retention_days(tenant))
+        website_ids = {event[1] for event in events}
+        existing = {str(pk) for pk in Website.objects.filter(pk__in=website_ids).values_list('pk', flat=True)}
+        rows = []
+        for _, website_id, occurred_at, visitor, path, referrer in (event[:EVENT_FIELDS] for event in events):
+            occurred_at = datetime.fromisoformat(occurred_at)
+            if website_id in existing and occurred_at.date() >= cutoff:
+                rows.append((website_id, occurred_at, visitor, path, referrer))
+        if not rows:
+            return 0
+        create_partitions({row[1].date() for row in rows})
+
+        data = io.StringIO()
+        csv.writer(data).writerows(rows)
+        data.seek(0)
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {quote(PageViewEvent._meta.db_table)} ({", ".join(EVENT_COLUMNS)}) '
+                f'FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (path, referrer))',
+                data,
+            )
+    return len(rows)
+
+
+def load_events(events, tenants):
+    """
+    Load a batch of events grouped by tenant. ``tenants`` maps schema names
+    to tenants. Returns ``(loaded, failed)``, where ``failed`` lists the
+    events of the tenants whose load raised.
+    """
+    loaded, failed = 0, []
+    events = sorted(events, key=lambda event: event[0])
+    for schema_name, group in groupby(events, key=lambda event: event[0]):
+        group = list(group)
+        tenant = tenants.get(schema_name)
+        if tenant is None:
+            continue
+        try:
+            loaded += copy_events(tenant, group)
+        except Exception:
+            logger.exception('Loading %d analytics events for %s failed', len(group), schema_name)
+            failed.extend(group)
+    return loaded, failed
@@ -0,0 +1,124 @@
+"""
+Streaming CSV/NDJSON exports.
+
+Rows are read with a server-side cursor (``QuerySet.iterator``) as plain
+value tuples and encoded into chunks of about ``EXPORT_CHUNK_BYTES`` that
+a ``StreamingHttpResponse`` sends as they are produced, so an export holds
+one cursor chunk and one output chunk in memory however many rows it has.
+"""
+import csv
+import io
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def get_cursor_chunk_size():
+    return getattr(settings, 'EXPORT_CURSOR_CHUNK_SIZE', 2000)
+
+
+def get_chunk_bytes():
+    return getattr(settings, 'EXPORT_CHUNK_BYTES', 64 * 1024)
+
+
+def _buffered(lines):
+    """Join encoded lines into chunks of about ``EXPORT_CHUNK_BYTES``."""
+    limit = get_chunk_bytes()
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= limit:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def csv_lines(fields, rows):
+    output = io.StringIO()
+    writer = csv.writer(output)
+
+    def line(values):
+        writer.writerow(values)
+        value = output.getvalue()
+        output.seek(0)
+        output.truncate()
+        return value
+
+    yield line(fields)
+    for row in rows:
+        yield line(row)
+
+
+def ndjson_lines(fields, rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+def stream_export(queryset, fields, file_format, filename):
+    """Return a streaming response exporting ``fields`` of every row of ``queryset``."""
+    rows = queryset.values_list(*fields).iterator(chunk_size=get_cursor_chunk_size())
+    lines = csv_lines(fields, rows) if file_format == 'csv' else ndjson_lines(fields, rows)
+    response = StreamingHttpResponse(_buffered(lines), content_type=EXPORT_FORMATS[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+class ExportViewSetMixin:
+    """
+    Adds an ``export`` action (``GET <prefix>/export/``) streaming
+    ``export_fields`` of the viewset's queryset as CSV (default) or NDJSON
+    (``?file_format=ndjson``), optionally filtered by ``website`` and by a
+    ``since``/``until`` date range on ``export_date_field``.
+    """
+    export_fields = ()
+    export_date_field = None
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f'file_format must be one of: {", ".join(EXPORT_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = self.get_queryset().order_by(self.export_date_field, 'pk')
+        for param, lookup in (('since', 'gte'), ('until', 'lte')):
+            value = request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                day = parse_date(value)
+            except ValueError:  # well formed but not a real date, e.g. 2024-02-30
+                day = None
+            if day is None:
+                return Response({'error': f'{param} must be a date (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+            field = self.export_date_field
+            if queryset.model._meta.get_field(field).get_internal_type() == 'DateTimeField':
+                field = f'{field}__date'
+            queryset = queryset.filter(**{f'{field}__{lookup}': day})
+        if request.query_params.get('website'):
+            try:
+                queryset = queryset.filter(website_id=request.query_params['website'])
+            except ValidationError:
+                return Response({'error': 'Website not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        filename = f'{queryset.model._meta.model_name}-{timezone.now():%Y%m%d}'
+        return stream_export(queryset, self.export_fields, file_format, filename)
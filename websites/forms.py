@@ -0,0 +1,29 @@
+from django import forms
+from .models import ContactForm
+
+
+class ContactSubmissionForm(forms.ModelForm):
+    """
+    Contact form shown on tenant websites.
+    ``website_url`` is a honeypot: it is hidden from people, so a value
+    means the form was filled in by a bot.
+    """
+    website_url = forms.CharField(
+        required=False,
+        widget=forms.TextInput(attrs={
+            'autocomplete': 'off',
+            'tabindex': '-1',
+        })
+    )
+    
+    class Meta:
+        model = ContactForm
+        fields = ['name', 'email', 'phone', 'company', 'subject', 'message']
+        widgets = {
+            'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Your Name'}),
+            'email': forms.EmailInput(attrs={'class': 'form-control', 'placeholder': 'Email Address'}),
+            'phone': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Phone Number (Optional)'}),
+            'company': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Company (Optional)'}),
+            'subject': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Subject'}),
+            'message': forms.Textarea(attrs={'class': 'form-control', 'rows': 6, 'placeholder': 'Message'}),
+        }
@@ -0,0 +1,140 @@
+"""
+Fragment cache for global components.
+
+Global components (header, navbar, footer, ...) render identically on every
+page of a website, so they are rendered once per website component version
+and the HTML is shared by all pages and gunicorn workers through the shared
+cache. Saving or deleting a component bumps the website's component version
+(see ``websites.signals``).
+
+Each website has a single entry of plain values: the joined HTML of each
+region, the component version it was rendered at and the bundle sources of
+the global components. The entry and the current version are read together
+in one round trip; an entry of an older version is a miss. Misses are
+counted per tenant, hits only for a ``FRAGMENT_STATS_SAMPLE`` sample so that
+a hit costs no extra round trip.
+"""
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .models import Component
+
+
+HEADER_COMPONENT_TYPES = ('header', 'navbar')
+FOOTER_COMPONENT_TYPES = ('footer',)
+# Component fields the page bundles are built from (see websites.bundler)
+ASSET_FIELDS = ('id', 'updated_at', 'css_styles', 'javascript_code')
+
+COMPONENTS_VERSION_KEY = 'websites:components-version:{schema}:{website_id}'
+FRAGMENTS_KEY = 'websites:fragments:{schema}:{website_id}'
+FRAGMENT_STATS_KEY = 'websites:fragment-stats:{schema}:{field}'
+FRAGMENTS_TIMEOUT = 60 * 60 * 24
+
+
+def get_stats_sample():
+    return getattr(settings, 'FRAGMENT_STATS_SAMPLE', 100)
+
+
+def _incr(key, amount=1):
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        if not cache.add(key, amount, None):
+            cache.incr(key, amount)
+
+
+def get_components_version(website_id, schema_name=None):
+    key = COMPONENTS_VERSION_KEY.format(schema=schema_name or connection.schema_name, website_id=website_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_components_version(website_id, schema_name=None):
+    key = COMPONENTS_VERSION_KEY.format(schema=schema_name or connection.schema_name, website_id=website_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time()), None)
+
+
+def render_fragments(global_components):
+    """
+    Render global components into header, main and footer fragments, with
+    the components' bundle sources as plain values under ``assets``.
+    """
+    regions = {'header': [], 'main': [], 'footer': []}
+    for component in global_components:
+        if component.component_type in HEADER_COMPONENT_TYPES:
+            regions['header'].append(component.html_content)
+        elif component.component_type in FOOTER_COMPONENT_TYPES:
+            regions['footer'].append(component.html_content)
+        else:
+            regions['main'].append(component.html_content)
+    fragments = {region: ''.join(parts) for region, parts in regions.items()}
+    fragments['assets'] = [
+        {field: getattr(component, field) for field in ASSET_FIELDS} for component in global_components
+    ]
+    return fragments
+
+
+def get_global_fragments(website, global_components=None):
+    """
+    Return the rendered global fragments of a website, plus the global
+    ``components`` they were rendered from (for asset bundling; on a hit
+    these are unsaved instances holding only ``ASSET_FIELDS``). On a miss
+    ``global_components`` is used if given, otherwise they are queried.
+    """
+    schema_name = connection.schema_name
+    version_key = COMPONENTS_VERSION_KEY.format(schema=schema_name, website_id=website.pk)
+    key = FRAGMENTS_KEY.format(schema=schema_name, website_id=website.pk)
+    found = cache.get_many([version_key, key])
+    version, entry = found.get(version_key), found.get(key)
+
+    if version is not None and entry is not None and entry['version'] == version:
+        sample = get_stats_sample()
+        if random.random() * sample < 1:
+            _incr(FRAGMENT_STATS_KEY.format(schema=schema_name, field='hits'), sample)
+    else:
+        _incr(FRAGMENT_STATS_KEY.format(schema=schema_name, field='misses'))
+        if version is None:
+            version = get_components_version(website.pk, schema_name)
+        if global_components is None:
+            global_components = list(website.components.filter(is_global=True))
+        entry = {'version': version, **render_fragments(global_components)}
+        cache.set(key, entry, FRAGMENTS_TIMEOUT)
+
+    if global_components is None:
+        global_components = [Component(is_global=True, **values) for values in entry['assets']]
+    return {
+        'header': entry['header'],
+        'main': entry['main'],
+        'footer': entry['footer'],
+        'components': global_components,
+    }
+
+
+def get_fragment_stats(schema_name=None):
+    """
+    Return the fragment cache hit/miss counters of a tenant. Hits are
+    estimated from a sample (see ``FRAGMENT_STATS_SAMPLE``).
+    """
+    schema_name = schema_name or connection.schema_name
+    counts = cache.get_many([
+        FRAGMENT_STATS_KEY.format(schema=schema_name, field=field) for field in ('hits', 'misses')
+    ])
+    hits = counts.get(FRAGMENT_STATS_KEY.format(schema=schema_name, field='hits'), 0)
+    misses = counts.get(FRAGMENT_STATS_KEY.format(schema=schema_name, field='misses'), 0)
+    lookups = hits + misses
+    return {
+        'schema': schema_name,
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / lookups if lookups else 0.0,
+    }
@@ -0,0 +1,184 @@
+"""
+Responsive images for tenant pages.
+
+``<img>`` tags in page content that point at a ``MediaFile`` upload are
+rewritten to use the variants generated by the media library
+(``ImageOptimization``): a ``srcset``/``sizes`` built from the resized
+variants, a ``<picture>`` WebP source when a WebP conversion exists, explicit
+``width``/``height`` (so the layout does not shift while images load) and
+``loading="lazy"``. All media files referenced by a page are loaded with one
+query plus one for their variants.
+
+Tags that already have a ``srcset`` or sit inside a ``<picture>`` are left
+alone, as are images that are not media library uploads.
+"""
+import html
+import re
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.html import escape
+
+from media_library.models import MediaFile
+
+
+# Resized variants used in srcset. Thumbnails are square crops, so using
+# them would distort images with a different aspect ratio.
+SRCSET_VARIANTS = ('small', 'medium', 'large')
+WEBP_VARIANT = 'webp'
+
+IMAGE_RE = re.compile(r'(<picture\b.*?</picture\s*>)|(<img\b[^>]*>)', re.I | re.S)
+ATTRIBUTE_RE = re.compile(r'''([^\s"'<>/=]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s"'=<>`]+))?''')
+
+
+def parse_attributes(tag):
+    """Return the attributes of an ``<img ...>`` tag as an ordered dict."""
+    body = tag[4:-1].rstrip('/')
+    attributes = {}
+    for name, value in ATTRIBUTE_RE.findall(body):
+        if value[:1] in ('"', "'"):
+            value = value[1:-1]
+        attributes.setdefault(name.lower(), html.unescape(value))
+    return attributes
+
+
+def build_tag(name, attributes):
+    parts = [name]
+    for key, value in attributes.items():
+        parts.append(f'{key}="{escape(value)}"')
+    return '<' + ' '.join(parts) + '>'
+
+
+def media_file_name(src):
+    """Return the storage name of a media library URL, or None."""
+    media = urlparse(settings.MEDIA_URL)
+    url = urlparse(src)
+    if url.netloc and media.netloc and url.netloc != media.netloc:
+        return None
+    if not media.path or not url.path.startswith(media.path):
+        return None
+    return unquote(url.path[len(media.path):]) or None
+
+
+def find_image_sources(content):
+    """Return the media file names of the rewritable images in ``content``."""
+    names = []
+    for match in IMAGE_RE.finditer(content or ''):
+        if match.group(2):
+            attributes = parse_attributes(match.group(2))
+            if 'srcset' not in attributes:
+                name = media_file_name(attributes.get('src') or '')
+                if name:
+                    names.append(name)
+    return names
+
+
+def load_media_files(names):
+    """Return ``{name: MediaFile}`` for the image files among ``names``."""
+    if not names:
+        return {}
+    files = MediaFile.objects.filter(file__in=set(names), file_type='image').prefetch_related('optimizations')
+    return {media_file.file.name: media_file for media_file in files}
+
+
+def _variants(media_file):
+    return {variant.optimization_type: variant for variant in media_file.optimizations.all()}
+
+
+def build_srcset(media_file, variants):
+    candidates = {}
+    for variant_type in SRCSET_VARIANTS:
+        variant = variants.get(variant_type)
+        if variant and (not media_file.width or variant.width < media_file.width):
+            candidates[variant.width] = variant.optimized_file.url
+    if media_file.width:
+        candidates[media_file.width] = media_file.file.url
+    if len(candidates) < 2:
+        return ''
+    return ', '.join(f'{url} {width}w' for width, url in sorted(candidates.items()))
+
+
+def responsive_image(attributes, media_file, lazy=True):
+    """Return the responsive markup for one ``<img>`` tag."""
+    variants = _variants(media_file)
+    attributes = dict(attributes)
+
+    if media_file.width and media_file.height and 'height' not in attributes:
+        if 'width' not in attributes:
+            attributes['width'] = str(media_file.width)
+            attributes['height'] = str(media_file.height)
+        elif attributes['width'].isdigit():
+            attributes['height'] = str(round(int(attributes['width']) * media_file.height / media_file.width))
+    display_width = attributes.get('width') if (attributes.get('width') or '').isdigit() else media_file.width
+    sizes = f'(max-width: {display_width}px) 100vw, {display_width}px' if display_width else '100vw'
+
+    srcset = build_srcset(media_file, variants)
+    if srcset:
+        attributes['srcset'] = srcset
+        attributes.setdefault('sizes', sizes)
+    if 'alt' not in attributes and media_file.alt_text:
+        attributes['alt'] = media_file.alt_text
+    if lazy:
+        attributes.setdefault('loading', 'lazy')
+    attributes.setdefault('decoding', 'async')
+    img = build_tag('img', attributes)
+
+    webp = variants.get(WEBP_VARIANT)
+    if webp is None:
+        return img
+    source = build_tag('source', {
+        'type': 'image/webp',
+        'srcset': f'{webp.optimized_file.url} {webp.width}w',
+        'sizes': attributes.get('sizes', sizes),
+    })
+    return f'<picture>{source}{img}</picture>'
+
+
+def rewrite_images(content, media_files=None):
+    """
+    Rewrite the media library images in ``content`` as responsive images.
+    The first image is not lazy-loaded since it is usually above the fold.
+    """
+    if not content or '<img' not in content.lower():
+        return content or ''
+    if media_files is None:
+        media_files = load_media_files(find_image_sources(content))
+    if not media_files:
+        return content
+
+    seen_images = 0
+
+    def replace(match):
+        nonlocal seen_images
+        seen_images += 1
+        if match.group(1):
+            return match.group(1)
+        attributes = parse_attributes(match.group(2))
+        media_file = None
+        if 'srcset' not in attributes:
+            media_file = media_files.get(media_file_name(attributes.get('src') or ''))
+        if media_file is None:
+            return match.group(2)
+        return responsive_image(attributes, media_file, lazy=seen_images > 1)
+
+    return IMAGE_RE.sub(replace, content)
+
+
+def media_fingerprints(names):
+    """
+    Return ``{name: fingerprint}`` for the image files among ``names``, for
+    detecting that rendered pages referencing them need re-rendering.
+    Files that do not exist are left out.
+    """
+    if not names:
+        return {}
+    files = (
+        MediaFile.objects.filter(file__in=set(names), file_type='image')
+        .annotate(variant_count=Count('optimizations'), variant_created=Max('optimizations__created_at'))
+        .values_list('file', 'updated_at', 'variant_count', 'variant_created')
+    )
+    return {
+        name: [updated.isoformat(), variant_count, variant_created and variant_created.isoformat()]
+        for name, updated, variant_count, variant_created in files
+    }
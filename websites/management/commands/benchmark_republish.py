@@ -0,0 +1,88 @@
+import tempfile
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from django_tenants.utils import get_tenant_model, schema_context
+
+from websites.models import Component, Navigation, Page, Website
+from websites.publishing import SitePublisher
+
+
+class Command(BaseCommand):
+    help = 'Benchmark an incremental re-publish after a single component edit'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('schema', type=str, help='Tenant schema to run the benchmark in')
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=1000,
+            help='Number of pages in the generated site (default: 1000)'
+        )
+        parser.add_argument(
+            '--embed-every',
+            type=int,
+            default=50,
+            help='Embed the edited component in every Nth page (default: 50)'
+        )
+    
+    def handle(self, *args, **options):
+        schema_name = options['schema']
+        page_count = options['pages']
+        embed_every = options['embed_every']
+        
+        with schema_context(schema_name), tempfile.TemporaryDirectory() as root, \
+                override_settings(PUBLISHED_SITES_ROOT=root), transaction.atomic():
+            tenant = get_tenant_model().objects.get(schema_name=schema_name)
+            website = Website.objects.create(
+                name='Republish benchmark',
+                subdomain=f'bench-{uuid.uuid4().hex[:12]}',
+            )
+            header = Component.objects.create(
+                website=website, name='Header', component_type='header', is_global=True,
+                html_content='<header>Benchmark</header>', css_styles='header { padding: 1rem; }',
+            )
+            embedded = Component.objects.create(
+                website=website, name='Call to action', component_type='custom',
+                html_content='<section class="cta">Call us</section>', css_styles='.cta { color: red; }',
+            )
+            Navigation.objects.create(website=website, label='Home', url='/')
+            
+            body = '<p>' + 'Lorem ipsum dolor sit amet. ' * 200 + '</p>'
+            Page.objects.bulk_create([
+                Page(
+                    website=website,
+                    title=f'Page {i}',
+                    slug=f'page-{i}',
+                    content=body + (f'[[component:{embedded.pk}]]' if i % embed_every == 0 else ''),
+                    is_published=True,
+                    is_homepage=(i == 0),
+                    order=i,
+                )
+                for i in range(page_count)
+            ], batch_size=500)
+            
+            started = time.perf_counter()
+            SitePublisher(website, tenant).publish()
+            full_seconds = time.perf_counter() - started
+            self.stdout.write(f'Full publish: {page_count} pages in {full_seconds:.2f}s')
+            
+            for label, component in (('embedded', embedded), ('global', header)):
+                component.html_content += '.'
+                component.save()
+                publisher = SitePublisher(website, tenant)
+                started = time.perf_counter()
+                publisher.publish(incremental=True)
+                seconds = time.perf_counter() - started
+                self.stdout.write(
+                    f'Re-publish after {label} component edit: '
+                    f'{publisher.rendered_pages} pages re-rendered in {seconds:.2f}s'
+                )
+            
+            # Leave no trace of the generated site
+            transaction.set_rollback(True)
+        
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
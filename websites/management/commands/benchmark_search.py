@@ -0,0 +1,97 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django_tenants.utils import schema_context
+
+from websites.models import Page, Website
+from websites.search import search_pages
+
+
+WORDS = (
+    'garden', 'kitchen', 'bakery', 'studio', 'repair', 'bicycle', 'coffee', 'yoga', 'dental', 'plumbing',
+    'wedding', 'photography', 'consulting', 'accounting', 'tutoring', 'catering', 'florist', 'roofing',
+    'design', 'marketing', 'training', 'cleaning', 'pricing', 'booking', 'delivery', 'opening', 'hours',
+    'contact', 'services', 'gallery', 'events', 'menu', 'team', 'history', 'offers', 'reviews',
+)
+TARGET_P95_MS = 50
+
+
+class Command(BaseCommand):
+    help = 'Benchmark full-text page search latency against the p95 target'
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema', type=str, help='Tenant schema to run the benchmark in')
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=10000,
+            help='Number of pages in the generated site (default: 10000)'
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=500,
+            help='Number of timed searches (default: 500)'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument(
+            '--target',
+            type=float,
+            default=TARGET_P95_MS,
+            help=f'p95 latency target in ms; the command fails above it (default: {TARGET_P95_MS})'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        page_count = options['pages']
+
+        with schema_context(options['schema']), transaction.atomic():
+            website = Website.objects.create(
+                name='Search benchmark',
+                subdomain=f'bench-{uuid.uuid4().hex[:12]}',
+            )
+            Page.objects.bulk_create([
+                Page(
+                    website=website,
+                    title=' '.join(rng.choices(WORDS, k=3)).title(),
+                    slug=f'page-{i}',
+                    content='<p>' + ' '.join(rng.choices(WORDS, k=400)) + '</p>',
+                    meta_description=' '.join(rng.choices(WORDS, k=20)),
+                    is_published=True,
+                    order=i,
+                )
+                for i in range(page_count)
+            ], batch_size=500)
+
+            # The web search syntax the public search accepts
+            forms = (
+                lambda: rng.choice(WORDS),
+                lambda: ' '.join(rng.sample(WORDS, 2)),
+                lambda: '"{} {}"'.format(*rng.sample(WORDS, 2)),
+                lambda: '{} or {}'.format(*rng.sample(WORDS, 2)),
+                lambda: '{} -{}'.format(*rng.sample(WORDS, 2)),
+            )
+            pages = Page.objects.filter(website=website, is_published=True, requires_auth=False)
+            search_pages(pages, 'warm up')
+            timings = []
+            for _ in range(options['queries']):
+                terms = rng.choice(forms)()
+                started = time.perf_counter()
+                search_pages(pages, terms)
+                timings.append((time.perf_counter() - started) * 1000)
+
+            # Leave no trace of the generated site
+            transaction.set_rollback(True)
+
+        p50, p95 = (statistics.quantiles(timings, n=100)[i] for i in (49, 94))
+        self.stdout.write(
+            f'{len(timings)} searches over {page_count} pages: '
+            f'p50 {p50:.1f} ms, p95 {p95:.1f} ms, max {max(timings):.1f} ms'
+        )
+        if p95 > options['target']:
+            raise CommandError(f"p95 of {p95:.1f} ms exceeds the {options['target']:g} ms target")
+        self.stdout.write(self.style.SUCCESS(f"p95 is within the {options['target']:g} ms target"))
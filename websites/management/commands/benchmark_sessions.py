@@ -0,0 +1,105 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from websites.models import PageViewEvent
+from websites.sessions import sessionize
+
+
+def sessionize_rows(events, gap):
+    """Row-by-row sessionization of ``PageViewEvent`` objects sorted by visitor and time."""
+    sessions = bounces = 0
+    duration = 0.0
+    visitor = first = last = landing = None
+    bounced = True
+    for event in events:
+        event_visitor, timestamp, path = event.visitor, event.occurred_at.timestamp(), event.path
+        if event_visitor != visitor or timestamp - last > gap:
+            if visitor is not None:
+                sessions += 1
+                bounces += bounced
+                duration += last - first
+            visitor, first, landing, bounced = event_visitor, timestamp, path, True
+        elif path != landing:
+            bounced = False
+        last = timestamp
+    if visitor is not None:
+        sessions += 1
+        bounces += bounced
+        duration += last - first
+    return sessions, bounces, duration
+
+
+class Command(BaseCommand):
+    help = 'Benchmark vectorized against row-by-row sessionization of page view events'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--events',
+            type=int,
+            default=10_000_000,
+            help='Number of generated events (default: 10000000)'
+        )
+        parser.add_argument(
+            '--visitors',
+            type=int,
+            default=1_000_000,
+            help='Number of distinct visitors (default: 1000000)'
+        )
+        parser.add_argument(
+            '--paths',
+            type=int,
+            default=500,
+            help='Number of distinct page paths (default: 500)'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        count = options['events']
+        visitors = rng.integers(-(1 << 63), (1 << 63) - 1, size=options['visitors'], dtype=np.int64)
+        visitors = visitors[rng.zipf(1.5, size=count) % len(visitors)]
+        timestamps = rng.uniform(0, 24 * 60 * 60, size=count).round(3)
+        paths = rng.zipf(1.3, size=count).astype(np.int32) % options['paths']
+        gap = getattr(settings, 'ANALYTICS_SESSION_GAP', 30 * 60)
+        self.stdout.write(f'{count:,} events, {len(np.unique(visitors)):,} visitors')
+
+        started = time.perf_counter()
+        sessions = sessionize(visitors, timestamps, paths, gap)
+        vectorized_seconds = time.perf_counter() - started
+        vectorized = (len(sessions['start']), int(sessions['bounced'].sum()), float(sessions['duration'].sum()))
+
+        # The row-by-row version gets its rows pre-sorted, as from ORDER BY, and
+        # pays for building model instances as QuerySet.iterator() would
+        order = np.lexsort((timestamps, visitors))
+        rows = zip(visitors[order].tolist(), timestamps[order].tolist(), paths[order].tolist())
+        day = datetime(2024, 1, 1, tzinfo=dt_timezone.utc).timestamp()
+        started = time.perf_counter()
+        row_by_row = sessionize_rows(
+            (
+                PageViewEvent(
+                    visitor=visitor,
+                    occurred_at=datetime.fromtimestamp(day + timestamp, dt_timezone.utc),
+                    path=str(path),
+                )
+                for visitor, timestamp, path in rows
+            ),
+            gap,
+        )
+        rows_seconds = time.perf_counter() - started
+
+        self.stdout.write(
+            f'Vectorized: {vectorized_seconds:.2f}s ({count / vectorized_seconds:,.0f} events/s), '
+            f'{vectorized[0]:,} sessions, {vectorized[1]:,} bounces'
+        )
+        self.stdout.write(
+            f'Row by row: {rows_seconds:.2f}s ({count / rows_seconds:,.0f} events/s), '
+            f'{row_by_row[0]:,} sessions, {row_by_row[1]:,} bounces'
+        )
+        if vectorized[:2] != row_by_row[:2] or not np.isclose(vectorized[2], row_by_row[2]):
+            self.stdout.write(self.style.ERROR('Results differ'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Results match; {rows_seconds / vectorized_seconds:.1f}x faster'))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import slugify
+from django_tenants.utils import schema_context
+
+from websites.cloning import CloneError, clone_website
+from websites.models import Website
+
+
+class Command(BaseCommand):
+    help = 'Clone a website with its pages, components and navigation, optionally into another tenant'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('schema', type=str, help='Tenant schema of the website to clone')
+        parser.add_argument('website_id', type=str, help='Id of the website to clone')
+        parser.add_argument('--name', type=str, help='Name of the clone (default: "<name> (copy)")')
+        parser.add_argument('--subdomain', type=str, help='Subdomain of the clone (default: slug of the name)')
+        parser.add_argument(
+            '--target-schema',
+            type=str,
+            help='Tenant schema to clone into (default: the source schema)'
+        )
+    
+    def handle(self, *args, **options):
+        source_schema = options['schema']
+        target_schema = options['target_schema'] or source_schema
+        
+        with schema_context(source_schema):
+            try:
+                website = Website.objects.get(pk=options['website_id'])
+            except (Website.DoesNotExist, ValueError):
+                raise CommandError(f'Website {options["website_id"]} not found in {source_schema}')
+            name = options['name'] or f'{website.name} (copy)'
+            subdomain = options['subdomain'] or slugify(name)[:50]
+            try:
+                new_id, counts = clone_website(
+                    website.pk, name, subdomain,
+                    source_schema=source_schema, target_schema=target_schema,
+                )
+            except CloneError as e:
+                raise CommandError(str(e))
+        
+        copied = ', '.join(f'{count} {kind}' for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Cloned "{website.name}" to {target_schema}/{new_id} ({copied})'))
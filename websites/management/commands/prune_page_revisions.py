@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django_tenants.utils import get_tenant_model, schema_context
+
+from websites.models import PageRevision
+from websites.revisions import prune_revisions
+
+
+class Command(BaseCommand):
+    help = 'Delete page revisions older than the retention period'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'schemas',
+            nargs='*',
+            type=str,
+            help='Tenant schemas to prune (default: all tenants)'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.PAGE_REVISION_RETENTION_DAYS,
+            help=f'Keep revisions from the last N days (default: {settings.PAGE_REVISION_RETENTION_DAYS})'
+        )
+        parser.add_argument(
+            '--keep-latest',
+            type=int,
+            default=settings.PAGE_REVISION_KEEP_LATEST,
+            help=f'Always keep the N most recent revisions of a page (default: {settings.PAGE_REVISION_KEEP_LATEST})'
+        )
+    
+    def handle(self, *args, **options):
+        tenants = get_tenant_model().objects.exclude(schema_name='public')
+        if options['schemas']:
+            tenants = tenants.filter(schema_name__in=options['schemas'])
+        
+        for tenant in tenants:
+            with schema_context(tenant.schema_name):
+                page_ids = PageRevision.objects.values_list('page_id', flat=True).distinct()
+                deleted = sum(
+                    prune_revisions(page_id, options['days'], options['keep_latest'])
+                    for page_id in page_ids.iterator()
+                )
+            self.stdout.write(self.style.SUCCESS(f'{tenant.schema_name}: deleted {deleted} revisions'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django_tenants.utils import get_tenant_model, schema_context
+
+from websites.models import Website
+from websites.sitemaps import rebuild_sitemap
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored sitemaps of tenant websites from their pages'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'schemas',
+            nargs='*',
+            type=str,
+            help='Tenant schemas to rebuild (default: all tenants)'
+        )
+        parser.add_argument(
+            '--website',
+            type=str,
+            help='Only rebuild the sitemap of this website id'
+        )
+    
+    def handle(self, *args, **options):
+        tenants = get_tenant_model().objects.exclude(schema_name='public')
+        if options['schemas']:
+            tenants = tenants.filter(schema_name__in=options['schemas'])
+        
+        for tenant in tenants:
+            with schema_context(tenant.schema_name):
+                websites = Website.objects.all()
+                if options['website']:
+                    websites = websites.filter(pk=options['website'])
+                for website in websites:
+                    count = rebuild_sitemap(website)
+                    self.stdout.write(
+                        self.style.SUCCESS(f'{tenant.schema_name}: {website.name} - {count} URLs')
+                    )
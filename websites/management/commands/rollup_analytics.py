@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django_tenants.utils import get_tenant_model, schema_context
+
+from websites.rollups import roll_up_all
+
+
+class Command(BaseCommand):
+    help = 'Recompute daily, weekly and monthly analytics rollups from hourly ones'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'schemas',
+            nargs='*',
+            type=str,
+            help='Tenant schemas to roll up (default: all tenants)'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=2,
+            help='Recompute the buckets of the last N days (default: 2)'
+        )
+    
+    def handle(self, *args, **options):
+        tenants = get_tenant_model().objects.exclude(schema_name='public')
+        if options['schemas']:
+            tenants = tenants.filter(schema_name__in=options['schemas'])
+        
+        since = timezone.now() - timedelta(days=options['days'])
+        for tenant in tenants:
+            with schema_context(tenant.schema_name):
+                counts = roll_up_all(since)
+            summary = ', '.join(f'{count} {resolution}' for resolution, count in counts.items())
+            self.stdout.write(self.style.SUCCESS(f'{tenant.schema_name}: {summary} rollups'))
@@ -0,0 +1,110 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django_tenants.utils import get_tenant_model, schema_context
+
+from websites.models import ContactForm
+from websites.spam import DEFAULT_FEATURE_BITS, GLOBAL_SCOPE, SpamClassifier, save_classifier
+
+
+TRAINING_FIELDS = ('email', 'subject', 'message', 'is_spam')
+
+
+class Command(BaseCommand):
+    help = 'Train spam classifiers from contact submissions a person confirmed as spam or not'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'schemas',
+            nargs='*',
+            type=str,
+            help='Tenant schemas to train a model for (default: all tenants)'
+        )
+        parser.add_argument(
+            '--global',
+            action='store_true',
+            dest='global_model',
+            help='Train one model on the submissions of all selected tenants instead'
+        )
+        parser.add_argument(
+            '--holdout',
+            type=float,
+            default=0.2,
+            help='Share of submissions held out to measure precision (default: 0.2)'
+        )
+        parser.add_argument(
+            '--bits',
+            type=int,
+            default=DEFAULT_FEATURE_BITS,
+            help=f'Hash features into 2**N buckets (default: {DEFAULT_FEATURE_BITS})'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Random seed for the holdout split'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report holdout results without saving the model'
+        )
+
+    def handle(self, *args, **options):
+        tenants = get_tenant_model().objects.exclude(schema_name='public')
+        if options['schemas']:
+            tenants = tenants.filter(schema_name__in=options['schemas'])
+
+        samples = {}
+        for tenant in tenants:
+            with schema_context(tenant.schema_name):
+                # Only labels set by a person; the classifier's own flags would
+                # just teach it its past mistakes
+                samples[tenant.schema_name] = list(
+                    ContactForm.objects.filter(spam_confirmed=True)
+                    .values(*TRAINING_FIELDS).iterator(chunk_size=5000)
+                )
+
+        if options['global_model']:
+            samples = {GLOBAL_SCOPE: [sample for rows in samples.values() for sample in rows]}
+
+        rng = random.Random(options['seed'])
+        for scope, rows in samples.items():
+            labels = [row['is_spam'] for row in rows]
+            if all(labels) or not any(labels):
+                self.stdout.write(self.style.WARNING(f'{scope}: needs both confirmed spam and non-spam submissions, skipped'))
+                continue
+
+            self.evaluate(scope, rows, rng, options)
+            if not options['dry_run']:
+                save_classifier(scope, SpamClassifier.train(rows, labels, bits=options['bits']))
+                self.stdout.write(self.style.SUCCESS(f'{scope}: model trained on {len(rows)} submissions'))
+
+    def evaluate(self, scope, rows, rng, options):
+        rows = rows[:]
+        rng.shuffle(rows)
+        split = int(len(rows) * (1 - options['holdout']))
+        train, holdout = rows[:split], rows[split:]
+        if not holdout:
+            return
+
+        classifier = SpamClassifier.train(train, [row['is_spam'] for row in train], bits=options['bits'])
+        predicted = classifier.predict(holdout)
+        actual = [row['is_spam'] for row in holdout]
+        true_positives = sum(p and a for p, a in zip(predicted, actual))
+        flagged, spam = int(predicted.sum()), sum(actual)
+        precision = true_positives / flagged if flagged else 1.0
+        recall = true_positives / spam if spam else 1.0
+
+        # Score at least 10k submissions so the rate is not dominated by overhead
+        repeats = max(1, 10000 // len(holdout))
+        start = time.perf_counter()
+        for _ in range(repeats):
+            classifier.predict(holdout)
+        rate = repeats * len(holdout) / (time.perf_counter() - start)
+
+        self.stdout.write(
+            f'{scope}: holdout of {len(holdout)}: precision {precision:.3f}, recall {recall:.3f}, '
+            f'{rate:,.0f} submissions/s'
+        )
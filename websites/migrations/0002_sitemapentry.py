@@ -0,0 +1,47 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_sitemaps(apps, schema_editor):
+    Page = apps.get_model('websites', 'Page')
+    SitemapEntry = apps.get_model('websites', 'SitemapEntry')
+    pages = Page.objects.filter(is_published=True, requires_auth=False).order_by('website_id', 'created_at', 'id')
+    entries = []
+    counts = {}
+    for page in pages.iterator():
+        index = counts.get(page.website_id, 0)
+        counts[page.website_id] = index + 1
+        entries.append(SitemapEntry(
+            website_id=page.website_id,
+            page_id=page.pk,
+            path='/' if page.is_homepage else f'/{page.slug}/',
+            lastmod=page.updated_at,
+            shard=index // 50000,
+        ))
+    SitemapEntry.objects.bulk_create(entries, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('websites', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SitemapEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=210)),
+                ('lastmod', models.DateTimeField()),
+                ('shard', models.IntegerField(default=0)),
+                ('page', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sitemap_entry', to='websites.page')),
+                ('website', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sitemap_entries', to='websites.website')),
+            ],
+            options={
+                'ordering': ['shard', 'id'],
+                'indexes': [models.Index(fields=['website', 'shard'], name='websites_si_website_34ba20_idx')],
+            },
+        ),
+        migrations.RunPython(populate_sitemaps, migrations.RunPython.noop),
+    ]
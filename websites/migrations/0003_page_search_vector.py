@@ -0,0 +1,53 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Title and meta title weigh most, then the meta description, then the body.
+# Markup and [[component:<uuid>]] markers are stripped from the content.
+SEARCH_VECTOR_SQL = """
+CREATE OR REPLACE FUNCTION websites_page_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.meta_title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.meta_description, '')), 'B') ||
+        setweight(to_tsvector('pg_catalog.english', regexp_replace(
+            coalesce(NEW.content, ''), '<[^>]*>|\\[\\[component:[^]]*\\]\\]', ' ', 'g'
+        )), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER websites_page_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, meta_title, meta_description, content
+    ON websites_page
+    FOR EACH ROW EXECUTE FUNCTION websites_page_search_vector_update();
+
+UPDATE websites_page SET title = title;
+"""
+
+DROP_SEARCH_VECTOR_SQL = """
+DROP TRIGGER IF EXISTS websites_page_search_vector_trigger ON websites_page;
+DROP FUNCTION IF EXISTS websites_page_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('websites', '0002_sitemapentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='page',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_SQL, DROP_SEARCH_VECTOR_SQL),
+        migrations.AddIndex(
+            model_name='page',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='websites_pa_search__7aa8fb_gin'),
+        ),
+    ]
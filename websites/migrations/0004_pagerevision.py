@@ -0,0 +1,30 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('websites', '0003_page_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.IntegerField()),
+                ('is_snapshot', models.BooleanField(default=False)),
+                ('data', models.BinaryField()),
+                ('size', models.IntegerField()),
+                ('content_length', models.IntegerField()),
+                ('content_hash', models.CharField(max_length=40)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='websites.page')),
+            ],
+            options={
+                'ordering': ['-number'],
+                'unique_together': {('page', 'number')},
+            },
+        ),
+    ]
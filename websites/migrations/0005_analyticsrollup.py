@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('websites', '0004_pagerevision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('start', models.DateTimeField()),
+                ('page_views', models.IntegerField(default=0)),
+                ('unique_visitors', models.IntegerField(default=0)),
+                ('sessions', models.IntegerField(default=0)),
+                ('bounces', models.IntegerField(default=0)),
+                ('session_duration', models.BigIntegerField(default=0)),
+                ('organic_traffic', models.IntegerField(default=0)),
+                ('direct_traffic', models.IntegerField(default=0)),
+                ('referral_traffic', models.IntegerField(default=0)),
+                ('social_traffic', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('website', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analytics_rollups', to='websites.website')),
+            ],
+            options={
+                'ordering': ['start'],
+                'unique_together': {('website', 'resolution', 'start')},
+            },
+        ),
+    ]
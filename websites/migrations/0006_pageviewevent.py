@@ -0,0 +1,48 @@
+from django.db import migrations, models
+
+
+# Partitioned tables need the partition key in the primary key. Daily
+# partitions are created and dropped by websites.events.
+CREATE_EVENTS_SQL = """
+CREATE TABLE websites_pageviewevent (
+    id bigserial NOT NULL,
+    website_id uuid NOT NULL,
+    occurred_at timestamp with time zone NOT NULL,
+    visitor bigint NOT NULL,
+    path varchar(210) NOT NULL,
+    referrer text NOT NULL DEFAULT '',
+    PRIMARY KEY (id, occurred_at)
+) PARTITION BY RANGE (occurred_at);
+
+CREATE INDEX websites_pageviewevent_website_occurred_idx
+    ON websites_pageviewevent (website_id, occurred_at);
+"""
+
+DROP_EVENTS_SQL = """
+DROP TABLE IF EXISTS websites_pageviewevent CASCADE;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('websites', '0005_analyticsrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageViewEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('occurred_at', models.DateTimeField()),
+                ('visitor', models.BigIntegerField()),
+                ('path', models.CharField(max_length=210)),
+                ('referrer', models.TextField(blank=True)),
+            ],
+            options={
+                'db_table': 'websites_pageviewevent',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(CREATE_EVENTS_SQL, DROP_EVENTS_SQL),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('websites', '0006_pageviewevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactform',
+            name='traffic_source',
+            field=models.CharField(blank=True, choices=[('organic', 'Organic search'), ('direct', 'Direct'), ('referral', 'Referral'), ('social', 'Social'), ('internal', 'Internal')], max_length=10),
+        ),
+    ]
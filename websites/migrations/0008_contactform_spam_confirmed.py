@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('websites', '0007_contactform_traffic_source'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactform',
+            name='spam_confirmed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:27
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('websites', '0008_contactform_spam_confirmed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contactform',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
 from django.utils.text import slugify
 import uuid
 
@@ -89,6 +92,9 @@ class Page(models.Model):
     requires_auth = models.BooleanField(default=False)
     order = models.IntegerField(default=0)
     
+    # Full-text search, maintained by a database trigger (see migration 0003)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -96,6 +102,7 @@ class Page(models.Model):
     class Meta:
         ordering = ['order', 'title']
         unique_together = ['website', 'slug']
+        indexes = [GinIndex(fields=['search_vector'])]
     
     def __str__(self):
         return f"{self.website.name} - {self.title}"
@@ -178,6 +185,14 @@ class ContactForm(models.Model):
     """
     Contact form submissions from website visitors.
     """
+    TRAFFIC_SOURCES = [
+        ('organic', 'Organic search'),
+        ('direct', 'Direct'),
+        ('referral', 'Referral'),
+        ('social', 'Social'),
+        ('internal', 'Internal'),
+    ]
+    
     website = models.ForeignKey(Website, on_delete=models.CASCADE, related_name='contact_submissions')
     
     # Visitor information
@@ -194,13 +209,16 @@ class ContactForm(models.Model):
     ip_address = models.GenericIPAddressField()
     user_agent = models.TextField(blank=True)
     referrer = models.URLField(blank=True)
+    traffic_source = models.CharField(max_length=10, choices=TRAFFIC_SOURCES, blank=True)
     
     # Status
     is_read = models.BooleanField(default=False)
     is_spam = models.BooleanField(default=False)
+    # is_spam was set by a person rather than by the spam classifier
+    spam_confirmed = models.BooleanField(default=False)
     
-    # Timestamps
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Timestamps (set explicitly: buffered submissions are saved later, see websites.contact)
+    created_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         ordering = ['-created_at']
@@ -236,3 +254,119 @@ class WebsiteAnalytics(models.Model):
     
     def __str__(self):
         return f"{self.website.name} - {self.date}"
+
+
+class SitemapEntry(models.Model):
+    """
+    Stored sitemap URL of a published page, kept up to date by signals.
+    Entries are split into shards of at most ``SITEMAP_SHARD_SIZE`` URLs.
+    """
+    website = models.ForeignKey(Website, on_delete=models.CASCADE, related_name='sitemap_entries')
+    page = models.OneToOneField(Page, on_delete=models.CASCADE, related_name='sitemap_entry')
+    
+    path = models.CharField(max_length=210)
+    lastmod = models.DateTimeField()
+    shard = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['shard', 'id']
+        indexes = [models.Index(fields=['website', 'shard'])]
+    
+    def __str__(self):
+        return f"{self.website.name} - {self.path}"
+
+
+class PageRevision(models.Model):
+    """
+    Stored revision of a page's content.
+    Every ``PAGE_REVISION_SNAPSHOT_EVERY``-th revision is a full snapshot; the
+    others hold a compressed diff against the previous revision.
+    """
+    page = models.ForeignKey(Page, on_delete=models.CASCADE, related_name='revisions')
+    number = models.IntegerField()
+    
+    is_snapshot = models.BooleanField(default=False)
+    data = models.BinaryField()  # zlib-compressed content or diff
+    size = models.IntegerField()  # bytes stored in data
+    content_length = models.IntegerField()
+    content_hash = models.CharField(max_length=40)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-number']
+        unique_together = ['page', 'number']
+    
+    def __str__(self):
+        return f"{self.page.title} - revision {self.number}"
+
+
+class AnalyticsRollup(models.Model):
+    """
+    Analytics of a website aggregated over an hour, day, week or month.
+    Hourly rows are folded from the beacon counters; coarser rows are rolled
+    up from finer ones. Rates are derived from the stored totals.
+    """
+    RESOLUTIONS = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ]
+    
+    website = models.ForeignKey(Website, on_delete=models.CASCADE, related_name='analytics_rollups')
+    resolution = models.CharField(max_length=5, choices=RESOLUTIONS)
+    start = models.DateTimeField()
+    
+    # Totals
+    page_views = models.IntegerField(default=0)
+    unique_visitors = models.IntegerField(default=0)  # summed daily uniques above a day
+    sessions = models.IntegerField(default=0)
+    bounces = models.IntegerField(default=0)
+    session_duration = models.BigIntegerField(default=0)  # total, in seconds
+    
+    # Traffic sources
+    organic_traffic = models.IntegerField(default=0)
+    direct_traffic = models.IntegerField(default=0)
+    referral_traffic = models.IntegerField(default=0)
+    social_traffic = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['start']
+        unique_together = ['website', 'resolution', 'start']
+    
+    def __str__(self):
+        return f"{self.website.name} - {self.resolution} {self.start:%Y-%m-%d %H:%M}"
+    
+    @property
+    def bounce_rate(self):
+        return self.bounces / self.sessions * 100 if self.sessions else 0.0
+    
+    @property
+    def avg_session_duration(self):
+        return round(self.session_duration / self.sessions) if self.sessions else 0
+
+
+class PageViewEvent(models.Model):
+    """
+    Raw page view reported by the beacon.
+    The table is range-partitioned by day and its partitions are created and
+    dropped by ``websites.events``, so Django does not manage it.
+    """
+    id = models.BigAutoField(primary_key=True)
+    website = models.ForeignKey(
+        Website, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    occurred_at = models.DateTimeField()
+    visitor = models.BigIntegerField()  # daily-salted visitor hash
+    path = models.CharField(max_length=210)
+    referrer = models.TextField(blank=True)
+    
+    class Meta:
+        managed = False
+        db_table = 'websites_pageviewevent'
+    
+    def __str__(self):
+        return f"{self.path} at {self.occurred_at}"
@@ -0,0 +1,82 @@
+"""
+Materialized navigation trees.
+
+``Navigation`` is an adjacency list, so walking it through ``children``
+costs a query per node. Instead the whole active navigation of a website is
+loaded in one query and assembled in memory. The serialized tree is cached
+per website and dropped by ``websites.signals`` on any ``Navigation`` or
+``Page`` change.
+"""
+from django.core.cache import cache
+from django.db import connection
+
+from .models import Navigation
+
+
+NAVIGATION_TREE_KEY = 'websites:navtree:{schema}:{website_id}'
+NAVIGATION_TREE_TIMEOUT = 60 * 60 * 24
+
+
+def navigation_tree_key(website_id, schema_name=None):
+    return NAVIGATION_TREE_KEY.format(
+        schema=schema_name or connection.schema_name,
+        website_id=website_id,
+    )
+
+
+def build_navigation_tree(website_id):
+    """
+    Load a website's active navigation in one query and return it as a list
+    of nested dicts ordered by ``order``/``label``. Items below an inactive
+    parent are left out.
+    """
+    rows = (
+        Navigation.objects.filter(website_id=website_id, is_active=True)
+        .order_by('order', 'label')
+        .values(
+            'id', 'parent_id', 'label', 'url', 'order', 'opens_in_new_tab',
+            'page_id', 'page__title', 'page__slug', 'page__is_published',
+        )
+    )
+
+    nodes = {}
+    for row in rows:
+        nodes[row['id']] = {
+            'id': row['id'],
+            'parent_id': row['parent_id'],
+            'label': row['label'],
+            'url': row['url'],
+            'order': row['order'],
+            'opens_in_new_tab': row['opens_in_new_tab'],
+            'page': {
+                'id': str(row['page_id']),
+                'title': row['page__title'],
+                'slug': row['page__slug'],
+                'is_published': row['page__is_published'],
+            } if row['page_id'] else None,
+            'children': [],
+        }
+
+    tree = []
+    # Rows are already sorted, so appending keeps siblings in order
+    for node in nodes.values():
+        parent_id = node.pop('parent_id')
+        if parent_id is None:
+            tree.append(node)
+        elif parent_id in nodes:
+            nodes[parent_id]['children'].append(node)
+    return tree
+
+
+def get_navigation_tree(website_id):
+    """Return the cached navigation tree of a website, building it if needed."""
+    key = navigation_tree_key(website_id)
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_navigation_tree(website_id)
+        cache.set(key, tree, NAVIGATION_TREE_TIMEOUT)
+    return tree
+
+
+def invalidate_navigation_tree(website_id, schema_name=None):
+    cache.delete(navigation_tree_key(website_id, schema_name))
@@ -0,0 +1,377 @@
+"""
+Static-site publishing.
+
+Publishing pre-renders every published page of a website to static HTML so
+that nginx can serve tenant sites without touching gunicorn or Postgres.
+
+Layout under ``settings.PUBLISHED_SITES_ROOT``::
+
+    sites/<schema>/<website_id>/releases/<release>/index.html
+                                                  /<slug>/index.html
+                                                  /...(.gz|.br)
+                                                  /_assets/<hash>.css|js
+                                                  /manifest.json
+    sites/<schema>/<website_id>/current -> releases/<release>
+    hosts/<hostname> -> sites/<schema>/<website_id>/current
+    bundles/<hash>.css|js  (shared by all sites, see websites.bundler)
+
+Every publish writes a new release directory and then atomically swaps the
+``current`` symlink, so visitors never see a half-written site.
+
+Pages that require a login are never written out: nginx finds no file for
+them and passes the request on to Django, which checks the login.
+"""
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .bundler import (
+    BUNDLE_PRUNE_INTERVAL, BUNDLE_PRUNE_KEY, bundle_urls, get_bundle_root, get_page_bundles, prune_bundles,
+)
+from .compression import ENCODING_SUFFIXES, get_brotli_quality, write_variants
+from .images import find_image_sources, media_fingerprints
+from .navigation import get_navigation_tree
+from .rendering import get_asset_components, get_embedded_components, get_homepage, render_page
+from .routing import website_hostnames
+
+
+MANIFEST_NAME = 'manifest.json'
+ASSETS_DIR = '_assets'
+
+
+def get_published_root():
+    return Path(settings.PUBLISHED_SITES_ROOT)
+
+
+def get_site_root(schema_name, website_id):
+    return get_published_root() / 'sites' / schema_name / str(website_id)
+
+
+def write_file(path, data):
+    """Atomically write ``data`` (bytes) to ``path``."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def replace_symlink(link, target):
+    """Atomically point ``link`` at ``target``."""
+    link.parent.mkdir(parents=True, exist_ok=True)
+    tmp_link = link.with_name(f".{link.name}.tmp")
+    if tmp_link.is_symlink():
+        tmp_link.unlink()
+    os.symlink(target, tmp_link)
+    os.replace(tmp_link, link)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# Website fields that end up in every rendered page
+BRANDING_FIELDS = (
+    'name', 'logo', 'favicon', 'primary_color', 'secondary_color', 'font_family',
+    'meta_title', 'meta_description', 'meta_keywords',
+    'google_analytics_id', 'facebook_pixel_id',
+)
+
+NAVIGATION_FIELDS = (
+    'id', 'parent_id', 'page_id', 'label', 'url', 'order', 'is_active', 'opens_in_new_tab',
+)
+
+
+def fingerprint(values):
+    return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
+
+
+class SiteState:
+    """
+    Fingerprints of everything a website's pages are rendered from.
+
+    Keys are dependency names: ``page:<id>``, ``component:<id>``,
+    ``components:global`` (the set of global components), ``navigation``,
+    ``branding`` and ``media:<file name>`` (a media library image). Media
+    fingerprints are only added for the files pages are known to use (see
+    ``add_media``). Only cheap columns are read, never page content.
+    """
+
+    def __init__(self, website):
+        self.fingerprints = {}
+
+        self.fingerprints['branding'] = fingerprint(
+            [str(getattr(website, field)) for field in BRANDING_FIELDS]
+        )
+        self.fingerprints['navigation'] = fingerprint(list(
+            website.navigation_items.order_by('id').values_list(*NAVIGATION_FIELDS)
+        ))
+
+        global_ids = []
+        for component_id, updated_at, is_global in website.components.values_list(
+                'id', 'updated_at', 'is_global'):
+            self.fingerprints[f'component:{component_id}'] = updated_at.isoformat()
+            if is_global:
+                global_ids.append(str(component_id))
+        self.global_component_keys = [f'component:{component_id}' for component_id in sorted(global_ids)]
+        self.fingerprints['components:global'] = fingerprint(sorted(global_ids))
+
+        self.page_ids = []
+        for page_id, updated_at in website.pages.filter(
+                is_published=True, requires_auth=False).values_list('id', 'updated_at'):
+            self.fingerprints[f'page:{page_id}'] = updated_at.isoformat()
+            self.page_ids.append(str(page_id))
+
+    def add_media(self, names):
+        """Add the fingerprints of the media library images ``names``."""
+        for name, values in media_fingerprints(names).items():
+            self.fingerprints[f'media:{name}'] = fingerprint(values)
+
+    def changed_since(self, previous):
+        """Return the dependency keys that differ from ``previous`` fingerprints."""
+        keys = set(self.fingerprints) | set(previous)
+        return {key for key in keys if self.fingerprints.get(key) != previous.get(key)}
+
+
+def page_dependencies(page, global_component_keys, embedded_components):
+    """Return the dependency keys a rendered page depends on."""
+    dependencies = {f'page:{page.pk}', 'branding', 'navigation', 'components:global'}
+    dependencies.update(global_component_keys)
+    dependencies.update(f'component:{component.pk}' for component in embedded_components)
+    for source in [page.content] + [c.html_content for c in embedded_components]:
+        dependencies.update(f'media:{name}' for name in find_image_sources(source))
+    return sorted(dependencies)
+
+
+def media_names(keys):
+    """Return the media file names among dependency keys."""
+    return {key.partition(':')[2] for key in keys if key.startswith('media:')}
+
+
+class DependencyGraph:
+    """Reverse index from dependency keys to the pages that use them."""
+
+    def __init__(self, manifest_pages):
+        self.dependents = {}
+        for page_id, entry in manifest_pages.items():
+            for key in entry.get('deps', []):
+                self.dependents.setdefault(key, set()).add(page_id)
+
+    def affected_pages(self, changed_keys):
+        affected = set()
+        for key in changed_keys:
+            affected |= self.dependents.get(key, set())
+        return affected
+
+
+class SitePublisher:
+    """
+    Render a website's published pages into a new static release.
+
+    A full publish renders every page. An incremental publish compares the
+    site's current fingerprints with the ones recorded in the current
+    release's manifest and only re-renders pages whose dependencies changed;
+    untouched files are hard-linked from the previous release.
+
+    ``progress`` is an optional ``callable(current, total)`` invoked after
+    each page is written.
+    """
+
+    def __init__(self, website, tenant, progress=None):
+        self.website = website
+        self.tenant = tenant
+        self.progress = progress
+        self.site_root = get_site_root(tenant.schema_name, website.id)
+        self.rendered_pages = 0
+
+    def publish(self, incremental=False):
+        """
+        Publish the website and return the new manifest, or the current one
+        when an incremental publish finds nothing to re-render.
+        """
+        state = SiteState(self.website)
+        previous = load_manifest(self.tenant.schema_name, self.website.id) if incremental else None
+        homepage = get_homepage(self.website)
+        homepage_id = str(homepage.pk) if homepage else None
+
+        if previous is None:
+            to_render = set(state.page_ids)
+        else:
+            state.add_media(media_names(previous.get('fingerprints', {})))
+            changed = state.changed_since(previous.get('fingerprints', {}))
+            to_render = DependencyGraph(previous['pages']).affected_pages(changed)
+            to_render |= set(state.page_ids) - set(previous['pages'])
+            if homepage_id != previous.get('homepage'):
+                to_render |= {homepage_id, previous.get('homepage')}
+            to_render &= set(state.page_ids)
+            removed = set(previous['pages']) - set(state.page_ids)
+            if not to_render and not removed:
+                return previous
+
+        release = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        release_dir = self.site_root / 'releases' / release
+        manifest = {
+            'website_id': str(self.website.id),
+            'schema': self.tenant.schema_name,
+            'release': release,
+            'published_at': timezone.now().isoformat(),
+            'homepage': homepage_id,
+            'fingerprints': state.fingerprints,
+            'pages': {},
+        }
+
+        if previous is not None:
+            kept = {
+                page_id: entry for page_id, entry in previous['pages'].items()
+                if page_id in state.page_ids and page_id not in to_render
+            }
+            self.link_previous_release(previous['release'], release_dir, kept)
+            manifest['pages'].update(kept)
+
+        components = {str(c.pk): c for c in self.website.components.all()}
+        global_components = [c for c in components.values() if c.is_global]
+        navigation = get_navigation_tree(self.website.pk)
+        pages = self.website.pages.filter(is_published=True, requires_auth=False, id__in=to_render)
+
+        total = len(to_render)
+        for index, page in enumerate(pages.iterator(), start=1):
+            embedded = get_embedded_components(self.website, page, components)
+            assets = self.write_assets(release_dir, page, get_asset_components(global_components, embedded))
+            html = render_page(
+                self.website, page,
+                global_components=global_components,
+                navigation=navigation,
+                components=components,
+                assets=bundle_urls(assets),
+            ).encode('utf-8')
+
+            path = 'index.html' if str(page.pk) == homepage_id else f'{page.slug}/index.html'
+            write_file(release_dir / path, html)
+            write_variants(release_dir / path, html, write_file, get_brotli_quality(static=True))
+            manifest['pages'][str(page.pk)] = {
+                'slug': page.slug,
+                'path': path,
+                'hash': content_hash(html),
+                'assets': assets,
+                'deps': page_dependencies(page, state.global_component_keys, embedded),
+            }
+            self.rendered_pages = index
+            if self.progress:
+                self.progress(index, total)
+
+        # Media newly used by the rendered pages (the manifest shares the state's fingerprints)
+        used_media = media_names(key for entry in manifest['pages'].values() for key in entry['deps'])
+        state.add_media(used_media - media_names(state.fingerprints))
+        write_file(release_dir / MANIFEST_NAME, json.dumps(manifest, indent=2).encode('utf-8'))
+        self.activate(release_dir)
+        return manifest
+
+    def link_previous_release(self, previous_release, release_dir, kept_pages):
+        """Hard-link the unchanged pages and their assets into a new release."""
+        previous_dir = self.site_root / 'releases' / previous_release
+        for entry in kept_pages.values():
+            paths = [entry['path']] + [f'{ASSETS_DIR}/{name}' for name in entry['assets'].values()]
+            paths += [path + suffix for path in paths for suffix in ENCODING_SUFFIXES.values()]
+            for path in paths:
+                target = release_dir / path
+                if target.exists() or not (previous_dir / path).exists():
+                    continue
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.link(previous_dir / path, target)
+
+    def write_assets(self, release_dir, page, components):
+        """Link the page's CSS/JS bundles into the release and return their names."""
+        assets = get_page_bundles(page, components, get_brotli_quality(static=True))
+        for name in assets.values():
+            for suffix in ('',) + tuple(ENCODING_SUFFIXES.values()):
+                source = get_bundle_root() / (name + suffix)
+                path = release_dir / ASSETS_DIR / (name + suffix)
+                if path.exists() or not source.exists():
+                    continue
+                path.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.link(source, path)
+                except OSError:
+                    shutil.copyfile(source, path)
+        return assets
+
+    def activate(self, release_dir):
+        """Point ``current`` and the host links at a release."""
+        current = self.site_root / 'current'
+        replace_symlink(current, release_dir)
+
+        hosts_dir = get_published_root() / 'hosts'
+        hostnames = set(website_hostnames(self.website, self.tenant))
+        for hostname in hostnames:
+            replace_symlink(hosts_dir / hostname, current)
+        if hosts_dir.exists():
+            for link in hosts_dir.iterdir():
+                if link.is_symlink() and link.name not in hostnames and Path(os.readlink(link)) == current:
+                    link.unlink()
+
+        self.prune_releases(keep=getattr(settings, 'PUBLISHED_RELEASES_KEPT', 3))
+
+    def prune_releases(self, keep):
+        releases = sorted((self.site_root / 'releases').iterdir(), reverse=True)
+        for old_release in releases[keep:]:
+            shutil.rmtree(old_release, ignore_errors=True)
+        # Every kept release of every site is read, so at most once an interval
+        if cache.add(BUNDLE_PRUNE_KEY, 1, BUNDLE_PRUNE_INTERVAL):
+            prune_bundles(referenced_bundles())
+
+
+def referenced_bundles():
+    """Return the names of the bundles used by the kept releases of all sites."""
+    names = set()
+    for path in get_published_root().glob(f'sites/*/*/releases/*/{MANIFEST_NAME}'):
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            # Pruned meanwhile, or still being written
+            continue
+        for entry in manifest['pages'].values():
+            names.update(entry['assets'].values())
+    return names
+
+
+def unpublish(website, tenant):
+    """
+    Take a website's static site offline: remove the host links pointing at
+    it and its releases, so nginx passes its requests on to Django.
+    """
+    site_root = get_site_root(tenant.schema_name, website.id)
+    current = site_root / 'current'
+    hosts_dir = get_published_root() / 'hosts'
+    if hosts_dir.exists():
+        for link in hosts_dir.iterdir():
+            if link.is_symlink() and Path(os.readlink(link)) == current:
+                link.unlink()
+    shutil.rmtree(site_root, ignore_errors=True)
+
+
+def pages_using_media(schema_name, website_id, name):
+    """
+    Return the ids of a website's published pages whose current release
+    uses the media file ``name``, or None if the website has no release.
+    """
+    manifest = load_manifest(schema_name, website_id)
+    if manifest is None:
+        return None
+    return DependencyGraph(manifest['pages']).affected_pages({f'media:{name}'})
+
+
+def load_manifest(schema_name, website_id):
+    """Return the manifest of the current release, or None if unpublished."""
+    path = get_site_root(schema_name, website_id) / 'current' / MANIFEST_NAME
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,107 @@
+"""
+Traffic source classification of referrers.
+
+Known search engines and social networks are compiled once per process
+into a trie keyed by domain labels from the top-level domain down, so a
+referrer host is classified by walking its labels right to left: O(number
+of labels), however many domains are known. A known domain also matches
+its subdomains (``news.google.com``). Patterns ending in ``.*`` match any
+country domain (``google.de``, ``google.co.uk``); hosts are looked up
+as-is first and then with their country suffix replaced by ``*``.
+
+Classification results are memoized per host in an LRU cache, so hot
+referrers skip the walk entirely.
+"""
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+
+DIRECT, ORGANIC, SOCIAL, REFERRAL, INTERNAL = 'direct', 'organic', 'social', 'referral', 'internal'
+TRAFFIC_SOURCES = (ORGANIC, DIRECT, REFERRAL, SOCIAL)
+
+SEARCH_ENGINES = (
+    'google.com', 'google.*', 'bing.com', 'yahoo.com', 'yahoo.*', 'duckduckgo.com',
+    'baidu.com', 'yandex.ru', 'yandex.com', 'yandex.*', 'ecosia.org', 'ask.com',
+    'aol.com', 'naver.com', 'seznam.cz', 'sogou.com', 'so.com', 'qwant.com',
+    'startpage.com', 'search.brave.com', 'kagi.com',
+)
+SOCIAL_NETWORKS = (
+    'facebook.com', 'fb.com', 'fb.me', 'messenger.com', 'instagram.com', 'threads.net',
+    'twitter.com', 'x.com', 't.co', 'linkedin.com', 'lnkd.in', 'pinterest.com',
+    'pinterest.*', 'reddit.com', 'youtube.com', 'youtu.be', 'tiktok.com', 'snapchat.com',
+    'tumblr.com', 'vk.com', 'ok.ru', 'quora.com', 'whatsapp.com', 'web.whatsapp.com',
+    't.me', 'telegram.org', 'discord.com', 'mastodon.social', 'bsky.app', 'weibo.com',
+)
+# Second-level labels under which country domains register names (co.uk, com.au)
+COUNTRY_SECOND_LEVEL = frozenset({'co', 'com', 'net', 'org', 'ne', 'or', 'ac', 'gov', 'edu'})
+
+_VALUE = object()  # key of a trie node's classification
+
+
+def _build_index():
+    root = {}
+    for source, domains in ((ORGANIC, SEARCH_ENGINES), (SOCIAL, SOCIAL_NETWORKS)):
+        for domain in domains:
+            node = root
+            for label in reversed(domain.split('.')):
+                node = node.setdefault(label, {})
+            node[_VALUE] = source
+    return root
+
+
+_INDEX = _build_index()
+
+
+def _lookup(labels):
+    """Return the classification of the deepest known domain in reversed ``labels``."""
+    node, found = _INDEX, None
+    for label in labels:
+        node = node.get(label)
+        if node is None:
+            break
+        found = node.get(_VALUE, found)
+    return found
+
+
+def _country_wildcard(labels):
+    """Replace the country suffix of reversed ``labels`` with ``*``, or return None."""
+    if len(labels) < 2 or len(labels[0]) != 2:
+        return None
+    if len(labels) > 2 and labels[1] in COUNTRY_SECOND_LEVEL:
+        return ['*'] + labels[2:]
+    return ['*'] + labels[1:]
+
+
+@lru_cache(maxsize=4096)
+def classify_host(host):
+    """Return ``organic``, ``social`` or ``referral`` for a referrer host."""
+    labels = host.split('.')[::-1]
+    source = _lookup(labels)
+    if source is None:
+        wildcard = _country_wildcard(labels)
+        source = _lookup(wildcard) if wildcard else None
+    return source or REFERRAL
+
+
+def referrer_host(referrer):
+    try:
+        host = urlsplit(referrer.strip()).hostname
+    except ValueError:
+        return None
+    return host.rstrip('.') if host else None
+
+
+def classify_referrer(referrer, own_host=None):
+    """
+    Return the traffic source of a referrer URL: ``direct`` without one,
+    ``internal`` for the site's own ``own_host`` (with or without ``www.``),
+    else the host's classification.
+    """
+    if not referrer:
+        return DIRECT
+    host = referrer_host(referrer)
+    if not host:
+        return DIRECT
+    if own_host and host.removeprefix('www.') == own_host.lower().removeprefix('www.'):
+        return INTERNAL
+    return classify_host(host)
@@ -0,0 +1,126 @@
+"""
+Rendering of tenant website pages.
+
+Shared by the dynamic tenant views and the static publisher so that a page
+looks the same whether it is served by Django or from published files.
+"""
+import re
+
+from django.template.loader import render_to_string
+
+from .bundler import bundle_urls, get_page_bundles
+from .fragments import get_global_fragments
+from .images import rewrite_images
+from .navigation import get_navigation_tree
+
+
+PAGE_TEMPLATE = 'websites/tenant_page.html'
+PAGE_HEAD_TEMPLATE = 'websites/page_head.html'
+PAGE_TAIL_TEMPLATE = 'websites/page_tail.html'
+
+# Pages embed non-global components with a [[component:<uuid>]] marker
+COMPONENT_REF_RE = re.compile(r'\[\[component:([0-9a-fA-F-]{36})\]\]')
+
+
+def get_homepage(website, published_only=True):
+    """Return the website's home page, falling back to the first page."""
+    pages = website.pages.all()
+    if published_only:
+        pages = pages.filter(is_published=True)
+    return pages.filter(is_homepage=True).first() or pages.first()
+
+
+def find_component_refs(content):
+    """Return the ids of the components embedded in page content, in order."""
+    return list(dict.fromkeys(ref.lower() for ref in COMPONENT_REF_RE.findall(content or '')))
+
+
+def expand_components(content, components):
+    """Replace component markers with the components' HTML."""
+    def replace(match):
+        component = components.get(match.group(1).lower())
+        return component.html_content if component else ''
+    return COMPONENT_REF_RE.sub(replace, content or '')
+
+
+def get_embedded_components(website, page, components=None):
+    """
+    Return the components embedded in a page, in order of appearance.
+    ``components`` is an optional ``{str(id): Component}`` mapping to pick
+    them from instead of querying.
+    """
+    refs = find_component_refs(page.content) if page else []
+    if not refs:
+        return []
+    if components is None:
+        components = {str(c.pk): c for c in website.components.filter(id__in=refs)}
+    return [components[ref] for ref in refs if ref in components]
+
+
+def get_asset_components(global_components, embedded_components):
+    """Return the components whose CSS/JS is bundled with a page."""
+    return global_components + [c for c in embedded_components if not c.is_global]
+
+
+def build_page_context(website, page, global_components=None, navigation=None,
+                       assets=None, components=None):
+    """
+    Build the template context for a page.
+
+    ``assets`` is an optional ``{'css': url, 'js': url}`` mapping of bundled
+    asset URLs; without it the page's bundles are looked up or built.
+    ``global_components``, ``navigation`` and ``components`` (all of the
+    website's components by id) can be passed in to share them across the
+    pages of a site. Global components are rendered through the fragment
+    cache; media library images in the content are made responsive.
+    """
+    fragments = get_global_fragments(website, global_components)
+    global_components = fragments['components']
+    if navigation is None:
+        navigation = get_navigation_tree(website.pk)
+    embedded_components = get_embedded_components(website, page, components)
+
+    context = {
+        'website': website,
+        'page': page,
+        'content': rewrite_images(
+            expand_components(page.content, {str(c.pk): c for c in embedded_components})
+        ) if page else '',
+        'navigation': navigation,
+        'fragments': fragments,
+        'assets': assets,
+    }
+    if assets is None and page is not None:
+        context['assets'] = bundle_urls(
+            get_page_bundles(page, get_asset_components(global_components, embedded_components))
+        )
+    return context
+
+
+def render_page(website, page, **kwargs):
+    """Render a page to an HTML string."""
+    return render_to_string(PAGE_TEMPLATE, build_page_context(website, page, **kwargs))
+
+
+def split_html(html, chunk_size):
+    """
+    Split HTML into chunks of roughly ``chunk_size`` characters, cutting
+    right after a tag so that each chunk ends on a markup boundary.
+    """
+    start = 0
+    while start < len(html):
+        end = html.find('>', start + chunk_size)
+        end = len(html) if end == -1 else end + 1
+        yield html[start:end]
+        start = end
+
+
+def stream_page(context, request=None, chunk_size=16 * 1024):
+    """
+    Render a page as a sequence of HTML chunks: the ``<head>`` (with the
+    bundle links) and page chrome first, then the content in chunks, then
+    the rest of the page. Joined, the chunks equal ``PAGE_TEMPLATE``.
+    """
+    yield render_to_string(PAGE_HEAD_TEMPLATE, context, request=request) + '\n        '
+    yield from split_html(context['content'], chunk_size)
+    yield '\n' + render_to_string(PAGE_TAIL_TEMPLATE, context, request=request)
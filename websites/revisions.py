@@ -0,0 +1,201 @@
+"""
+Page content revisions.
+
+Each content change of a page is stored as a ``PageRevision`` by the
+``record_page_revisions`` task, queued once the change has been committed so
+that diffing stays off the request path. Every
+``PAGE_REVISION_SNAPSHOT_EVERY``-th revision of a page (and any revision
+whose diff would not be much smaller than the content) is a full,
+zlib-compressed snapshot; the others store a compressed diff against the
+previous revision. Diffs are computed over HTML tokens (tags and text runs)
+with ``difflib.SequenceMatcher`` and stored as copy/insert operations, so
+reconstructing any revision reads one snapshot and applies at most
+``PAGE_REVISION_SNAPSHOT_EVERY - 1`` diffs.
+
+Pruning deletes revisions older than the retention period (always keeping
+the latest few), turning the oldest kept revision into a snapshot first so
+that no diff loses its base.
+"""
+import difflib
+import hashlib
+import json
+import re
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .models import Page, PageRevision
+
+
+TOKEN_RE = re.compile(r'<[^>]*>|[^<]+|<')
+
+
+def get_snapshot_every():
+    return getattr(settings, 'PAGE_REVISION_SNAPSHOT_EVERY', 20)
+
+
+def content_hash(content):
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def tokenize(content):
+    return TOKEN_RE.findall(content)
+
+
+def make_diff(old, new):
+    """
+    Return the operations turning ``old`` into ``new``: ``[start, end]``
+    copies ``old[start:end]``, a string is inserted as is.
+    """
+    old_tokens, new_tokens = tokenize(old), tokenize(new)
+    old_offsets = [0]
+    for token in old_tokens:
+        old_offsets.append(old_offsets[-1] + len(token))
+
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([old_offsets[i1], old_offsets[i2]])
+        elif j2 > j1:
+            ops.append(''.join(new_tokens[j1:j2]))
+    return ops
+
+
+def apply_diff(old, ops):
+    return ''.join(old[op[0]:op[1]] if isinstance(op, list) else op for op in ops)
+
+
+def _pack(value):
+    return zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+
+def _unpack(data):
+    return json.loads(zlib.decompress(bytes(data)).decode('utf-8'))
+
+
+def reconstruct(revision):
+    """Return the page content of a revision."""
+    if revision.is_snapshot:
+        return _unpack(revision.data)
+    chain = list(
+        PageRevision.objects.filter(page_id=revision.page_id, number__lte=revision.number)
+        .filter(number__gte=PageRevision.objects.filter(
+            page_id=revision.page_id, number__lte=revision.number, is_snapshot=True,
+        ).order_by('-number').values('number')[:1])
+        .order_by('number')
+    )
+    content = _unpack(chain[0].data)
+    for diff in chain[1:]:
+        content = apply_diff(content, _unpack(diff.data))
+    return content
+
+
+def record_revision(page_id):
+    """
+    Store the page's committed content as a new revision unless it equals
+    the latest one. Returns the new revision, or None.
+
+    The page row is locked while the revision is numbered and written, so
+    concurrent calls for the same page take turns instead of colliding on
+    the revision number.
+    """
+    with transaction.atomic():
+        content = Page.objects.select_for_update().filter(pk=page_id).values_list('content', flat=True).first()
+        if content is None:
+            return None  # deleted before its revision was recorded
+        return _create_revision(page_id, content or '')
+
+
+def _create_revision(page_id, content):
+    digest = content_hash(content)
+    latest = PageRevision.objects.filter(page_id=page_id).order_by('-number').first()
+    if latest is not None and latest.content_hash == digest:
+        return None
+
+    number = latest.number + 1 if latest else 1
+    snapshot = _pack(content)
+    data, is_snapshot = snapshot, True
+    if latest is not None and (number - 1) % get_snapshot_every():
+        diff = _pack(make_diff(reconstruct(latest), content))
+        # A diff that saves little is not worth a longer reconstruction chain
+        if len(diff) < len(snapshot) // 2:
+            data, is_snapshot = diff, False
+
+    return PageRevision.objects.create(
+        page_id=page_id,
+        number=number,
+        is_snapshot=is_snapshot,
+        data=data,
+        size=len(data),
+        content_length=len(content),
+        content_hash=digest,
+    )
+
+
+def schedule_revisions(schema_name, page_ids):
+    """Record revisions of pages in a worker once the current transaction commits."""
+    from .tasks import record_page_revisions
+
+    page_ids = [str(page_id) for page_id in page_ids]
+    if page_ids:
+        transaction.on_commit(lambda: record_page_revisions.delay(schema_name, page_ids))
+
+
+def prune_revisions(page_id, keep_days=None, keep_latest=None):
+    """
+    Delete a page's revisions older than ``keep_days`` days, always keeping
+    the ``keep_latest`` most recent ones. Returns the number deleted.
+    """
+    if keep_days is None:
+        keep_days = getattr(settings, 'PAGE_REVISION_RETENTION_DAYS', 30)
+    if keep_latest is None:
+        keep_latest = getattr(settings, 'PAGE_REVISION_KEEP_LATEST', 10)
+    revisions = PageRevision.objects.filter(page_id=page_id)
+    cutoff = timezone.now() - timedelta(days=keep_days)
+
+    # The oldest kept revision is the first one inside the retention period,
+    # or the ``keep_latest``-th most recent one if that is older
+    first_number = revisions.filter(created_at__gte=cutoff).aggregate(number=Min('number'))['number']
+    if keep_latest:
+        latest = list(revisions.order_by('-number').values_list('number', flat=True)[:keep_latest])
+        if len(latest) < keep_latest:
+            return 0
+        first_number = min(latest[-1], first_number or latest[-1])
+    if first_number is None:
+        deleted, _ = revisions.delete()
+        return deleted
+
+    first_kept = revisions.get(number=first_number)
+    with transaction.atomic():
+        if not first_kept.is_snapshot:
+            data = _pack(reconstruct(first_kept))
+            first_kept.is_snapshot, first_kept.data, first_kept.size = True, data, len(data)
+            first_kept.save(update_fields=['is_snapshot', 'data', 'size'])
+        deleted, _ = revisions.filter(number__lt=first_kept.number).delete()
+    return deleted
+
+
+def revision_storage(pages):
+    """
+    Return revision storage per page of a ``Page`` queryset, largest first:
+    revision and snapshot counts, stored bytes and the bytes the same
+    revisions would take as uncompressed full copies.
+    """
+    return list(
+        pages.annotate(
+            revision_count=Count('revisions'),
+            snapshot_count=Count('revisions', filter=Q(revisions__is_snapshot=True)),
+            stored_bytes=Sum('revisions__size'),
+            full_copy_bytes=Sum('revisions__content_length'),
+            latest_revision=Max('revisions__number'),
+        )
+        .filter(revision_count__gt=0)
+        .order_by('-stored_bytes')
+        .values('id', 'website_id', 'title', 'revision_count', 'snapshot_count',
+                'stored_bytes', 'full_copy_bytes', 'latest_revision')
+    )
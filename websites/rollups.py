@@ -0,0 +1,184 @@
+"""
+Multi-resolution analytics rollups.
+
+Hourly ``AnalyticsRollup`` rows are written by the analytics fold (see
+``websites.analytics``). The ``rollup_analytics`` task sums them into daily
+rows, and daily rows into weekly (Monday-based) and monthly rows, for the
+buckets touched since a recent point in time. Daily unique visitors come
+from the day's HyperLogLog count in ``WebsiteAnalytics``; above a day they
+are summed daily uniques.
+
+A range query is answered from few rows: the range is covered greedily
+from its start with the coarsest bucket that starts there and ends within
+the range (days fill up to month starts), so a calendar year is twelve
+monthly rows. Bounce rate and average session duration are derived from
+the summed sessions, bounces and durations rather than averaged.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q, Sum
+from django.db.models.functions import Trunc
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import AnalyticsRollup, WebsiteAnalytics
+
+
+RESOLUTIONS = ('hour', 'day', 'week', 'month')
+# resolution -> resolution it is rolled up from
+ROLLUP_SOURCES = {'day': 'hour', 'week': 'day', 'month': 'day'}
+TOTAL_FIELDS = (
+    'page_views', 'unique_visitors', 'sessions', 'bounces', 'session_duration',
+    'organic_traffic', 'direct_traffic', 'referral_traffic', 'social_traffic',
+)
+
+
+def bucket_start(moment, resolution):
+    """Return the start of the bucket of ``resolution`` containing ``moment`` (UTC)."""
+    moment = moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if resolution == 'hour':
+        return moment
+    moment = moment.replace(hour=0)
+    if resolution == 'week':
+        return moment - timedelta(days=moment.weekday())
+    if resolution == 'month':
+        return moment.replace(day=1)
+    return moment
+
+
+def bucket_end(start, resolution):
+    """Return the (exclusive) end of the bucket starting at ``start``."""
+    if resolution == 'hour':
+        return start + timedelta(hours=1)
+    if resolution == 'day':
+        return start + timedelta(days=1)
+    if resolution == 'week':
+        return start + timedelta(weeks=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def roll_up(resolution, since):
+    """
+    Recompute the current tenant's ``resolution`` rollups from the bucket
+    containing ``since`` onwards. Returns the number of rows written.
+    """
+    source = ROLLUP_SOURCES[resolution]
+    first = bucket_start(since, resolution)
+    fields = [field for field in TOTAL_FIELDS if not (resolution == 'day' and field == 'unique_visitors')]
+    rows = (
+        AnalyticsRollup.objects.filter(resolution=source, start__gte=first)
+        .annotate(bucket=Trunc('start', resolution, tzinfo=dt_timezone.utc))
+        .values('website_id', 'bucket')
+        .annotate(**{f'total_{field}': Sum(field) for field in fields})
+        .order_by()
+    )
+
+    uniques = {}
+    if resolution == 'day':
+        days = WebsiteAnalytics.objects.filter(date__gte=first.date())
+        uniques = {
+            (website_id, day): visitors
+            for website_id, day, visitors in days.values_list('website_id', 'date', 'unique_visitors')
+        }
+
+    rollups = []
+    for row in rows:
+        totals = {field: row[f'total_{field}'] or 0 for field in fields}
+        if resolution == 'day':
+            totals['unique_visitors'] = uniques.get((row['website_id'], row['bucket'].date()), 0)
+        rollups.append(AnalyticsRollup(
+            website_id=row['website_id'], resolution=resolution, start=row['bucket'], **totals
+        ))
+    AnalyticsRollup.objects.bulk_create(
+        rollups,
+        update_conflicts=True,
+        unique_fields=['website', 'resolution', 'start'],
+        update_fields=[*TOTAL_FIELDS, 'updated_at'],
+        batch_size=1000,
+    )
+    return len(rollups)
+
+
+def roll_up_all(since):
+    """Recompute daily, then weekly and monthly rollups from ``since`` onwards."""
+    return {resolution: roll_up(resolution, since) for resolution in ('day', 'week', 'month')}
+
+
+def cover_range(start, end):
+    """
+    Return ``[(resolution, bucket_start), ...]`` covering ``[start, end)``
+    with the coarsest buckets that fit. ``start`` is rounded down and
+    ``end`` up to whole hours.
+    """
+    cursor = bucket_start(start, 'hour')
+    end = end.astimezone(dt_timezone.utc)
+    if bucket_start(end, 'hour') < end:
+        end = bucket_start(end, 'hour') + timedelta(hours=1)
+    buckets = []
+    while cursor < end:
+        for resolution in reversed(RESOLUTIONS):
+            if bucket_start(cursor, resolution) == cursor and bucket_end(cursor, resolution) <= end:
+                # Weeks straddling a month that fits in the range would keep
+                # the cover from ever aligning with it
+                month = bucket_end(bucket_start(cursor, 'month'), 'month')
+                if resolution == 'week' and month < bucket_end(cursor, 'week') and bucket_end(month, 'month') <= end:
+                    continue
+                break
+        buckets.append((resolution, cursor))
+        cursor = bucket_end(cursor, resolution)
+    return buckets
+
+
+def with_rates(totals):
+    sessions = totals['sessions']
+    totals['bounce_rate'] = round(totals['bounces'] / sessions * 100, 2) if sessions else 0.0
+    totals['avg_session_duration'] = round(totals['session_duration'] / sessions) if sessions else 0
+    return totals
+
+
+def query_range(website_id, start, end):
+    """
+    Return a website's analytics totals over ``[start, end)`` and the number
+    of rollup rows of each resolution they were read from.
+    """
+    buckets = cover_range(start, end)
+    starts = {}
+    for resolution, bucket in buckets:
+        starts.setdefault(resolution, []).append(bucket)
+
+    condition = Q()
+    for resolution, bucket_starts in starts.items():
+        condition |= Q(resolution=resolution, start__in=bucket_starts)
+    totals = {field: 0 for field in TOTAL_FIELDS}
+    if buckets:
+        aggregated = AnalyticsRollup.objects.filter(condition, website_id=website_id).aggregate(
+            **{field: Sum(field) for field in TOTAL_FIELDS}
+        )
+        totals.update({field: value or 0 for field, value in aggregated.items()})
+
+    if buckets:
+        start, end = buckets[0][1], bucket_end(buckets[-1][1], buckets[-1][0])
+    return {
+        'start': start,
+        'end': end,
+        **with_rates(totals),
+        'buckets': {resolution: len(bucket_starts) for resolution, bucket_starts in starts.items()},
+    }
+
+
+def parse_bound(value, end=False):
+    """
+    Parse a range bound: an ISO datetime, or a date meaning its start (or,
+    for ``end``, the start of the following day). Returns None if invalid.
+    """
+    try:
+        day = parse_date(value)
+        moment = parse_datetime(value) if day is None else None
+    except ValueError:
+        return None
+    if day is not None:
+        moment = datetime(day.year, day.month, day.day) + (timedelta(days=1) if end else timedelta())
+    elif moment is None:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=dt_timezone.utc)
+    return moment
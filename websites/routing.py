@@ -0,0 +1,175 @@
+"""
+Host -> website resolution for tenant sites.
+
+A tenant may own several websites. A request host is mapped to a website as
+follows:
+
+* a website's ``custom_domain`` always maps to that website;
+* a tenant ``Domain`` whose first label equals a website's ``subdomain``
+  (e.g. ``shop.build.justcodeworks.eu`` for subdomain ``shop``) maps to it;
+* every other tenant domain maps to the tenant's default website, which is
+  the oldest published website (or the oldest website if none is published).
+
+On top of that mapping, ``get_routing_index`` keeps a compact per-tenant
+index of host -> website and (website, slug) -> published page, with the
+pages that require a login marked so they are never served from a cache. It is built
+once, stored in Redis and in process memory, and rebuilt after ``Website``,
+``Page`` or tenant ``Domain`` changes bump the tenant's routing version, so
+routing a request is a couple of dictionary lookups.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Page, Website
+
+
+ROUTING_VERSION_KEY = 'websites:routing-version:{schema}'
+ROUTING_INDEX_KEY = 'websites:routing-index:{schema}:{version}'
+ROUTING_INDEX_TIMEOUT = 60 * 60 * 24
+
+# schema_name -> (checked_at, version, index)
+_local_indexes = {}
+_local_lock = threading.Lock()
+
+
+def _websites_by_precedence():
+    return list(
+        Website.objects.order_by('-is_published', 'created_at')
+        .values_list('id', 'subdomain', 'custom_domain')
+    )
+
+
+def resolve_hostnames(tenant, websites=None):
+    """Return a ``{hostname: website_id}`` mapping for a tenant."""
+    if websites is None:
+        websites = _websites_by_precedence()
+    if not websites:
+        return {}
+
+    default_id = websites[0][0]
+    by_subdomain = {subdomain.lower(): website_id for website_id, subdomain, _ in websites if subdomain}
+
+    hostnames = {}
+    for domain in tenant.domains.values_list('domain', flat=True):
+        domain = domain.lower()
+        label = domain.split('.', 1)[0]
+        hostnames[domain] = by_subdomain.get(label, default_id)
+    for website_id, _, custom_domain in websites:
+        if custom_domain:
+            hostnames[custom_domain.lower()] = website_id
+    return hostnames
+
+
+def website_hostnames(website, tenant):
+    """Return every hostname that serves the given website."""
+    return sorted(
+        hostname for hostname, website_id in resolve_hostnames(tenant).items()
+        if website_id == website.id
+    )
+
+
+def get_routing_version(schema_name):
+    key = ROUTING_VERSION_KEY.format(schema=schema_name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_routing_version(schema_name):
+    """Force the routing index of a tenant to be rebuilt."""
+    with _local_lock:
+        _local_indexes.pop(schema_name, None)
+    key = ROUTING_VERSION_KEY.format(schema=schema_name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time()), None)
+
+
+def build_routing_index(tenant):
+    """
+    Build the routing index of a tenant::
+
+        {
+            'hosts': {hostname: website_id},
+            'default': website_id,
+            'pages': {website_id: {slug: page_id}},
+            'homepages': {website_id: page_id},
+            'protected': {page_id},  # pages that require a login
+        }
+
+    Ids are stored as strings; only published pages are routable.
+    """
+    websites = _websites_by_precedence()
+    hostnames = resolve_hostnames(tenant, websites)
+    index = {
+        'hosts': {hostname: str(website_id) for hostname, website_id in hostnames.items()},
+        'default': str(websites[0][0]) if websites else None,
+        'pages': {},
+        'homepages': {},
+        'protected': set(),
+    }
+    pages = (
+        Page.objects.filter(is_published=True)
+        .order_by('website_id', '-is_homepage', 'order', 'title')
+        .values_list('website_id', 'slug', 'id', 'is_homepage', 'requires_auth')
+    )
+    for website_id, slug, page_id, is_homepage, requires_auth in pages:
+        website_id, page_id = str(website_id), str(page_id)
+        index['pages'].setdefault(website_id, {})[slug] = page_id
+        if requires_auth:
+            index['protected'].add(page_id)
+        # Ordered so the flagged home page (or else the first page) wins
+        index['homepages'].setdefault(website_id, page_id)
+    return index
+
+
+def get_routing_index(tenant):
+    """Return the routing index of a tenant from memory, Redis or the database."""
+    schema_name = tenant.schema_name
+    now = time.monotonic()
+    local = _local_indexes.get(schema_name)
+    if local and now - local[0] < getattr(settings, 'ROUTING_INDEX_LOCAL_TTL', 5):
+        return local[2]
+
+    version = get_routing_version(schema_name)
+    if local and local[1] == version:
+        index = local[2]
+    else:
+        key = ROUTING_INDEX_KEY.format(schema=schema_name, version=version)
+        index = cache.get(key)
+        if index is None:
+            index = build_routing_index(tenant)
+            cache.set(key, index, ROUTING_INDEX_TIMEOUT)
+
+    with _local_lock:
+        _local_indexes[schema_name] = (now, version, index)
+    return index
+
+
+def route_request(request, page_slug=None):
+    """
+    Return ``(website_id, page_id)`` for a tenant site request. Without a
+    slug the website's home page is returned. Either id may be None.
+    """
+    index = get_routing_index(request.tenant)
+    host = request.get_host().split(':', 1)[0].lower()
+    website_id = index['hosts'].get(host, index['default'])
+    if website_id is None:
+        return None, None
+    if page_slug:
+        page_id = index['pages'].get(website_id, {}).get(page_slug)
+    else:
+        page_id = index['homepages'].get(website_id)
+    return website_id, page_id
+
+
+def is_protected_route(request, page_slug=None):
+    """Return whether a tenant site request routes to a page that requires a login."""
+    _, page_id = route_request(request, page_slug)
+    return page_id in get_routing_index(request.tenant)['protected']
@@ -0,0 +1,66 @@
+"""
+Full-text page search.
+
+``Page.search_vector`` is maintained by a database trigger (migration 0003)
+from the title, meta title, meta description and the tag-stripped content,
+and has a GIN index, so a search is an index lookup plus ranking. Ranking
+reads each row's ``search_vector``, so only the first
+``SEARCH_CANDIDATE_LIMIT`` matches found through the index are ranked: a
+query matching most of a large site costs the same as a selective one.
+Results never load page content.
+
+Public search results are cached per website and query under the tenant
+content version, which every page change bumps.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+
+from .caching import get_content_version
+from .models import Page
+
+
+SEARCH_CONFIG = 'english'
+SEARCH_RESULT_FIELDS = ('id', 'website_id', 'title', 'slug', 'meta_title', 'meta_description', 'is_published')
+SEARCH_CACHE_KEY = 'websites:search:{schema}:{version}:{digest}'
+SEARCH_CACHE_TIMEOUT = 60 * 5
+MAX_QUERY_LENGTH = 200
+
+
+def get_candidate_limit():
+    return getattr(settings, 'SEARCH_CANDIDATE_LIMIT', 1000)
+
+
+def search_pages(queryset, terms, limit=20):
+    """
+    Return the pages of ``queryset`` matching ``terms`` (web search syntax:
+    quoted phrases, ``or`` and ``-word``), best first, as dicts with a ``rank``.
+    """
+    query = SearchQuery(terms[:MAX_QUERY_LENGTH], config=SEARCH_CONFIG, search_type='websearch')
+    candidates = queryset.filter(search_vector=query).order_by().values('pk')[:get_candidate_limit()]
+    return list(
+        queryset.model.objects.filter(pk__in=candidates)
+        .annotate(rank=SearchRank(F('search_vector'), query))
+        .order_by('-rank', 'id')
+        .values(*SEARCH_RESULT_FIELDS, 'rank')[:limit]
+    )
+
+
+def search_website(website, terms, limit=20):
+    """Search the published pages of a website, caching the results."""
+    schema_name = connection.schema_name
+    key = SEARCH_CACHE_KEY.format(
+        schema=schema_name,
+        version=get_content_version(schema_name),
+        digest=hashlib.md5(f'{website.pk}|{limit}|{terms.strip().lower()}'.encode()).hexdigest(),
+    )
+    results = cache.get(key)
+    if results is None:
+        pages = Page.objects.filter(website_id=website.pk, is_published=True, requires_auth=False)
+        results = search_pages(pages, terms, limit)
+        cache.set(key, results, SEARCH_CACHE_TIMEOUT)
+    return results
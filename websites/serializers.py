@@ -1,3 +1,4 @@
+from django.utils.text import slugify
 from rest_framework import serializers
 from .models import Website, Page, Component, Navigation, ContactForm, WebsiteAnalytics
 
@@ -6,39 +7,74 @@ class WebsiteSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Website
-        fields = ['id', 'name', 'description', 'domain', 'subdomain', 'theme', 
-                 'custom_css', 'custom_js', 'is_published', 'seo_title', 
-                 'seo_description', 'seo_keywords', 'favicon', 'logo', 
-                 'created_at', 'updated_at']
+        fields = ['id', 'name', 'description', 'subdomain', 'custom_domain', 
+                 'is_published', 'logo', 'favicon', 'primary_color', 
+                 'secondary_color', 'font_family', 'meta_title', 
+                 'meta_description', 'meta_keywords', 'google_analytics_id', 
+                 'facebook_pixel_id', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+class WebsiteCloneSerializer(serializers.Serializer):
+    """
+    Serializer validating the options of a website clone. ``name`` defaults
+    to the source website's name (from the ``website`` context) and
+    ``subdomain`` to the slugified name.
+    """
+    name = serializers.CharField(max_length=200, required=False)
+    subdomain = serializers.CharField(max_length=50, required=False)
+    target_schema = serializers.CharField(max_length=63, required=False)
+    
+    def validate(self, attrs):
+        attrs.setdefault('name', f"{self.context['website'].name} (copy)"[:200])
+        attrs.setdefault('subdomain', slugify(attrs['name'])[:50])
+        if not attrs['subdomain']:
+            raise serializers.ValidationError({'subdomain': 'A subdomain is required for this name.'})
+        return attrs
+
 class PageSerializer(serializers.ModelSerializer):
     """Serializer for Page model"""
     
     class Meta:
         model = Page
-        fields = ['id', 'website', 'title', 'slug', 'content', 'meta_title', 
-                 'meta_description', 'meta_keywords', 'is_homepage', 
-                 'is_published', 'order', 'created_at', 'updated_at']
+        fields = ['id', 'website', 'title', 'slug', 'page_type', 'content', 
+                 'css_styles', 'javascript_code', 'meta_title', 'meta_description', 
+                 'is_homepage', 'is_published', 'requires_auth', 'order', 
+                 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+class PageBulkSerializer(PageSerializer):
+    """
+    Serializer validating one item of a bulk page write without database
+    access; websites and slugs are checked for the whole batch at once.
+    """
+    website = serializers.UUIDField()
+    slug = serializers.CharField(max_length=200, required=False, allow_blank=True)
+    
+    class Meta(PageSerializer.Meta):
+        validators = []
+
 class ComponentSerializer(serializers.ModelSerializer):
     """Serializer for Component model"""
     
     class Meta:
         model = Component
-        fields = ['id', 'page', 'component_type', 'content', 'styles', 
-                 'order', 'is_active', 'created_at', 'updated_at']
+        fields = ['id', 'website', 'name', 'component_type', 'description', 
+                 'html_content', 'css_styles', 'javascript_code', 'is_global', 
+                 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+class ComponentBulkSerializer(ComponentSerializer):
+    """Serializer validating one item of a bulk component write without database access"""
+    website = serializers.UUIDField()
+
 class NavigationSerializer(serializers.ModelSerializer):
     """Serializer for Navigation model"""
     
     class Meta:
         model = Navigation
-        fields = ['id', 'website', 'name', 'url', 'target', 'parent', 
-                 'order', 'is_active', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = ['id', 'website', 'label', 'url', 'page', 'parent', 
+                 'order', 'is_active', 'opens_in_new_tab']
+        read_only_fields = ['id']
 
 class ContactFormSerializer(serializers.ModelSerializer):
     """Serializer for ContactForm model"""
@@ -46,8 +82,8 @@ class ContactFormSerializer(serializers.ModelSerializer):
     class Meta:
         model = ContactForm
         fields = ['id', 'website', 'name', 'email', 'subject', 'message', 
-                 'is_read', 'created_at']
-        read_only_fields = ['id', 'created_at']
+                 'traffic_source', 'is_read', 'is_spam', 'spam_confirmed', 'created_at']
+        read_only_fields = ['id', 'traffic_source', 'is_spam', 'spam_confirmed', 'created_at']
 
 class WebsiteAnalyticsSerializer(serializers.ModelSerializer):
     """Serializer for WebsiteAnalytics model"""
@@ -55,5 +91,6 @@ class WebsiteAnalyticsSerializer(serializers.ModelSerializer):
     class Meta:
         model = WebsiteAnalytics
         fields = ['id', 'website', 'page_views', 'unique_visitors', 
-                 'bounce_rate', 'avg_session_duration', 'date', 'created_at']
-        read_only_fields = ['id', 'created_at']
\ No newline at end of file
+                 'bounce_rate', 'avg_session_duration', 'organic_traffic',
+                 'direct_traffic', 'referral_traffic', 'social_traffic', 'date']
+        read_only_fields = ['id']
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""
+Signal handlers invalidating derived website data when content changes.
+"""
+import copy
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from media_library.models import ImageOptimization, MediaFile
+
+from .caching import bump_content_version, bump_page_version, bump_website_version
+from .fragments import bump_components_version
+from .models import Component, Navigation, Page, Website
+from .navigation import invalidate_navigation_tree
+from .publishing import get_site_root, pages_using_media, unpublish
+from .revisions import schedule_revisions
+from .routing import bump_routing_version
+from .sitemaps import bump_sitemap_version, update_page_entry
+
+
+REPUBLISH_PENDING_KEY = 'websites:republish:{schema}:{website_id}'
+
+# MediaFile fields that change without affecting rendered pages
+MEDIA_USAGE_FIELDS = {'download_count', 'last_accessed'}
+
+
+def page_in_navigation(page):
+    return Navigation.objects.filter(page_id=page.pk, is_active=True).exists()
+
+
+@receiver(post_save, sender=Website)
+@receiver(post_delete, sender=Website)
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+@receiver(post_save, sender=Component)
+@receiver(post_delete, sender=Component)
+@receiver(post_save, sender=Navigation)
+@receiver(post_delete, sender=Navigation)
+def invalidate_page_cache(sender, instance, **kwargs):
+    schema_name = connection.schema_name
+    bump_content_version(schema_name)
+    if sender is Website:
+        bump_website_version(schema_name, instance.pk)
+    elif sender is Page and kwargs.get('signal') is post_save and not page_in_navigation(instance):
+        # Other pages only render this one through the navigation
+        bump_page_version(schema_name, instance.pk)
+    else:
+        bump_website_version(schema_name, instance.website_id)
+
+
+@receiver(post_save, sender=Website)
+@receiver(post_delete, sender=Website)
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+def invalidate_routing_index(sender, instance, **kwargs):
+    bump_routing_version(connection.schema_name)
+
+
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+@receiver(post_save, sender=Navigation)
+@receiver(post_delete, sender=Navigation)
+def invalidate_navigation(sender, instance, **kwargs):
+    invalidate_navigation_tree(instance.website_id)
+
+
+@receiver(post_save, sender=Page)
+def update_sitemap(sender, instance, **kwargs):
+    update_page_entry(instance)
+
+
+@receiver(post_save, sender=Page)
+def store_revision(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'content' in update_fields:
+        schedule_revisions(connection.schema_name, [instance.pk])
+
+
+@receiver(post_delete, sender=Page)
+def invalidate_sitemap(sender, instance, **kwargs):
+    # The entry itself is removed by the cascade
+    bump_sitemap_version(instance.website_id)
+
+
+@receiver(post_save, sender=Component)
+@receiver(post_delete, sender=Component)
+def invalidate_fragments(sender, instance, **kwargs):
+    bump_components_version(instance.website_id)
+
+
+def schedule_republish(schema_name, website_id):
+    """
+    Queue an incremental re-publish of a published website.
+
+    Edits are debounced: the pending key expires just before the task runs,
+    so every edit is either picked up by the queued task or queues a new one.
+    """
+    from .tasks import publish_website
+
+    delay = getattr(settings, 'REPUBLISH_DEBOUNCE_SECONDS', 5)
+    key = REPUBLISH_PENDING_KEY.format(schema=schema_name, website_id=website_id)
+    if cache.add(key, 1, delay):
+        transaction.on_commit(lambda: publish_website.apply_async(
+            args=[schema_name, str(website_id)],
+            kwargs={'incremental': True},
+            countdown=delay + 1,
+        ))
+
+
+@receiver(post_save, sender=Website)
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+@receiver(post_save, sender=Component)
+@receiver(post_delete, sender=Component)
+@receiver(post_save, sender=Navigation)
+@receiver(post_delete, sender=Navigation)
+def republish_dependents(sender, instance, **kwargs):
+    website_id = instance.pk if sender is Website else instance.website_id
+    if Website.objects.filter(pk=website_id, is_published=True).exists():
+        schedule_republish(connection.schema_name, website_id)
+
+
+@receiver(post_save, sender=Website)
+@receiver(post_delete, sender=Website)
+def take_down_static_site(sender, instance, **kwargs):
+    # nginx serves a published site without asking Django, so its files go
+    # once the website is unpublished or deleted
+    if kwargs.get('signal') is post_save and instance.is_published:
+        return
+    tenant = connection.tenant
+    if get_site_root(tenant.schema_name, instance.pk).exists():
+        # A deleted instance loses its pk before the transaction commits
+        website = copy.copy(instance)
+        transaction.on_commit(lambda: unpublish(website, tenant))
+
+
+@receiver(post_save, sender=MediaFile)
+@receiver(post_delete, sender=MediaFile)
+@receiver(post_save, sender=ImageOptimization)
+@receiver(post_delete, sender=ImageOptimization)
+def invalidate_responsive_images(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= MEDIA_USAGE_FIELDS:
+        return
+    media_file = instance if sender is MediaFile else MediaFile.objects.filter(pk=instance.original_file_id).first()
+    if media_file is None or not media_file.is_image:
+        return
+
+    # Only the pages using the file are invalidated, found through the
+    # dependency graph of the website's current release
+    schema_name, name = connection.schema_name, media_file.file.name
+    page_ids, unreleased = set(), []
+    for website_id, is_published in Website.objects.values_list('pk', 'is_published'):
+        used_by = pages_using_media(schema_name, website_id, name) if is_published else None
+        if used_by is None:
+            unreleased.append(website_id)
+        elif used_by:
+            page_ids |= used_by
+            schedule_republish(schema_name, website_id)
+    if unreleased:
+        # Without a release there is no graph; search the content instead
+        page_ids.update(str(pk) for pk in Page.objects.filter(
+            website_id__in=unreleased, content__contains=name,
+        ).values_list('pk', flat=True))
+        components = Component.objects.filter(website_id__in=unreleased, html_content__contains=name)
+        for website_id in set(components.values_list('website_id', flat=True)):
+            bump_website_version(schema_name, website_id)
+    for page_id in page_ids:
+        bump_page_version(schema_name, page_id)
@@ -0,0 +1,174 @@
+"""
+Stored sitemaps for tenant websites.
+
+Every published, public page has a ``SitemapEntry`` row that the signal
+handlers in ``websites.signals`` update when the page is saved or deleted,
+so serving a sitemap reads the stored entries instead of walking ``Page``.
+Entries are assigned to shards of at most ``SITEMAP_SHARD_SIZE`` URLs when
+they are created; once a website has more than one shard, ``sitemap.xml``
+becomes a sitemap index pointing at ``sitemap-<shard>.xml``.
+
+Rendered XML is cached per host under a per-website sitemap version that
+is bumped on every entry change.
+"""
+import hashlib
+import time
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Max
+
+from .models import SitemapEntry
+
+
+SITEMAP_VERSION_KEY = 'websites:sitemap-version:{schema}:{website_id}'
+SITEMAP_KEY = 'websites:sitemap:{schema}:{website_id}:{version}:{digest}'
+SITEMAP_TIMEOUT = 60 * 60 * 24
+SITEMAP_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def get_shard_size():
+    return getattr(settings, 'SITEMAP_SHARD_SIZE', 50000)
+
+
+def get_sitemap_version(website_id):
+    key = SITEMAP_VERSION_KEY.format(schema=connection.schema_name, website_id=website_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_sitemap_version(website_id):
+    key = SITEMAP_VERSION_KEY.format(schema=connection.schema_name, website_id=website_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time()), None)
+
+
+def page_path(page):
+    return '/' if page.is_homepage else f'/{page.slug}/'
+
+
+def is_listed(page):
+    """Whether a page belongs in its website's sitemap."""
+    return page.is_published and not page.requires_auth
+
+
+def _open_shard(website_id):
+    """Return the shard new entries of a website are added to."""
+    last = (
+        SitemapEntry.objects.filter(website_id=website_id)
+        .values('shard').annotate(size=Count('id')).order_by('-shard').first()
+    )
+    if last is None:
+        return 0
+    return last['shard'] if last['size'] < get_shard_size() else last['shard'] + 1
+
+
+def update_page_entry(page):
+    """Add, update or remove the sitemap entry of a saved page."""
+    entries = SitemapEntry.objects.filter(page_id=page.pk)
+    if not is_listed(page):
+        deleted, _ = entries.delete()
+        if deleted:
+            bump_sitemap_version(page.website_id)
+        return
+
+    path = page_path(page)
+    if not entries.update(path=path, lastmod=page.updated_at):
+        SitemapEntry.objects.create(
+            website_id=page.website_id,
+            page_id=page.pk,
+            path=path,
+            lastmod=page.updated_at,
+            shard=_open_shard(page.website_id),
+        )
+    bump_sitemap_version(page.website_id)
+
+
+def rebuild_sitemap(website):
+    """Rebuild a website's sitemap entries from its pages and return their number."""
+    shard_size = get_shard_size()
+    pages = website.pages.filter(is_published=True, requires_auth=False).order_by('created_at', 'id')
+    entries = [
+        SitemapEntry(
+            website=website,
+            page_id=page_id,
+            path='/' if is_homepage else f'/{slug}/',
+            lastmod=updated_at,
+            shard=index // shard_size,
+        )
+        for index, (page_id, slug, is_homepage, updated_at) in enumerate(
+            pages.values_list('id', 'slug', 'is_homepage', 'updated_at').iterator(chunk_size=5000)
+        )
+    ]
+    with transaction.atomic():
+        website.sitemap_entries.all().delete()
+        SitemapEntry.objects.bulk_create(entries, batch_size=5000)
+    bump_sitemap_version(website.pk)
+    return len(entries)
+
+
+def render_urlset(base_url, entries):
+    """Render ``(path, lastmod)`` pairs as a sitemap ``<urlset>``."""
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n', f'<urlset xmlns="{SITEMAP_NAMESPACE}">\n']
+    for path, lastmod in entries:
+        parts.append(f'<url><loc>{escape(base_url + path)}</loc><lastmod>{lastmod.isoformat(timespec="seconds")}</lastmod></url>\n')
+    parts.append('</urlset>\n')
+    return ''.join(parts)
+
+
+def render_index(base_url, shards):
+    """Render ``(shard, lastmod)`` pairs as a ``<sitemapindex>``."""
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n', f'<sitemapindex xmlns="{SITEMAP_NAMESPACE}">\n']
+    for shard, lastmod in shards:
+        parts.append(
+            f'<sitemap><loc>{escape(base_url)}/sitemap-{shard}.xml</loc>'
+            f'<lastmod>{lastmod.isoformat(timespec="seconds")}</lastmod></sitemap>\n'
+        )
+    parts.append('</sitemapindex>\n')
+    return ''.join(parts)
+
+
+def get_sitemap(request, website, shard=None):
+    """
+    Return the sitemap XML of a website for the request's host: the sitemap
+    index (or the only shard) when ``shard`` is None, otherwise one shard.
+    Returns None for a shard that does not exist.
+    """
+    base_url = f'{request.scheme}://{request.get_host()}'
+    key = SITEMAP_KEY.format(
+        schema=connection.schema_name,
+        website_id=website.pk,
+        version=get_sitemap_version(website.pk),
+        digest=hashlib.md5(f'{base_url}|{shard}'.encode()).hexdigest(),
+    )
+    xml = cache.get(key)
+    if xml is not None:
+        return xml
+
+    entries = SitemapEntry.objects.filter(website_id=website.pk)
+    shards = list(entries.values('shard').annotate(lastmod=Max('lastmod')).order_by('shard').values_list('shard', 'lastmod'))
+    if shard is None and len(shards) > 1:
+        xml = render_index(base_url, shards)
+    else:
+        if shard is None:
+            shard = shards[0][0] if shards else 0
+        elif shard not in dict(shards):
+            return None
+        xml = render_urlset(
+            base_url,
+            entries.filter(shard=shard).order_by('id').values_list('path', 'lastmod').iterator(chunk_size=5000),
+        )
+    cache.set(key, xml, SITEMAP_TIMEOUT)
+    return xml
+
+
+def render_robots(request):
+    base_url = f'{request.scheme}://{request.get_host()}'
+    return f'User-agent: *\nDisallow:\n\nSitemap: {base_url}/sitemap.xml\n'
@@ -0,0 +1,176 @@
+"""
+Spam scoring for contact form submissions.
+
+Scoring runs in the Celery worker that flushes the contact buffer (see
+``websites.contact``), never on the request path, and works on a whole
+batch at once so that duplicates within a burst can be recognised.
+
+Submissions are scored by a multinomial naive Bayes classifier over hashed
+token features when one has been trained (``train_spam_classifier``, on
+the labels people confirmed through the contact form API), per tenant or
+globally; otherwise by heuristics. A batch is hashed into one pair
+of index arrays and scored with a single numpy ``bincount``, so scoring cost
+is dominated by tokenizing. Trained models are stored with the default file
+storage and kept in worker memory until a retrain bumps their version.
+"""
+import io
+import math
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+
+URL_RE = re.compile(r'https?://|www\.', re.I)
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9'_-]*")
+SPAM_PHRASES = (
+    'seo services', 'backlinks', 'casino', 'crypto', 'bitcoin', 'viagra',
+    'loan offer', 'rank your website', 'guest post', 'make money',
+)
+SPAM_THRESHOLD = 1.0
+
+GLOBAL_SCOPE = 'global'
+DEFAULT_FEATURE_BITS = 18
+MODEL_PATH = 'spam_models/{scope}.npz'
+MODEL_VERSION_KEY = 'websites:spam-model-version:{scope}'
+
+# scope -> (version, SpamClassifier or None), per worker process
+_loaded_models = {}
+
+
+def heuristic_score(submission, duplicates=1):
+    """Score one submission; ``SPAM_THRESHOLD`` or more is spam."""
+    if submission.get('honeypot'):
+        return SPAM_THRESHOLD
+    text = f"{submission.get('subject', '')} {submission.get('message', '')}"
+    lowered = text.lower()
+    score = 0.0
+    links = len(URL_RE.findall(text))
+    if links > 2:
+        score += 0.3 * (links - 2)
+    score += 0.4 * sum(phrase in lowered for phrase in SPAM_PHRASES)
+    letters = [c for c in text if c.isalpha()]
+    if len(letters) > 20 and sum(c.isupper() for c in letters) / len(letters) > 0.7:
+        score += 0.3
+    if duplicates > 2:
+        score += 0.5
+    return score
+
+
+def submission_tokens(submission):
+    """Return the tokens of a submission's subject, message and email domain."""
+    subject = (submission.get('subject') or '').lower()
+    message = (submission.get('message') or '').lower()
+    tokens = TOKEN_RE.findall(message)
+    tokens += ['s:' + token for token in TOKEN_RE.findall(subject)]
+    tokens += ['__url__'] * len(URL_RE.findall(message))
+    domain = (submission.get('email') or '').rpartition('@')[2].lower()
+    if domain:
+        tokens.append('d:' + domain)
+    return tokens
+
+
+def hash_features(submissions, bits):
+    """Return ``(rows, columns)`` arrays: one entry per token occurrence."""
+    mask = (1 << bits) - 1
+    rows, columns = [], []
+    for row, submission in enumerate(submissions):
+        hashes = [zlib.crc32(token.encode('utf-8')) & mask for token in submission_tokens(submission)]
+        columns.extend(hashes)
+        rows.extend([row] * len(hashes))
+    return np.asarray(rows, dtype=np.int64), np.asarray(columns, dtype=np.int64)
+
+
+class SpamClassifier:
+    """Multinomial naive Bayes over hashed tokens, stored as per-feature log-odds."""
+
+    def __init__(self, weights, bias, bits):
+        self.weights = weights
+        self.bias = bias
+        self.bits = bits
+
+    @classmethod
+    def train(cls, submissions, labels, bits=DEFAULT_FEATURE_BITS, alpha=1.0):
+        labels = np.asarray(labels, dtype=bool)
+        rows, columns = hash_features(submissions, bits)
+        spam_tokens = labels[rows]
+        size = 1 << bits
+        spam_counts = np.bincount(columns[spam_tokens], minlength=size) + alpha
+        ham_counts = np.bincount(columns[~spam_tokens], minlength=size) + alpha
+        weights = np.log(spam_counts / spam_counts.sum()) - np.log(ham_counts / ham_counts.sum())
+        spam = int(labels.sum())
+        bias = math.log((spam + 1) / (len(labels) - spam + 1))
+        return cls(weights.astype(np.float32), bias, bits)
+
+    def log_odds(self, submissions):
+        """Return the spam log-odds of each submission."""
+        rows, columns = hash_features(submissions, self.bits)
+        return np.bincount(rows, weights=self.weights[columns], minlength=len(submissions)) + self.bias
+
+    def predict(self, submissions, threshold=None):
+        """Return a boolean array: spam probability at or above ``threshold``."""
+        if threshold is None:
+            threshold = getattr(settings, 'SPAM_MODEL_THRESHOLD', 0.9)
+        return self.log_odds(submissions) >= math.log(threshold / (1 - threshold))
+
+    def dumps(self):
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, weights=self.weights, bias=self.bias, bits=self.bits)
+        return buffer.getvalue()
+
+    @classmethod
+    def loads(cls, data):
+        arrays = np.load(io.BytesIO(data))
+        return cls(arrays['weights'], float(arrays['bias']), int(arrays['bits']))
+
+
+def save_classifier(scope, classifier):
+    """Store a trained model and make workers reload it."""
+    path = MODEL_PATH.format(scope=scope)
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    default_storage.save(path, ContentFile(classifier.dumps()))
+    key = MODEL_VERSION_KEY.format(scope=scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def load_classifier(scope):
+    """Return the model of a scope (a schema name or ``GLOBAL_SCOPE``), or None."""
+    version = cache.get(MODEL_VERSION_KEY.format(scope=scope))
+    loaded = _loaded_models.get(scope)
+    if loaded is not None and loaded[0] == version:
+        return loaded[1]
+    path = MODEL_PATH.format(scope=scope)
+    classifier = None
+    if default_storage.exists(path):
+        with default_storage.open(path, 'rb') as f:
+            classifier = SpamClassifier.loads(f.read())
+    _loaded_models[scope] = (version, classifier)
+    return classifier
+
+
+def score_batch(submissions, schema_name=None):
+    """
+    Return an ``is_spam`` flag per submission of a batch, using the tenant's
+    model, else the global one, else heuristics. Honeypot hits are always spam.
+    """
+    if not submissions:
+        return []
+    classifier = (schema_name and load_classifier(schema_name)) or load_classifier(GLOBAL_SCOPE)
+    if classifier is not None:
+        predictions = classifier.predict(submissions)
+        return [bool(s.get('honeypot')) or bool(spam) for s, spam in zip(submissions, predictions)]
+
+    repeated = Counter((s.get('ip_address'), s.get('message', '').strip().lower()) for s in submissions)
+    return [
+        heuristic_score(s, repeated[(s.get('ip_address'), s.get('message', '').strip().lower())]) >= SPAM_THRESHOLD
+        for s in submissions
+    ]
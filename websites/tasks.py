@@ -0,0 +1,194 @@
+"""
+Celery tasks for website operations.
+
+Tasks in this module are routed to the ``website_operations`` queue (see
+``build_project.celery``). They run outside a request, so each task takes
+the tenant ``schema_name`` and activates it with ``schema_context``.
+"""
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django_tenants.utils import get_tenant_model, schema_context
+
+from .analytics import ANALYTICS_EVENTS_KEY, fold_buckets, get_fold_batch_size
+from .buffers import recover
+from .contact import CONTACT_BUFFER_KEY, CONTACT_FLUSH_PENDING_KEY, finish_batch, flush_batch, get_batch_size, pop_batch
+from .events import finish_events, get_load_batch_size, load_events, maintain_partitions, pop_events
+from .models import Website
+from .publishing import SitePublisher
+from .revisions import record_revision
+from .rollups import roll_up_all
+from .sessions import aggregate_day
+
+
+# Publish tasks started through the API, so their status is only shown to their tenant
+PUBLISH_TASK_KEY = 'websites:publish-task:{schema}:{task_id}'
+PUBLISH_TASK_TIMEOUT = 60 * 60 * 24  # as long as Celery keeps task results
+
+
+@shared_task(bind=True)
+def publish_website(self, schema_name, website_id, incremental=False):
+    """
+    Render the published pages of a website to a static release.
+    With ``incremental`` only pages whose dependencies changed since the
+    current release are re-rendered.
+    """
+    with schema_context(schema_name):
+        tenant = get_tenant_model().objects.get(schema_name=schema_name)
+        website = Website.objects.get(pk=website_id)
+        if incremental and not website.is_published:
+            # Queued before the website was unpublished
+            return {'website_id': website_id, 'release': None, 'pages': 0}
+
+        def report_progress(current, total):
+            self.update_state(
+                state='PROGRESS',
+                meta={'website_id': website_id, 'current': current, 'total': total},
+            )
+
+        manifest = SitePublisher(website, tenant, progress=report_progress).publish(incremental=incremental)
+
+        if not website.is_published:
+            website.is_published = True
+            website.save(update_fields=['is_published', 'updated_at'])
+
+    return {
+        'website_id': website_id,
+        'release': manifest['release'],
+        'pages': len(manifest['pages']),
+    }
+
+
+def start_publish(schema_name, website_id):
+    """Queue a publish of a website and record the task as the tenant's."""
+    task = publish_website.delay(schema_name, str(website_id))
+    cache.set(PUBLISH_TASK_KEY.format(schema=schema_name, task_id=task.id), str(website_id), PUBLISH_TASK_TIMEOUT)
+    return task
+
+
+def get_publish_task_website(schema_name, task_id):
+    """Return the id of the website a tenant's publish task publishes, or None."""
+    return cache.get(PUBLISH_TASK_KEY.format(schema=schema_name, task_id=task_id))
+
+
+@shared_task(bind=True)
+def record_page_revisions(self, schema_name, page_ids):
+    """
+    Store revisions of changed pages. Queued by ``schedule_revisions`` once
+    the change has been committed.
+    """
+    with schema_context(schema_name):
+        recorded = sum(record_revision(page_id) is not None for page_id in page_ids)
+    return {'pages': len(page_ids), 'recorded': recorded}
+
+
+@shared_task(bind=True)
+def flush_contact_submissions(self):
+    """
+    Move buffered contact form submissions into the tenants' ContactForm
+    tables, a batch at a time. Runs on a beat schedule and whenever a full
+    batch is waiting.
+    """
+    cache.delete(CONTACT_FLUSH_PENDING_KEY)
+    # Batches claimed by workers that died before saving them
+    recovered = recover(CONTACT_BUFFER_KEY)
+    saved = failed = dead_lettered = 0
+    for _ in range(getattr(settings, 'CONTACT_FLUSH_MAX_BATCHES', 20)):
+        processing_key, batch = pop_batch(get_batch_size())
+        if not batch:
+            break
+        batch_saved, batch_failed = flush_batch(batch)
+        # Failures are retried by the next run, up to CONTACT_FLUSH_MAX_ATTEMPTS times
+        dead_lettered += finish_batch(processing_key, batch_failed)
+        saved += batch_saved
+        if batch_failed:
+            failed += len(batch_failed)
+            break
+    return {'saved': saved, 'failed': failed, 'dead_lettered': dead_lettered, 'recovered': recovered}
+
+
+@shared_task(bind=True)
+def fold_analytics_counters(self):
+    """
+    Write the beacon counters of dirty website/day buckets from Redis into
+    WebsiteAnalytics. Runs on a beat schedule.
+    """
+    taken = saved = 0
+    for _ in range(getattr(settings, 'ANALYTICS_FOLD_MAX_BATCHES', 20)):
+        batch_taken, batch_saved = fold_buckets(get_fold_batch_size())
+        taken += batch_taken
+        saved += batch_saved
+        if batch_taken < get_fold_batch_size():
+            break
+    return {'buckets': taken, 'saved': saved}
+
+
+@shared_task(bind=True)
+def rollup_analytics(self):
+    """
+    Recompute the daily, weekly and monthly analytics rollups touched in the
+    last ``ANALYTICS_ROLLUP_LOOKBACK_HOURS`` of every tenant. Runs on a beat
+    schedule.
+    """
+    since = timezone.now() - timedelta(hours=getattr(settings, 'ANALYTICS_ROLLUP_LOOKBACK_HOURS', 48))
+    rows = 0
+    for tenant in get_tenant_model().objects.exclude(schema_name='public'):
+        with schema_context(tenant.schema_name):
+            rows += sum(roll_up_all(since).values())
+    return {'rollups': rows}
+
+
+@shared_task(bind=True)
+def load_analytics_events(self):
+    """
+    Move buffered raw page view events into the tenants' partitioned event
+    tables with COPY, a batch at a time. Runs on a beat schedule.
+    """
+    tenants = {tenant.schema_name: tenant for tenant in get_tenant_model().objects.exclude(schema_name='public')}
+    # Batches claimed by loaders that died before loading them
+    recovered = recover(ANALYTICS_EVENTS_KEY)
+    loaded = failed = dead_lettered = 0
+    for _ in range(getattr(settings, 'ANALYTICS_EVENT_MAX_BATCHES', 20)):
+        processing_key, batch = pop_events(get_load_batch_size())
+        if not batch:
+            break
+        batch_loaded, batch_failed = load_events(batch, tenants)
+        # Failures are retried by the next run, up to ANALYTICS_EVENT_MAX_ATTEMPTS times
+        dead_lettered += finish_events(processing_key, batch_failed)
+        loaded += batch_loaded
+        if batch_failed:
+            failed += len(batch_failed)
+            break
+    return {'loaded': loaded, 'failed': failed, 'dead_lettered': dead_lettered, 'recovered': recovered}
+
+
+@shared_task(bind=True)
+def maintain_event_partitions(self):
+    """
+    Create the coming days' event partitions of every tenant and drop the
+    partitions past the tenant's retention. Runs on a beat schedule.
+    """
+    created = dropped = 0
+    for tenant in get_tenant_model().objects.exclude(schema_name='public'):
+        with schema_context(tenant.schema_name):
+            tenant_created, tenant_dropped = maintain_partitions(tenant)
+        created += len(tenant_created)
+        dropped += len(tenant_dropped)
+    return {'created': created, 'dropped': dropped}
+
+
+@shared_task(bind=True)
+def aggregate_sessions(self, days_ago=0):
+    """
+    Compute sessions, bounce rate and session duration from the raw events of
+    a day (today by default) for every tenant. Runs on a beat schedule.
+    """
+    day = timezone.now().date() - timedelta(days=days_ago)
+    websites = 0
+    for tenant in get_tenant_model().objects.exclude(schema_name='public'):
+        with schema_context(tenant.schema_name):
+            websites += aggregate_day(day)
+    return {'date': day.isoformat(), 'websites': websites}
@@ -7,6 +7,12 @@ app_name = 'websites_tenant'
 urlpatterns = [
     path('', views.TenantHomeView.as_view(), name='home'),
     path('contact/', views.TenantContactView.as_view(), name='contact'),
+    path('search/', views.TenantSearchView.as_view(), name='search'),
+    path('_beacon', views.BeaconView.as_view(), name='beacon'),
+    path('_assets/<str:name>', views.BundleAssetView.as_view(), name='bundle_asset'),
+    path('sitemap.xml', views.SitemapView.as_view(), name='sitemap'),
+    path('sitemap-<int:shard>.xml', views.SitemapView.as_view(), name='sitemap_shard'),
+    path('robots.txt', views.RobotsView.as_view(), name='robots'),
     # Include public account URLs for signup wizard access
     path('', include('accounts.public_urls')),
     path('<slug:page_slug>/', views.TenantPageView.as_view(), name='page'),
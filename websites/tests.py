@@ -1,3 +1,509 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .bulk import SlugAllocator
+from .bundler import build_bundle, get_bundle_root, minify_css, minify_js, prune_bundles, write_bundle
+from .caching import (
+    bump_content_version, bump_page_version, bump_website_version, get_content_version, is_cacheable_request,
+    page_cache_key,
+)
+from .compression import choose_encoding, compress_variants, parse_accept_encoding, variant_etag
+from .contact import buffer_submission
+from .images import find_image_sources, parse_attributes, rewrite_images
+from .models import Navigation, Website
+from .publishing import get_published_root, get_site_root, referenced_bundles, replace_symlink, unpublish
+from .referrers import DIRECT, INTERNAL, ORGANIC, REFERRAL, SOCIAL, classify_referrer
+from .rendering import expand_components, find_component_refs, split_html
+from .revisions import apply_diff, make_diff, tokenize
+from .rollups import bucket_end, bucket_start, cover_range, parse_bound
+from .routing import is_protected_route, route_request
+from .sessions import hourly_totals, sessionize
+from .spam import SPAM_THRESHOLD, SpamClassifier, heuristic_score, submission_tokens
+from .views import NavigationViewSet, WebsiteViewSet
+
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PageCacheKeyTests(SimpleTestCase):
+    """Page cache keys change with the versions of the website and page they render"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def key(self, host='shop.example.com', slug='about', website_id='w1', page_id='p1'):
+        request = SimpleNamespace(tenant=SimpleNamespace(schema_name='acme'), get_host=lambda: host)
+        with mock.patch('websites.caching.route_request', return_value=(website_id, page_id)):
+            return page_cache_key(request, slug)
+
+    def test_key_is_stable(self):
+        self.assertEqual(self.key(), self.key())
+
+    def test_key_depends_on_host_and_slug(self):
+        self.assertNotEqual(self.key(host='a.example.com'), self.key(host='b.example.com'))
+        self.assertNotEqual(self.key(slug='about'), self.key(slug='contact'))
+
+    def test_website_version_invalidates_its_pages_only(self):
+        page, other_page, other_website = self.key(), self.key(page_id='p2'), self.key(website_id='w2')
+        bump_website_version('acme', 'w1')
+        self.assertNotEqual(self.key(), page)
+        self.assertNotEqual(self.key(page_id='p2'), other_page)
+        self.assertEqual(self.key(website_id='w2'), other_website)
+
+    def test_page_version_invalidates_that_page_only(self):
+        page, other_page = self.key(), self.key(page_id='p2')
+        bump_page_version('acme', 'p1')
+        self.assertNotEqual(self.key(), page)
+        self.assertEqual(self.key(page_id='p2'), other_page)
+
+    def test_tenant_version_does_not_touch_page_keys(self):
+        page = self.key()
+        before = get_content_version('acme')
+        bump_content_version('acme')
+        self.assertEqual(get_content_version('acme'), before + 1)
+        self.assertEqual(self.key(), page)
+
+    def test_bump_of_missing_version_restarts_above_old_values(self):
+        self.assertGreater(bump_website_version('acme', 'never-seen'), 1_000_000_000)
+
+
+class UnpublishTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(PUBLISHED_SITES_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def publish(self, website_id, hostname):
+        site_root = get_site_root('acme', website_id)
+        (site_root / 'releases' / '1').mkdir(parents=True)
+        replace_symlink(site_root / 'current', site_root / 'releases' / '1')
+        replace_symlink(get_published_root() / 'hosts' / hostname, site_root / 'current')
+        return site_root
+
+    def test_unpublish_removes_links_and_releases(self):
+        site_root = self.publish('w1', 'shop.example.com')
+        other_root = self.publish('w2', 'blog.example.com')
+        unpublish(SimpleNamespace(id='w1'), SimpleNamespace(schema_name='acme'))
+        self.assertFalse(site_root.exists())
+        self.assertEqual(os.listdir(get_published_root() / 'hosts'), ['blog.example.com'])
+        self.assertTrue(other_root.exists())
+
+    def test_unpublish_of_unpublished_website(self):
+        unpublish(SimpleNamespace(id='w1'), SimpleNamespace(schema_name='acme'))
+        self.assertEqual(os.listdir(get_published_root()), [])
+
+
+@override_settings(BUNDLE_PRUNE_GRACE=60)
+class BundlePruneTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(PUBLISHED_SITES_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write_old_bundle(self, content):
+        name = write_bundle('css', content * 200)
+        for path in get_bundle_root().glob(name + '*'):
+            os.utime(path, (0, 0))
+        return name
+
+    def test_prunes_only_old_unreferenced_bundles(self):
+        kept = self.write_old_bundle('a{color:red}')
+        stale = self.write_old_bundle('b{color:red}')
+        fresh = write_bundle('css', 'c{color:red}')
+        release = get_site_root('acme', 'w1') / 'releases' / '1'
+        release.mkdir(parents=True)
+        (release / 'manifest.json').write_text(json.dumps({'pages': {'p1': {'assets': {'css': kept}}}}))
+        self.assertEqual(referenced_bundles(), {kept})
+        self.assertEqual(prune_bundles(referenced_bundles()), [stale])
+        self.assertEqual(list(get_bundle_root().glob(stale + '*')), [])
+        self.assertTrue((get_bundle_root() / kept).exists())
+        self.assertTrue((get_bundle_root() / fresh).exists())
+
+    def test_rewriting_a_bundle_keeps_it(self):
+        name = self.write_old_bundle('a{color:red}')
+        write_bundle('css', 'a{color:red}' * 200)
+        self.assertEqual(prune_bundles(set()), [])
+        self.assertTrue((get_bundle_root() / name).exists())
+
+
+class ComponentMarkerTests(SimpleTestCase):
+
+    def test_component_markers(self):
+        component_id = '0b6f9d2e-5d0c-4a55-9a39-0c8c1f1b2b2a'
+        content = f'<p>a</p>[[component:{component_id.upper()}]][[component:{component_id}]]'
+        self.assertEqual(find_component_refs(content), [component_id])
+        components = {component_id: SimpleNamespace(html_content='<nav></nav>')}
+        self.assertEqual(expand_components(content, components), '<p>a</p><nav></nav><nav></nav>')
+
+
+class BundlerTests(SimpleTestCase):
+
+    def test_minify_css(self):
+        css = '/* header */\na  {\n  color: red ;\n  content: "a  /* kept */" ;\n}\n\nb > c { margin: 0; }'
+        self.assertEqual(minify_css(css), 'a{color:red;content:"a  /* kept */"}b>c{margin:0}')
+
+    def test_minify_js_keeps_lines(self):
+        self.assertEqual(minify_js('  var a = 1;  \n\n\nfoo(a);\n'), 'var a = 1;\nfoo(a);')
+
+    def test_build_bundle_deduplicates(self):
+        self.assertEqual(build_bundle('css', ['a { x: 1 }', '', 'a{x:1}', 'b{y:2}']), 'a{x:1}\nb{y:2}')
+        self.assertEqual(build_bundle('js', ['f()', 'g()']), 'f();\ng()')
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ConditionalApiTests(SimpleTestCase):
+    """Full and conditional GETs of the read APIs, with the object lookup stubbed out"""
+
+    def get(self, viewset, instance, **headers):
+        request = APIRequestFactory().get('/api/', **headers)
+        force_authenticate(request, user=SimpleNamespace(pk=1, is_authenticated=True))
+        with mock.patch.object(viewset, 'get_object', return_value=instance):
+            return viewset.as_view({'get': 'retrieve'})(request, pk=instance.pk)
+
+    def assert_revalidates(self, viewset, instance):
+        response = self.get(viewset, instance)
+        self.assertEqual(response.status_code, 200)
+        response.render()
+        self.assertEqual(response.data['id'], instance.pk)
+        self.assertEqual(self.get(viewset, instance, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        return response.data
+
+    def test_website(self):
+        website = Website(
+            pk='0b6f9d2e-5d0c-4a55-9a39-0c8c1f1b2b2a', name='Shop', subdomain='shop',
+            updated_at=utc(2024, 1, 1), created_at=utc(2024, 1, 1),
+        )
+        data = self.assert_revalidates(WebsiteViewSet, website)
+        self.assertEqual((data['subdomain'], data['primary_color']), ('shop', '#007bff'))
+
+    def test_navigation(self):
+        item = Navigation(pk=7, website_id='0b6f9d2e-5d0c-4a55-9a39-0c8c1f1b2b2a', label='About', url='/about/')
+        data = self.assert_revalidates(NavigationViewSet, item)
+        self.assertEqual((data['label'], data['page'], data['opens_in_new_tab']), ('About', None, False))
+
+
+class CompressionTests(SimpleTestCase):
+
+    def test_small_data_gets_no_variants(self):
+        self.assertEqual(compress_variants(b'x' * 10), {})
+
+    def test_variants_shrink_data(self):
+        data = b'<p>hello world</p>' * 500
+        variants = compress_variants(data, brotli_quality=4)
+        self.assertIn('gzip', variants)
+        for variant in variants.values():
+            self.assertLess(len(variant), len(data))
+
+    def test_choose_encoding_honours_preferences(self):
+        request = SimpleNamespace(META={'HTTP_ACCEPT_ENCODING': 'gzip, br;q=0'})
+        self.assertEqual(choose_encoding(request, {'br': b'', 'gzip': b''}), 'gzip')
+        request.META['HTTP_ACCEPT_ENCODING'] = 'identity'
+        self.assertIsNone(choose_encoding(request, {'br': b'', 'gzip': b''}))
+        self.assertEqual(parse_accept_encoding('br;q=0.5, *;q=0'), {'br': 0.5, '*': 0.0})
+
+    def test_variant_etag(self):
+        self.assertEqual(variant_etag('"abc"', 'br'), '"abc-br"')
+        self.assertEqual(variant_etag('"abc"', None), '"abc"')
+
+
+class RoutingTests(SimpleTestCase):
+    INDEX = {
+        'hosts': {'shop.example.com': 'w1', 'blog.example.com': 'w2'},
+        'default': 'w1',
+        'pages': {'w1': {'home': 'p1', 'members': 'p2'}, 'w2': {'home': 'p3'}},
+        'homepages': {'w1': 'p1', 'w2': 'p3'},
+        'protected': {'p2'},
+    }
+
+    def setUp(self):
+        patcher = mock.patch('websites.routing.get_routing_index', return_value=self.INDEX)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, host, method='GET', authenticated=False):
+        return SimpleNamespace(
+            tenant=SimpleNamespace(schema_name='acme'),
+            get_host=lambda: host,
+            method=method,
+            user=SimpleNamespace(is_authenticated=authenticated),
+        )
+
+    def test_route_request(self):
+        self.assertEqual(route_request(self.request('shop.example.com:8000')), ('w1', 'p1'))
+        self.assertEqual(route_request(self.request('BLOG.example.com')), ('w2', 'p3'))
+        self.assertEqual(route_request(self.request('unknown.example.com'), 'members'), ('w1', 'p2'))
+        self.assertEqual(route_request(self.request('blog.example.com'), 'members'), ('w2', None))
+
+    def test_pages_requiring_login_are_never_cached(self):
+        request = self.request('shop.example.com')
+        self.assertTrue(is_protected_route(request, 'members'))
+        self.assertFalse(is_protected_route(request, 'home'))
+        self.assertFalse(is_cacheable_request(request, 'members'))
+        self.assertTrue(is_cacheable_request(request, 'home'))
+        self.assertFalse(is_cacheable_request(self.request('shop.example.com', authenticated=True), 'home'))
+        self.assertFalse(is_cacheable_request(self.request('shop.example.com', method='POST'), 'home'))
+
+
+class SplitHtmlTests(SimpleTestCase):
+
+    def test_split_html_cuts_after_tags(self):
+        html = '<div><p>' + 'word ' * 50 + '</p><p>more</p></div>'
+        chunks = list(split_html(html, 40))
+        self.assertEqual(''.join(chunks), html)
+        self.assertTrue(all(chunk.endswith('>') for chunk in chunks))
+
+
+@override_settings(MEDIA_URL='/media/')
+class ImageRewriteTests(SimpleTestCase):
+
+    def media_file(self):
+        return SimpleNamespace(
+            width=1600, height=900, alt_text='A garden',
+            file=SimpleNamespace(url='/media/garden.jpg'),
+        )
+
+    def variants(self, media_file):
+        def variant(width, name):
+            return SimpleNamespace(width=width, optimized_file=SimpleNamespace(url=f'/media/optimized/{name}'))
+        return {'small': variant(400, 'small.jpg'), 'large': variant(1200, 'large.jpg'), 'webp': variant(1600, 'g.webp')}
+
+    def test_parse_attributes(self):
+        self.assertEqual(
+            parse_attributes('<img SRC="/a.jpg" alt=\'x &amp; y\' hidden>'),
+            {'src': '/a.jpg', 'alt': 'x & y', 'hidden': ''},
+        )
+
+    def test_find_image_sources(self):
+        content = '<img src="/media/a.jpg"><img src="/static/b.jpg"><img src="/media/c.jpg" srcset="x 1w">'
+        self.assertEqual(find_image_sources(content), ['a.jpg'])
+
+    def test_rewrite(self):
+        content = '<p><img src="/media/garden.jpg"></p><img src="/media/garden.jpg" width="800"><img src="/x.png">'
+        with mock.patch('websites.images._variants', self.variants):
+            html = rewrite_images(content, {'garden.jpg': self.media_file()})
+        first, second = html.split('</picture>')[:2]
+        self.assertIn('srcset="/media/optimized/small.jpg 400w, /media/optimized/large.jpg 1200w, /media/garden.jpg 1600w"', first)
+        self.assertIn('type="image/webp"', first)
+        self.assertIn('width="1600" height="900"', first)
+        self.assertIn('alt="A garden"', first)
+        self.assertNotIn('loading="lazy"', first)
+        self.assertIn('loading="lazy"', second)
+        self.assertIn('width="800" height="450"', second)
+        self.assertTrue(html.endswith('<img src="/x.png">'))
+
+    def test_content_without_media_is_unchanged(self):
+        content = '<p>No images</p>'
+        self.assertIs(rewrite_images(content, {}), content)
+
+
+class SlugAllocatorTests(SimpleTestCase):
+
+    def allocator(self, taken):
+        # Skip the database query of __init__
+        allocator = SlugAllocator.__new__(SlugAllocator)
+        allocator.taken = taken
+        return allocator
+
+    def test_allocate(self):
+        allocator = self.allocator({'w1': {'about': 'p1'}, 'w2': {}})
+        self.assertEqual(allocator.allocate('w1', 'About', 'p1'), 'about')
+        self.assertEqual(allocator.allocate('w1', 'About', 'p2'), 'about-2')
+        self.assertEqual(allocator.allocate('w1', 'about', 'p3'), 'about-3')
+        self.assertEqual(allocator.allocate('w2', 'About', 'p4'), 'about')
+        self.assertEqual(allocator.allocate('w2', '!!!', 'p5'), 'page')
+
+    def test_suffix_fits_max_length(self):
+        long = 'a' * 300
+        allocator = self.allocator({'w1': {}})
+        first = allocator.allocate('w1', long, 'p1')
+        second = allocator.allocate('w1', long, 'p2')
+        self.assertEqual(len(first), len(second))
+        self.assertTrue(second.endswith('-2'))
+
+
+class RevisionDiffTests(SimpleTestCase):
+
+    def test_tokenize_round_trips(self):
+        content = '<p class="a">Hello <b>world</b></p> < 3'
+        self.assertEqual(''.join(tokenize(content)), content)
+
+    def test_diff_reconstructs_new_content(self):
+        old = '<h1>Title</h1><p>First paragraph.</p><p>Second paragraph.</p>'
+        versions = [
+            '<h1>New title</h1><p>First paragraph.</p><p>Second paragraph.</p>',
+            '<p>First paragraph.</p>',
+            '',
+            '<p>Brand new</p>' * 3,
+        ]
+        for new in versions:
+            with self.subTest(new=new):
+                self.assertEqual(apply_diff(old, make_diff(old, new)), new)
+
+    def test_unchanged_regions_are_copied(self):
+        old = '<p>' + 'x' * 1000 + '</p><p>tail</p>'
+        ops = make_diff(old, old.replace('tail', 'end'))
+        inserted = sum(len(op) for op in ops if isinstance(op, str))
+        self.assertLess(inserted, 20)
+
+
+class SpamTests(SimpleTestCase):
+    HAM = [
+        {'subject': 'Opening hours', 'message': 'Are you open on Sunday morning?', 'email': 'anna@example.com'},
+        {'subject': 'Booking', 'message': 'I would like to book a table for four.', 'email': 'ben@example.org'},
+        {'subject': 'Question', 'message': 'Do you deliver to the city centre?', 'email': 'cara@example.net'},
+    ]
+    SPAM = [
+        {'subject': 'SEO services', 'message': 'Cheap backlinks, rank your website today', 'email': 'x@spam.biz'},
+        {'subject': 'Crypto', 'message': 'Make money with bitcoin casino backlinks', 'email': 'y@spam.biz'},
+        {'subject': 'Guest post', 'message': 'Buy backlinks and guest post offers', 'email': 'z@spam.biz'},
+    ]
+
+    def test_heuristics(self):
+        self.assertEqual(heuristic_score({'honeypot': True}), SPAM_THRESHOLD)
+        self.assertLess(heuristic_score(self.HAM[0]), SPAM_THRESHOLD)
+        self.assertGreaterEqual(heuristic_score(self.SPAM[1]), SPAM_THRESHOLD)
+        self.assertGreater(heuristic_score(self.HAM[0], duplicates=5), heuristic_score(self.HAM[0]))
+
+    def test_tokens(self):
+        tokens = submission_tokens({'subject': 'Hi there', 'message': 'See https://x.test', 'email': 'a@B.com'})
+        self.assertIn('s:hi', tokens)
+        self.assertIn('__url__', tokens)
+        self.assertIn('d:b.com', tokens)
+
+    def test_classifier_separates_and_round_trips(self):
+        classifier = SpamClassifier.train(self.HAM + self.SPAM, [False] * 3 + [True] * 3, bits=12)
+        probe = [
+            {'subject': 'Backlinks', 'message': 'cheap backlinks for your website', 'email': 'q@spam.biz'},
+            {'subject': 'Booking', 'message': 'Can I book a table on Sunday?', 'email': 'd@example.com'},
+        ]
+        self.assertEqual(classifier.predict(probe, threshold=0.5).tolist(), [True, False])
+        restored = SpamClassifier.loads(classifier.dumps())
+        self.assertEqual(restored.bits, 12)
+        np.testing.assert_allclose(restored.log_odds(probe), classifier.log_odds(probe), rtol=1e-6)
+
+
+class RollupRangeTests(SimpleTestCase):
+
+    def test_bucket_bounds(self):
+        moment = utc(2024, 2, 14, 15, 42)
+        self.assertEqual(bucket_start(moment, 'hour'), utc(2024, 2, 14, 15))
+        self.assertEqual(bucket_start(moment, 'week'), utc(2024, 2, 12))
+        self.assertEqual(bucket_start(moment, 'month'), utc(2024, 2, 1))
+        self.assertEqual(bucket_end(utc(2024, 12, 1), 'month'), utc(2025, 1, 1))
+
+    def test_year_is_twelve_months(self):
+        buckets = cover_range(utc(2024, 1, 1), utc(2025, 1, 1))
+        self.assertEqual([resolution for resolution, _ in buckets], ['month'] * 12)
+
+    def test_cover_is_contiguous_and_coarse(self):
+        start, end = utc(2024, 1, 30, 22), utc(2024, 3, 5, 3)
+        buckets = cover_range(start, end)
+        cursor = start
+        for resolution, bucket in buckets:
+            self.assertEqual(bucket, cursor)
+            cursor = bucket_end(bucket, resolution)
+        self.assertEqual(cursor, end)
+        self.assertIn(('month', utc(2024, 2, 1)), buckets)
+        self.assertLess(len(buckets), 20)
+
+    def test_partial_hours_are_rounded_outwards(self):
+        buckets = cover_range(utc(2024, 1, 1, 10, 30), utc(2024, 1, 1, 11, 15))
+        self.assertEqual(buckets, [('hour', utc(2024, 1, 1, 10)), ('hour', utc(2024, 1, 1, 11))])
+
+    def test_parse_bound(self):
+        self.assertEqual(parse_bound('2024-02-28'), utc(2024, 2, 28))
+        self.assertEqual(parse_bound('2024-02-28', end=True), utc(2024, 2, 29))
+        self.assertEqual(parse_bound('2024-02-28T10:00:00Z'), utc(2024, 2, 28, 10))
+        self.assertIsNone(parse_bound('2024-02-30'))
+        self.assertIsNone(parse_bound('yesterday'))
+
+
+class SessionizeTests(SimpleTestCase):
+
+    def test_empty(self):
+        sessions = sessionize(np.empty(0, np.int64), np.empty(0), np.empty(0, np.int32), gap=1800)
+        self.assertEqual(len(sessions['start']), 0)
+
+    def test_sessions_split_by_visitor_and_gap(self):
+        # Unsorted on purpose: visitor 1 views two paths, leaves for an hour
+        # and bounces on return; visitor 2 bounces after two views of one path
+        visitors = np.array([1, 2, 1, 1, 2], dtype=np.int64)
+        timestamps = np.array([0.0, 100.0, 60.0, 3660.0, 160.0])
+        paths = np.array([10, 30, 20, 10, 30], dtype=np.int32)
+        sessions = sessionize(visitors, timestamps, paths, gap=1800)
+        self.assertEqual(sessions['start'].tolist(), [0.0, 3660.0, 100.0])
+        self.assertEqual(sessions['views'].tolist(), [2, 1, 2])
+        self.assertEqual(sessions['duration'].tolist(), [60.0, 0.0, 60.0])
+        self.assertEqual(sessions['bounced'].tolist(), [False, True, True])
+
+    def test_hourly_totals(self):
+        day = utc(2024, 1, 1).date()
+        start = utc(2024, 1, 1).timestamp()
+        sessions = {
+            'start': np.array([start + 10, start + 3600 * 5, start + 3600 * 5 + 1]),
+            'duration': np.array([30.0, 0.0, 90.0]),
+            'bounced': np.array([False, True, False]),
+        }
+        counts, bounces, duration = hourly_totals(sessions, day)
+        self.assertEqual((counts[0], counts[5], counts.sum()), (1, 2, 3))
+        self.assertEqual((bounces[5], bounces.sum()), (1, 1))
+        self.assertEqual((duration[0], duration[5]), (30, 90))
+
+
+class ReferrerTests(SimpleTestCase):
+
+    def test_classification(self):
+        cases = {
+            '': DIRECT,
+            'not a url': DIRECT,
+            'https://www.google.com/search?q=x': ORGANIC,
+            'https://www.google.de/': ORGANIC,
+            'https://news.google.co.uk/': ORGANIC,
+            'https://duckduckgo.com/': ORGANIC,
+            'https://m.facebook.com/story': SOCIAL,
+            'https://t.co/abc': SOCIAL,
+            'https://example.org/post': REFERRAL,
+            'https://notgoogle.com/': REFERRAL,
+        }
+        for referrer, source in cases.items():
+            with self.subTest(referrer=referrer):
+                self.assertEqual(classify_referrer(referrer), source)
+
+    def test_own_host_is_internal(self):
+        self.assertEqual(classify_referrer('https://www.shop.test/a', 'shop.test'), INTERNAL)
+        self.assertEqual(classify_referrer('https://shop.test/a', 'WWW.shop.test'), INTERNAL)
+        self.assertEqual(classify_referrer('https://other.test/a', 'shop.test'), REFERRAL)
+
+    def test_contact_submissions_keep_the_landing_referrer(self):
+        request = SimpleNamespace(
+            tenant=SimpleNamespace(schema_name='acme'),
+            META={'REMOTE_ADDR': '10.0.0.1', 'HTTP_REFERER': 'https://shop.test/contact/'},
+            COOKIES={'landing_referrer': 'https%3A%2F%2Fwww.google.com%2F'},
+            get_host=lambda: 'shop.test',
+        )
+        redis = mock.Mock(**{'rpush.return_value': 1})
+        with mock.patch('websites.contact.get_redis_connection', return_value=redis):
+            buffer_submission(request, SimpleNamespace(pk='w1'), {'name': 'Anna', 'message': 'Hello'})
+        payload = json.loads(redis.rpush.call_args[0][1])
+        self.assertEqual(payload['landing_referrer'], 'https://www.google.com/')
+        self.assertEqual(classify_referrer(payload['landing_referrer'], payload['host']), ORGANIC)
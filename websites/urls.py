@@ -16,5 +16,7 @@ app_name = 'websites'
 urlpatterns = [
     path('', include(router.urls)),
     path('publish/<uuid:website_id>/', views.PublishWebsiteView.as_view(), name='publish_website'),
+    path('publish/status/<str:task_id>/', views.PublishStatusView.as_view(), name='publish_status'),
+    path('fragment-stats/', views.FragmentStatsView.as_view(), name='fragment_stats'),
     path('preview/<uuid:website_id>/', views.PreviewWebsiteView.as_view(), name='preview_website'),
 ]
\ No newline at end of file
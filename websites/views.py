@@ -3,78 +3,269 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.core.exceptions import ValidationError
 from django.http import JsonResponse
+from celery.result import AsyncResult
 from .models import Website, Page, Component, Navigation, ContactForm, WebsiteAnalytics
 from .serializers import (
     WebsiteSerializer, PageSerializer, ComponentSerializer, 
-    NavigationSerializer, ContactFormSerializer, WebsiteAnalyticsSerializer
+    NavigationSerializer, ContactFormSerializer, WebsiteAnalyticsSerializer,
+    PageBulkSerializer, ComponentBulkSerializer, WebsiteCloneSerializer
 )
+from .bulk import BulkSaveViewSetMixin
+from .cloning import CloneError, clone_website
+from .conditional import ConditionalViewSetMixin
+from .exports import ExportViewSetMixin
+from .fragments import get_fragment_stats
+from .navigation import get_navigation_tree
+from .revisions import reconstruct, revision_storage
+from .rollups import parse_bound, query_range
+from .search import search_pages
+from .tasks import get_publish_task_website, start_publish
 
-class WebsiteViewSet(viewsets.ModelViewSet):
+class WebsiteViewSet(ConditionalViewSetMixin, viewsets.ModelViewSet):
     """ViewSet for managing websites"""
     queryset = Website.objects.all()
     serializer_class = WebsiteSerializer
     
     def get_queryset(self):
-        # Filter by current tenant
-        return Website.objects.filter(tenant=self.request.tenant)
+        # The tenant schema already scopes websites to the current tenant
+        return Website.objects.all()
+    
+    @action(detail=True, methods=['post'])
+    def clone(self, request, pk=None):
+        """Clone a website with its pages, components and navigation, optionally into another tenant"""
+        website = self.get_object()
+        serializer = WebsiteCloneSerializer(data=request.data, context={'website': website})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        name, subdomain = serializer.validated_data['name'], serializer.validated_data['subdomain']
+        target_schema = serializer.validated_data.get('target_schema', request.tenant.schema_name)
+        if target_schema != request.tenant.schema_name and not request.user.is_staff:
+            return Response(
+                {'error': 'Only staff can clone websites into another tenant'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        try:
+            new_id, counts = clone_website(website.pk, name, subdomain, target_schema=target_schema)
+        except CloneError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {'id': str(new_id), 'schema': target_schema, 'subdomain': subdomain, 'copied': counts},
+            status=status.HTTP_201_CREATED
+        )
 
-class PageViewSet(viewsets.ModelViewSet):
+class PageViewSet(BulkSaveViewSetMixin, ConditionalViewSetMixin, viewsets.ModelViewSet):
     """ViewSet for managing pages"""
     queryset = Page.objects.all()
     serializer_class = PageSerializer
+    bulk_serializer_class = PageBulkSerializer
     
     def get_queryset(self):
-        # Filter by current tenant's websites
-        return Page.objects.filter(website__tenant=self.request.tenant)
+        # The tenant schema already scopes pages to the current tenant
+        return Page.objects.all()
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Full-text search over page titles, content and meta tags"""
+        terms = request.query_params.get('q', '').strip()
+        if not terms:
+            return Response({'error': 'The q parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        pages = self.get_queryset()
+        if request.query_params.get('published') in ('1', 'true'):
+            pages = pages.filter(is_published=True)
+        try:
+            if request.query_params.get('website'):
+                pages = pages.filter(website_id=request.query_params['website'])
+            results = search_pages(pages, terms, limit)
+        except ValidationError:
+            return Response({'error': 'Website not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'query': terms, 'count': len(results), 'results': results})
+
+    @action(detail=True, methods=['get'])
+    def revisions(self, request, pk=None):
+        """List a page's stored content revisions, newest first"""
+        page = self.get_object()
+        revisions = page.revisions.values(
+            'number', 'is_snapshot', 'size', 'content_length', 'created_at'
+        )[:100]
+        return Response(list(revisions))
+    
+    @action(detail=True, methods=['get'], url_path=r'revisions/(?P<number>[0-9]+)')
+    def revision(self, request, pk=None, number=None):
+        """Return the content of one revision of a page"""
+        page = self.get_object()
+        revision = page.revisions.filter(number=number).first()
+        if revision is None:
+            return Response({'error': 'Revision not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'number': revision.number,
+            'created_at': revision.created_at,
+            'content': reconstruct(revision),
+        })
+    
+    @action(detail=True, methods=['post'])
+    def revert(self, request, pk=None):
+        """Restore a page's content from a revision (stored as a new revision)"""
+        page = self.get_object()
+        try:
+            number = int(request.data.get('number'))
+        except (TypeError, ValueError):
+            return Response({'error': 'number must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        revision = page.revisions.filter(number=number).first()
+        if revision is None:
+            return Response({'error': 'Revision not found'}, status=status.HTTP_404_NOT_FOUND)
+        page.content = reconstruct(revision)
+        page.save()
+        return Response(self.get_serializer(page).data)
+    
+    @action(detail=False, methods=['get'], url_path='revision-storage')
+    def revision_storage(self, request):
+        """Report revision storage per page, largest first"""
+        pages = self.get_queryset()
+        try:
+            if request.query_params.get('website'):
+                pages = pages.filter(website_id=request.query_params['website'])
+            return Response(revision_storage(pages)[:100])
+        except ValidationError:
+            return Response({'error': 'Website not found'}, status=status.HTTP_404_NOT_FOUND)
 
-class ComponentViewSet(viewsets.ModelViewSet):
+class ComponentViewSet(BulkSaveViewSetMixin, ConditionalViewSetMixin, viewsets.ModelViewSet):
     """ViewSet for managing components"""
     queryset = Component.objects.all()
     serializer_class = ComponentSerializer
+    bulk_serializer_class = ComponentBulkSerializer
     
     def get_queryset(self):
-        # Filter by current tenant's pages
-        return Component.objects.filter(page__website__tenant=self.request.tenant)
+        # The tenant schema already scopes components to the current tenant
+        return Component.objects.all()
 
-class NavigationViewSet(viewsets.ModelViewSet):
+class NavigationViewSet(ConditionalViewSetMixin, viewsets.ModelViewSet):
     """ViewSet for managing navigation"""
     queryset = Navigation.objects.all()
     serializer_class = NavigationSerializer
+    last_modified_field = None  # no timestamp; ETag relies on the content version
     
     def get_queryset(self):
-        # Filter by current tenant's websites
-        return Navigation.objects.filter(website__tenant=self.request.tenant)
+        # The tenant schema already scopes navigation to the current tenant
+        return Navigation.objects.all()
+    
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """Return a website's active navigation as a nested tree"""
+        website_id = request.query_params.get('website')
+        if not website_id:
+            return Response({'error': 'The website parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            website = Website.objects.only('id').get(id=website_id)
+        except (Website.DoesNotExist, ValidationError):
+            return Response({'error': 'Website not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(get_navigation_tree(website.pk))
 
-class ContactFormViewSet(viewsets.ModelViewSet):
+class ContactFormViewSet(ExportViewSetMixin, viewsets.ModelViewSet):
     """ViewSet for managing contact forms"""
     queryset = ContactForm.objects.all()
     serializer_class = ContactFormSerializer
+    export_fields = (
+        'id', 'website_id', 'name', 'email', 'phone', 'company', 'subject', 'message',
+        'ip_address', 'user_agent', 'referrer', 'traffic_source', 'is_read', 'is_spam', 'spam_confirmed', 'created_at',
+    )
+    export_date_field = 'created_at'
     
     def get_queryset(self):
-        # Filter by current tenant's websites
-        return ContactForm.objects.filter(website__tenant=self.request.tenant)
+        # The tenant schema already scopes submissions to the current tenant
+        return ContactForm.objects.all()
+    
+    def _label(self, is_spam):
+        # Confirmed labels are what train_spam_classifier learns from
+        submission = self.get_object()
+        submission.is_spam = is_spam
+        submission.spam_confirmed = True
+        submission.save(update_fields=['is_spam', 'spam_confirmed'])
+        return Response(self.get_serializer(submission).data)
+    
+    @action(detail=True, methods=['post'])
+    def mark_spam(self, request, pk=None):
+        """Confirm that a submission is spam"""
+        return self._label(True)
+    
+    @action(detail=True, methods=['post'])
+    def mark_ham(self, request, pk=None):
+        """Confirm that a submission is not spam"""
+        return self._label(False)
 
-class WebsiteAnalyticsViewSet(viewsets.ModelViewSet):
+class WebsiteAnalyticsViewSet(ExportViewSetMixin, viewsets.ModelViewSet):
     """ViewSet for managing website analytics"""
     queryset = WebsiteAnalytics.objects.all()
     serializer_class = WebsiteAnalyticsSerializer
+    export_fields = (
+        'website_id', 'date', 'page_views', 'unique_visitors', 'bounce_rate', 'avg_session_duration',
+        'organic_traffic', 'direct_traffic', 'referral_traffic', 'social_traffic',
+    )
+    export_date_field = 'date'
     
     def get_queryset(self):
-        # Filter by current tenant's websites
-        return WebsiteAnalytics.objects.filter(website__tenant=self.request.tenant)
+        # The tenant schema already scopes analytics to the current tenant
+        return WebsiteAnalytics.objects.all()
+    
+    @action(detail=False, methods=['get'])
+    def range(self, request):
+        """Return a website's analytics totals over a time range, read from rollups"""
+        website_id = request.query_params.get('website')
+        if not website_id:
+            return Response({'error': 'The website parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+        start = parse_bound(request.query_params.get('start', ''))
+        end = parse_bound(request.query_params.get('end', ''), end=True)
+        if start is None or end is None:
+            return Response(
+                {'error': 'start and end must be dates (YYYY-MM-DD) or ISO datetimes'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if end <= start:
+            return Response({'error': 'end must be after start'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            if not Website.objects.filter(id=website_id).exists():
+                return Response({'error': 'Website not found'}, status=status.HTTP_404_NOT_FOUND)
+        except ValidationError:
+            return Response({'error': 'Website not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(query_range(website_id, start, end))
 
 class PublishWebsiteView(APIView):
-    """View for publishing websites"""
+    """View for publishing websites as static sites"""
     
     def post(self, request, website_id):
-        try:
-            website = Website.objects.get(id=website_id, tenant=request.tenant)
-            website.is_published = True
-            website.save()
-            return Response({'status': 'published'}, status=status.HTTP_200_OK)
-        except Website.DoesNotExist:
+        if not Website.objects.filter(id=website_id).exists():
             return Response({'error': 'Website not found'}, status=status.HTTP_404_NOT_FOUND)
+        task = start_publish(request.tenant.schema_name, website_id)
+        return Response({'status': 'publishing', 'task_id': task.id}, status=status.HTTP_202_ACCEPTED)
+
+class PublishStatusView(APIView):
+    """View for checking the progress of a publish task"""
+    
+    def get(self, request, task_id):
+        # Only tasks started by this tenant are reported
+        website_id = get_publish_task_website(request.tenant.schema_name, task_id)
+        if website_id is None:
+            return Response({'error': 'Task not found'}, status=status.HTTP_404_NOT_FOUND)
+        result = AsyncResult(task_id)
+        data = {'task_id': task_id, 'website_id': website_id, 'state': result.state}
+        if result.state == 'PROGRESS':
+            data['progress'] = result.info
+        elif result.successful():
+            data['result'] = result.result
+        elif result.failed():
+            data['error'] = str(result.result)
+        return Response(data, status=status.HTTP_200_OK)
+
+class FragmentStatsView(APIView):
+    """View reporting the current tenant's global fragment cache hit rate (hits are sampled)"""
+    
+    def get(self, request):
+        return Response(get_fragment_stats(request.tenant.schema_name), status=status.HTTP_200_OK)
 
 class PreviewWebsiteView(APIView):
     """View for previewing websites"""
@@ -91,43 +282,184 @@ class PreviewWebsiteView(APIView):
             return Response({'error': 'Website not found'}, status=status.HTTP_404_NOT_FOUND)
 
 # Tenant-facing views (for serving actual websites)
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import redirect
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView
+from .analytics import record_hit
+from .bundler import BUNDLE_NAME_RE, get_bundle_root
+from .compression import ENCODING_SUFFIXES, choose_encoding
+from .caching import CachedPageMixin
+from .conditional import ConditionalPageMixin
+from .contact import buffer_submission
+from .forms import ContactSubmissionForm
+from .referrers import INTERNAL, classify_referrer
+from .rendering import build_page_context, stream_page
+from .routing import is_protected_route, route_request
+from .search import search_website
+from .sitemaps import get_sitemap, render_robots
+
+class TenantSiteMixin:
+    """Resolve the website and page of a tenant site request via the routing index"""
+    
+    def get_site_objects(self):
+        if not hasattr(self, '_site_objects'):
+            website_id, page_id = route_request(self.request, self.kwargs.get('page_slug'))
+            page = Page.objects.select_related('website').filter(pk=page_id).first() if page_id else None
+            if page:
+                website = page.website
+            else:
+                website = Website.objects.filter(pk=website_id).first() if website_id else None
+            self._site_objects = (website, page)
+        return self._site_objects
 
-class TenantHomeView(TemplateView):
+class LoginRequiredPageMixin:
+    """Send anonymous visitors of pages that require a login to the login page"""
+    
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_authenticated and is_protected_route(request, kwargs.get('page_slug')):
+            return redirect_to_login(request.get_full_path(), 'accounts_public:login')
+        return super().dispatch(request, *args, **kwargs)
+
+class TenantHomeView(LoginRequiredPageMixin, TenantSiteMixin, CachedPageMixin, ConditionalPageMixin, TemplateView):
     """View for tenant website home page"""
     template_name = 'websites/tenant_home.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Add website data for the current tenant
-        try:
-            website = Website.objects.filter(tenant=self.request.tenant).first()
-            context['website'] = website
-        except:
-            context['website'] = None
+        website, page = self.get_site_objects()
+        context['website'] = website
+        if website:
+            context.update(build_page_context(website, page))
         return context
 
-class TenantContactView(TemplateView):
+class TenantSearchView(TenantSiteMixin, TemplateView):
+    """View for searching a tenant website's published pages"""
+    template_name = 'websites/tenant_search.html'
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        website, _ = self.get_site_objects()
+        if website is None:
+            raise Http404('Website not found')
+        context.update(build_page_context(website, None))
+        query = self.request.GET.get('q', '').strip()
+        context['query'] = query
+        context['results'] = search_website(website, query) if query else []
+        return context
+
+class TenantContactView(TenantSiteMixin, TemplateView):
     """View for tenant website contact page"""
     template_name = 'websites/tenant_contact.html'
     
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        website, _ = self.get_site_objects()
+        if website is None:
+            raise Http404('Website not found')
+        context.update(build_page_context(website, None))
+        context.setdefault('form', ContactSubmissionForm())
+        context['sent'] = self.request.GET.get('sent') == '1'
+        return context
+    
     def post(self, request, *args, **kwargs):
-        # Handle contact form submission
-        return self.get(request, *args, **kwargs)
+        # Submissions are buffered and saved (and spam-scored) by a worker
+        website, _ = self.get_site_objects()
+        if website is None:
+            raise Http404('Website not found')
+        form = ContactSubmissionForm(request.POST)
+        if not form.is_valid():
+            return self.render_to_response(self.get_context_data(form=form))
+        buffer_submission(request, website, form.cleaned_data, honeypot=bool(form.cleaned_data['website_url']))
+        return redirect(f'{request.path}?sent=1')
 
-class TenantPageView(TemplateView):
+class TenantPageView(LoginRequiredPageMixin, TenantSiteMixin, CachedPageMixin, ConditionalPageMixin, TemplateView):
     """View for tenant website pages"""
     template_name = 'websites/tenant_page.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        page_slug = kwargs.get('page_slug')
-        try:
-            page = Page.objects.filter(
-                website__tenant=self.request.tenant, 
-                slug=page_slug
-            ).first()
-            context['page'] = page
-        except:
-            context['page'] = None
+        website, page = self.get_site_objects()
+        if page is None:
+            raise Http404('Page not found')
+        context.update(build_page_context(website, page))
         return context
+    
+    def render_to_response(self, context, **response_kwargs):
+        # Large pages are streamed so the browser gets <head> (and starts
+        # fetching the CSS/JS bundles) before the content has been sent
+        if len(context['page'].content or '') < settings.STREAMING_PAGE_THRESHOLD:
+            return super().render_to_response(context, **response_kwargs)
+        response = StreamingHttpResponse(
+            stream_page(context, self.request, settings.STREAMING_CHUNK_SIZE),
+            content_type='text/html; charset=utf-8',
+        )
+        # Ask nginx to pass chunks on instead of buffering the whole response
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class SitemapView(TenantSiteMixin, View):
+    """View serving a tenant website's stored sitemap (or sitemap index)"""
+    
+    def get(self, request, shard=None):
+        website, _ = self.get_site_objects()
+        if website is None:
+            raise Http404
+        xml = get_sitemap(request, website, shard)
+        if xml is None:
+            raise Http404
+        return HttpResponse(xml, content_type='application/xml; charset=utf-8')
+
+class RobotsView(View):
+    """View serving robots.txt for tenant websites"""
+    
+    def get(self, request):
+        return HttpResponse(render_robots(request), content_type='text/plain; charset=utf-8')
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BeaconView(View):
+    """View counting page views reported by tenant pages (navigator.sendBeacon)"""
+    
+    def post(self, request):
+        # Counted in Redis only; the routing index resolves the website
+        # without a database query
+        website_id, _ = route_request(request)
+        if website_id is not None:
+            referrer = request.GET.get('r', '')[:2000]
+            # Views reached from the site's own pages have no traffic source
+            source = classify_referrer(referrer, request.get_host().split(':', 1)[0])
+            record_hit(
+                request, website_id,
+                path=request.GET.get('p', '')[:210],
+                referrer=referrer,
+                counters=('views',) if source == INTERNAL else ('views', source),
+            )
+        response = HttpResponse(status=204)
+        response['Cache-Control'] = 'no-store'
+        return response
+
+class BundleAssetView(View):
+    """View serving content-hashed CSS/JS bundles (nginx serves them in production)"""
+    
+    def get(self, request, name):
+        if not BUNDLE_NAME_RE.match(name):
+            raise Http404
+        path = get_bundle_root() / name
+        if not path.exists():
+            raise Http404
+        available = [e for e, suffix in ENCODING_SUFFIXES.items()
+                     if path.with_name(name + suffix).exists()]
+        encoding = choose_encoding(request, available)
+        if encoding:
+            path = path.with_name(name + ENCODING_SUFFIXES[encoding])
+        content_type = 'text/css' if name.endswith('.css') else 'application/javascript'
+        response = FileResponse(open(path, 'rb'), content_type=f'{content_type}; charset=utf-8')
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response